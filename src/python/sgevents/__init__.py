@@ -2,14 +2,61 @@
 """
 @package sgevents
 
+The public types of our submodules are available here as well, but their modules are only imported once
+one of them is used. That way, importing the package, for instance to register the daemon command, doesn't
+import shotgun_api3 and all the engine's dependencies.
+
 @author Sebastian Thiel
 @copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
 """
 from __future__ import absolute_import
+import sys
+from types import ModuleType
+
 from butility import Version
 __version__ = Version('1.0.0')
 
 
-from .cmd import *
-from .engine import *
-from .plugin import *
+## Maps the name of each submodule to the names it exports through us
+_exports = {'cmd' : ('ShotgunEventEngineCommand', ),
+            'engine' : ('EventEngine', ),
+            'plugin' : ('EventEnginePlugin', 'with_event_application', 'with_global_event_application',
+                        'event_filters_match'),
+            'backlog' : ('EventBacklog', ),
+            'dispatch' : ('EventDispatcher', 'ThreadPoolEventDispatcher'),
+            'isolation' : ('ProcessPluginWorker', 'PluginWorkerError'),
+            'journal' : ('EventJournal', 'PickleEventJournal', 'WriteAheadLogEventJournal', 'SQLiteEventJournal',
+                         'EventJournalError'),
+            'routing' : ('EventFilterIndex', ),
+            'scheduler' : ('PollScheduler', 'AdaptivePollScheduler')}
+
+# exported name: name of the submodule defining it
+_origins = dict((name, module_name) for module_name, names in _exports.items() for name in names)
+
+__all__ = sorted(_origins)
+
+
+class _LazyPackage(ModuleType):
+    """Our package, which imports the submodule defining an exported name once it is accessed"""
+
+    def __getattr__(self, name):
+        module_name = _origins.get(name)
+        if module_name is None:
+            raise AttributeError("'module' object has no attribute '%s'" % name)
+        # end handle unknown names
+        __import__('%s.%s' % (self.__name__, module_name))
+        value = getattr(sys.modules['%s.%s' % (self.__name__, module_name)], name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__).union(__all__))
+
+# end class _LazyPackage
+
+
+_package = _LazyPackage(__name__, __doc__)
+_package.__dict__.update(sys.modules[__name__].__dict__)
+# keep our original module alive, the globals of _LazyPackage would be cleared otherwise
+_package._module = sys.modules[__name__]
+sys.modules[__name__] = _package
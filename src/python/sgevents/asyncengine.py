@@ -0,0 +1,273 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.asyncengine
+@brief An EventEngine which dispatches events on an asyncio event loop
+
+@note requires the trollius package, the asyncio port for python 2
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['AsyncEventEngine']
+
+try:
+    import trollius as asyncio
+    from trollius import (From,
+                          Return)
+except ImportError:
+    raise ImportError("The AsyncEventEngine requires the 'trollius' package")
+# end handle dependency
+
+from concurrent.futures import ThreadPoolExecutor
+
+import time
+
+import shotgun_api3 as sg
+
+from .engine import EventEngine
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class AsyncEventEngine(EventEngine):
+    """An EventEngine whose fetch loop, journaling and dispatching runs on an asyncio event loop.
+
+    Each plugin has its own queue of events, which is consumed by a task of its own. Thus events are handled
+    in order per plugin, while all plugins run concurrently.
+
+    Plugins whose handle_event() method is a coroutine run on the loop directly. They must not block, which
+    is why shotgun calls should be run in the loop's executor, e.g.
+    `yield From(asyncio.get_event_loop().run_in_executor(None, shotgun.find_one, ...))`.
+    All other plugins are run in a thread pool executor, configured by dispatch.threads.
+    """
+    __slots__ = ('_loop',
+                 '_lanes')
+
+    ## Amount of executor threads to use if dispatch.threads is not set
+    DEFAULT_EXECUTOR_THREADS = 8
+
+    def __init__(self, sg_connection = None):
+        self._loop = None
+        self._lanes = dict()
+        super(AsyncEventEngine, self).__init__(sg_connection)
+
+    def _num_dispatching_threads(self, settings):
+        """Plugins are called by our executor's threads. Coroutines call shotgun from there as well, as they 
+        only lease a connection per call, see _plugin_connection()"""
+        return settings.dispatch.threads or self.DEFAULT_EXECUTOR_THREADS
+
+    def _plugin_connection(self, plugin_type):
+        """Plugins run concurrently, which is why each one gets its own connection. Coroutines wait for the
+        executor between their calls, which is why they don't keep their lease while doing so"""
+        if self._pool is not None and asyncio.iscoroutinefunction(plugin_type.handle_event):
+            return self._pooled_connection(keep_lease=False)
+        # end lease per call
+        if self._sg_is_shared or self._pool is not None:
+            return super(AsyncEventEngine, self)._plugin_connection(plugin_type)
+        return self.ProxyShotgunConnectionType()
+
+    @asyncio.coroutine
+    def _run_blocking(self, fun, *args):
+        """Run fun(*args) in our executor without blocking the loop
+        @return whatever fun returned"""
+        res = yield From(self._loop.run_in_executor(None, fun, *args))
+        raise Return(res)
+
+    @asyncio.coroutine
+    def _process_async(self, plugin, event):
+        """Like EventEnginePlugin.process(), but for plugins whose handle_event() is a coroutine"""
+        if not plugin._is_pending(event['id']):
+            plugin._log.debug('Event %d is too old. Last event processed was (%d).',
+                              event['id'], plugin._last_event_id)
+            return
+        # end ignore old events
+
+        if plugin._can_process_event(event):
+            plugin._log.debug('Dispatching event %d to coroutine %s.', event['id'], str(plugin))
+            plugin._sg.set_session_uuid(event['session_uuid'])
+            try:
+                yield From(plugin.handle_event(plugin._sg, plugin._log, event))
+            except Exception:
+                plugin._handle_failure(event)
+                return
+            # end handle failures
+            plugin._clear_failures()
+        # end handle event
+        plugin._mark_processed(event['id'])
+
+    @asyncio.coroutine
+    def _dispatch_event_async(self, plugin, event, skipped_event_ids):
+        """Coroutine version of _dispatch_event(), running coroutine handlers on the loop, and all others
+        in our executor"""
+        if not plugin.is_active() or plugin.is_paused():
+            self.log.debug("Skipping inactive or paused plugin %s", plugin)
+            return
+        # end ignore inactive
+        if skipped_event_ids:
+            self._metrics.events_skipped.inc(len(skipped_event_ids), (str(plugin), ))
+            plugin.skip_events(skipped_event_ids)
+        # end advance over uninteresting events
+        try:
+            if event is not None:
+                start = time.time()
+                if (plugin.worker() is None and not plugin.event_batch_size and 
+                    asyncio.iscoroutinefunction(plugin.handle_event)):
+                    yield From(self._process_async(plugin, event))
+                else:
+                    yield From(self._run_blocking(plugin.process, event))
+                # end handle plugin kind
+                self._metrics.handle_seconds.observe(time.time() - start, (str(plugin), ))
+            elif plugin.event_batch_size or plugin._write_buffer is not None:
+                yield From(self._run_blocking(self._end_page, plugin))
+            # end process event
+        finally:
+            self._release_connection(self._pooled_connections.get(plugin))
+        # end assure leased connection is returned
+        self._journal.record(plugin.state_key(), plugin.state())
+
+    @asyncio.coroutine
+    def _consume(self, plugin, queue):
+        """Main loop of the task handling all events of the given plugin"""
+        while True:
+            item = yield From(queue.get())
+            try:
+                if item is None:
+                    break
+                # end handle shutdown
+                try:
+                    yield From(self._dispatch_event_async(plugin, *item))
+                except Exception:
+                    self.log.critical("Unhandled exception while dispatching work", exc_info=True)
+                # end log unexpected errors
+            finally:
+                queue.task_done()
+            # end assure queue can be joined
+        # end while we are not shut down
+
+    def _submit(self, plugin, event, skipped_event_ids):
+        """Put the event into the queue of the plugin's task, which is started on demand"""
+        queue = self._lanes.get(plugin)
+        if queue is None:
+            queue = self._lanes[plugin] = asyncio.Queue(loop=self._loop)
+            self._loop.create_task(self._consume(plugin, queue))
+        # end create lane on demand
+        queue.put_nowait((event, skipped_event_ids))
+
+    def _forget_plugin(self, plugin):
+        """Stop the task of the given plugin as well. Called from our executor while all lanes are idle"""
+        queue = self._lanes.pop(plugin, None)
+        if queue is not None:
+            self._loop.call_soon_threadsafe(queue.put_nowait, None)
+        # end stop task
+        super(AsyncEventEngine, self)._forget_plugin(plugin)
+
+    @asyncio.coroutine
+    def _wait_for_lanes(self, max_queue_depth=0):
+        """Wait until all plugin queues with more than max_queue_depth items are empty"""
+        for queue in list(self._lanes.values()):
+            if queue.qsize() > max_queue_depth:
+                yield From(queue.join())
+            # end wait for queue
+        # end for each queue
+
+    @asyncio.coroutine
+    def _process_events_async(self):
+        """Like _process_events(), but runs all blocking calls in our executor and dispatches events to
+        the plugin tasks"""
+        config = self.settings_value()
+        max_queue_depth = config.dispatch['max-queue-depth']
+        num_events = 0
+        counted = set()
+        throttled = False
+        yield From(self._run_blocking(self._check_plugin_modules))
+        if self._cluster is not None:
+            yield From(self._run_blocking(self._update_ownership))
+        # end take our share of plugins
+        try:
+            for priority, plugins in self._priority_lanes():
+                max_pages = self._select_lane(priority, plugins)
+                pages = yield From(self._run_blocking(self._fetch_new_event_pages, plugins))
+                num_pages = 0
+                while True:
+                    page = yield From(self._run_blocking(next, pages, None))
+                    if page is None:
+                        break
+                    # end handle end of pages
+                    num_events += self._dispatch_page(page, False, counted)
+                    yield From(self._wait_for_lanes(max_queue_depth))
+                    num_pages += 1
+                    if max_pages and num_pages >= max_pages:
+                        throttled = True
+                        yield From(self._run_blocking(pages.close))
+                        break
+                    # end handle throttled lanes
+                # end for each page
+            # end for each priority lane
+        finally:
+            # plugins must be done before we may query their state again
+            yield From(self._wait_for_lanes())
+            self._release_connection(self._sg)
+        # end assure dispatched events are processed
+
+        if num_events:
+            yield From(self._run_blocking(self._save_event_id_data, False))
+        # end assure everything is saved
+        self._update_metrics(num_events)
+
+        page_size = config.fetch['page-size']
+        interval = self._scheduler.next_interval(num_events, throttled or bool(page_size) and num_events >= page_size)
+        if throttled:
+            interval = 0.0
+        # end continue throttled lanes right away
+        yield From(self._run_blocking(self._wait, interval))
+
+    @asyncio.coroutine
+    def _run_async(self):
+        """The main loop, running until we are asked to terminate"""
+        try:
+            while not self._should_terminate():
+                yield From(self._process_events_async())
+            # end while we shouldn't terminate
+        finally:
+            for queue in self._lanes.values():
+                queue.put_nowait(None)
+            # end for each lane to stop
+            yield From(self._wait_for_lanes())
+            self._lanes.clear()
+        # end assure tasks are stopped
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def run(self):
+        """Start the processing of events on a new event loop, which is closed once we are done"""
+        self._wakeup.clear()
+        self._prepare_event_processing()
+
+        self.log.info('Using Shotgun version %s' % sg.__version__)
+
+        threads = self._num_dispatching_threads(self.settings_value())
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(ThreadPoolExecutor(threads))
+        asyncio.set_event_loop(self._loop)
+        try:
+            self.log.debug('Starting the asynchronous event processing loop.')
+            self._loop.run_until_complete(self._run_async())
+            self.log.debug('Shuting down event processing loop.')
+        except Exception as err:
+            self.log.critical('Unexpected error (%s) in main loop.', type(err), exc_info=True)
+        finally:
+            self._loop.close()
+            self._loop = None
+        # end assure loop is closed
+
+        self._shutdown()
+
+    ## -- End Interface -- @}
+
+# end class AsyncEventEngine
+
+## -- End Types -- @}
@@ -0,0 +1,196 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.backlog
+@brief A compact store for ids of events which are missing
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['EventBacklog']
+
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class EventBacklog(object):
+    """Keeps ids of missing events as sorted, non-overlapping runs of ids, each of which expires at a given time.
+
+    A gap of any size costs a single run, lookups are O(log n) in the amount of runs, and the smallest id
+    is available in O(1).
+    """
+    __slots__ = ('_starts',         # sorted list of the first id of each run, for bisection
+                 '_runs',           # list of [first_id, last_id, expires_at] lists, sorted by first_id
+                 '_next_expiry'     # the earliest expiry time of all runs, or None
+                 )
+
+    def __init__(self, runs=()):
+        """Initialize this instance
+        @param runs iterable of (first_id, last_id, expires_at) tuples, with expires_at being seconds since epoch"""
+        self._starts = list()
+        self._runs = list()
+        self._next_expiry = None
+        for first_id, last_id, expires_at in runs:
+            self.add_range(first_id, last_id, expires_at)
+        # end for each run
+
+    def __getstate__(self):
+        return tuple(tuple(run) for run in self._runs)
+
+    def __setstate__(self, runs):
+        self.__init__(runs)
+
+    def __reduce__(self):
+        # pickle protocols below 2 don't call __setstate__() if the state is empty, as it is for an empty backlog
+        return (type(self), (self.__getstate__(), ))
+
+    def __contains__(self, event_id):
+        return self._find(event_id) is not None
+
+    def __len__(self):
+        """@return the amount of event ids we contain"""
+        return sum(last_id - first_id + 1 for first_id, last_id, expires_at in self._runs)
+
+    def __nonzero__(self):
+        return bool(self._runs)
+
+    def __eq__(self, rhs):
+        return isinstance(rhs, EventBacklog) and self._runs == rhs._runs
+
+    def __ne__(self, rhs):
+        return not self == rhs
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.__getstate__())
+
+    def _find(self, event_id):
+        """@return index of the run containing the given id, or None"""
+        index = bisect_right(self._starts, event_id) - 1
+        if index < 0 or self._runs[index][1] < event_id:
+            return None
+        return index
+
+    def _insert(self, index, first_id, last_id, expires_at):
+        self._starts.insert(index, first_id)
+        self._runs.insert(index, [first_id, last_id, expires_at])
+        if self._next_expiry is None or expires_at < self._next_expiry:
+            self._next_expiry = expires_at
+        # end update expiry
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    @classmethod
+    def from_dict(cls, backlog):
+        """@return a new instance, initialized from a dict of event_id: datetime pairs, the format used by
+        previous versions of EventEnginePlugin"""
+        inst = cls()
+        run = None
+        for event_id, expiration in sorted(backlog.iteritems()):
+            expires_at = expiration
+            if isinstance(expiration, datetime):
+                # previous versions used naive local time
+                expires_at = time.mktime(expiration.timetuple())
+            # end convert datetime
+            if run and run[1] + 1 == event_id and run[2] == expires_at:
+                run[1] = event_id
+            else:
+                if run:
+                    inst.add_range(*run)
+                # end flush previous run
+                run = [event_id, event_id, expires_at]
+            # end extend or start run
+        # end for each event id
+        if run:
+            inst.add_range(*run)
+        # end flush last run
+        return inst
+
+    def add_range(self, first_id, last_id, expires_at):
+        """Add all ids from first_id to last_id, inclusive, which expire at the given time in seconds since epoch.
+        Ids we contain already will get the new expiry time"""
+        assert first_id <= last_id
+        if self._runs and self._runs[-1][1] < first_id:
+            self._insert(len(self._runs), first_id, last_id, expires_at)
+            return
+        # end fast path for appending
+
+        self.discard_range(first_id, last_id)
+        self._insert(bisect_right(self._starts, first_id), first_id, last_id, expires_at)
+
+    def discard(self, event_id):
+        """Remove the given id, if we contain it"""
+        self.discard_range(event_id, event_id)
+
+    def discard_range(self, first_id, last_id):
+        """Remove all ids from first_id to last_id, inclusive"""
+        index = max(0, bisect_right(self._starts, first_id) - 1)
+        while index < len(self._runs):
+            run = self._runs[index]
+            if run[0] > last_id:
+                break
+            elif run[1] < first_id:
+                index += 1
+                continue
+            # end skip runs which don't overlap
+
+            del self._starts[index]
+            del self._runs[index]
+            if run[1] > last_id:
+                self._insert(index, last_id + 1, run[1], run[2])
+            # end keep tail
+            if run[0] < first_id:
+                self._insert(index, run[0], first_id - 1, run[2])
+                index += 1
+            # end keep head
+        # end for each overlapping run
+
+    def min_id(self):
+        """@return the smallest id we contain, or None if we are empty"""
+        if not self._runs:
+            return None
+        return self._runs[0][0]
+
+    def expire(self, now=None):
+        """Remove all runs which expired by now
+        @param now seconds since epoch, defaults to the current time
+        @return list of (first_id, last_id) tuples of all removed runs"""
+        if now is None:
+            now = time.time()
+        # end default now
+        if self._next_expiry is None or now < self._next_expiry:
+            return list()
+        # end bail out early
+
+        expired = list()
+        runs = list()
+        self._next_expiry = None
+        for run in self._runs:
+            if run[2] <= now:
+                expired.append((run[0], run[1]))
+            else:
+                runs.append(run)
+                if self._next_expiry is None or run[2] < self._next_expiry:
+                    self._next_expiry = run[2]
+                # end track expiry
+            # end handle expiry
+        # end for each run
+        self._runs = runs
+        self._starts = [run[0] for run in runs]
+        return expired
+
+    def iter_ranges(self):
+        """@return iterator over (first_id, last_id, expires_at) tuples of all our runs, sorted by id"""
+        return (tuple(run) for run in self._runs)
+
+    ## -- End Interface -- @}
+
+# end class EventBacklog
+
+## -- End Types -- @}
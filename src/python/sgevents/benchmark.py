@@ -0,0 +1,374 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.benchmark
+@brief Measures throughput and latency of the EventEngine's dispatch path, without talking to shotgun
+
+Run it using `python -m sgevents.benchmark --help`. Results are printed as JSON, one object per scenario.
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['InMemoryShotgunConnection', 'BenchmarkEventEngine', 'synthetic_events', 'recorded_events',
+           'run_scenario', 'run_benchmark']
+
+import sys
+import json
+import time
+import shutil
+import tempfile
+import resource
+import itertools
+from bisect import (bisect_left,
+                    bisect_right)
+
+import bapp
+from butility import Path
+
+from .engine import EventEngine
+from .plugin import EventEnginePlugin
+from .scheduler import PollScheduler
+from .spool import recorded_events
+
+
+# ==============================================================================
+## @name Functions
+# ------------------------------------------------------------------------------
+## @{
+
+def synthetic_events(count, num_event_types=20, backlog=0, first_id=1000):
+    """@return list of count events with ascending ids and event types cycling through num_event_types.
+    @param backlog amount of ids to leave out, spread evenly across the stream. Plugins will keep them in
+    their backlog while the stream is processed"""
+    spacing = backlog and max(2, count // backlog) or 0
+    events = list()
+    event_id = first_id
+    for index in xrange(count):
+        if spacing and index % spacing == 1 and backlog:
+            event_id += 1
+            backlog -= 1
+        # end leave a gap
+        events.append(dict(id=event_id,
+                           event_type='Shotgun_Type%02i_Change' % (index % num_event_types),
+                           attribute_name='sg_attr%i' % (index % 3),
+                           meta=dict(type='attribute_change', old_value=index - 1, new_value=index),
+                           entity=dict(type='Shot', id=index),
+                           user=dict(type='HumanUser', id=1),
+                           project=dict(type='Project', id=1),
+                           session_uuid=None))
+        event_id += 1
+    # end for each event
+    return events
+
+def _percentile(sorted_values, fraction):
+    """@return the value at the given fraction of the sorted values, or 0 if there are none"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[int(round(fraction * (len(sorted_values) - 1)))]
+
+def _event_filters(event_types, selectivity, offset):
+    """@return event filters matching the given fraction of all event types, starting at the given offset"""
+    if selectivity >= 1.0:
+        return {'*' : list()}
+    # end handle catch-all
+    count = max(1, int(round(len(event_types) * selectivity)))
+    return dict((event_types[(offset + index) % len(event_types)], list()) for index in xrange(count))
+
+def _max_polls(num_events, page_size):
+    """@return the amount of polls after which a scenario is considered stuck"""
+    return 10 + (page_size and num_events // page_size or 1) * 2
+
+def run_scenario(events, num_plugins, selectivity, journal_type='pickle', page_size=500, threads=0):
+    """Process all given events with a new engine and num_plugins plugins
+    @param events list of events with ascending ids, see synthetic_events() and recorded_events()
+    @param selectivity fraction of event types each plugin is interested in
+    @param journal_type the journal.type to use
+    @param page_size the fetch.page-size to use
+    @param threads the dispatch.threads to use
+    @return dict with the scenario parameters and results
+    @note needs a running bapp Application"""
+    event_types = sorted(set(event['event_type'] for event in events))
+    stack = bapp.main().context()
+    context = stack.push('sg-events-benchmark')
+    journal_dir = tempfile.mkdtemp(prefix='sg-events-benchmark')
+    engine = None
+    try:
+        latencies = list()
+        for index in xrange(num_plugins):
+            type('BenchmarkPlugin%03i' % index, (BenchmarkPlugin, bapp.plugin_type()),
+                 dict(event_filters=_event_filters(event_types, selectivity, index),
+                      latencies=latencies,
+                      __slots__=()))
+        # end for each plugin type
+
+        overrides = {('fetch', 'page-size') : page_size,
+                     ('dispatch', 'threads') : threads,
+                     ('journal', 'type') : journal_type,
+                     ('event-journal-file', ) : Path(journal_dir) / 'journal'}
+        connection = InMemoryShotgunConnection(events)
+        engine = BenchmarkEventEngine(overrides, connection)
+        engine._scheduler = PollScheduler(0)
+        for plugin in engine._iter_plugins():
+            plugin.set_event_id(events[0]['id'] - 1)
+        # end start at the beginning of the stream
+
+        last_id = events[-1]['id']
+        num_polls = 0
+        start = time.time()
+        while num_polls < _max_polls(len(events), page_size):
+            num_polls += 1
+            engine._process_events()
+            if all(plugin._last_event_id >= last_id for plugin in engine._iter_plugins()):
+                break
+            # end stop once all events are processed
+        # end while there is work
+        elapsed = time.time() - start
+        latencies.sort()
+
+        return dict(events=len(events),
+                    plugins=num_plugins,
+                    selectivity=selectivity,
+                    backlog=last_id - events[0]['id'] + 1 - len(events),
+                    journal=journal_type,
+                    page_size=page_size,
+                    threads=threads,
+                    polls=num_polls,
+                    queries=connection.num_queries,
+                    dispatches=len(latencies),
+                    seconds=elapsed,
+                    events_per_second=elapsed and len(events) / elapsed or 0.0,
+                    latency_p50_ms=_percentile(latencies, 0.5) * 1000.0,
+                    latency_p99_ms=_percentile(latencies, 0.99) * 1000.0,
+                    peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    finally:
+        if engine is not None:
+            engine._shutdown()
+            if engine._plugin_context is not None:
+                stack.remove(engine._plugin_context)
+            # end remove plugin context
+        # end cleanup engine
+        stack.remove(context)
+        shutil.rmtree(journal_dir, ignore_errors=True)
+    # end assure cleanup
+
+def run_benchmark(events, plugins=(1, 10), selectivities=(0.1, 1.0), journals=('pickle', ), page_sizes=(500, ),
+                  threads=(0, )):
+    """Run a scenario for each combination of the given parameters
+    @return list of result dicts, see run_scenario()"""
+    return [run_scenario(events, num_plugins, selectivity, journal_type, page_size, num_threads)
+            for num_plugins, selectivity, journal_type, page_size, num_threads
+            in itertools.product(plugins, selectivities, journals, page_sizes, threads)]
+
+## -- End Functions -- @}
+
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class InMemoryShotgunConnection(object):
+    """Answers the EventLogEntry queries the EventEngine makes from a list of events in memory"""
+    __slots__ = ('_events',
+                 '_ids',
+                 '_fetched_at',
+                 'num_queries')
+
+    def __init__(self, events):
+        """Initialize this instance
+        @param events list of events with ascending ids"""
+        self._events = events
+        self._ids = [event['id'] for event in events]
+        self._fetched_at = dict()
+        self.num_queries = 0
+
+    @classmethod
+    def _matches(cls, event, condition):
+        """@return True if the given event matches a single condition of a shotgun filter"""
+        if isinstance(condition, dict):
+            results = (cls._matches(event, item) for item in condition['filters'])
+            if condition.get('filter_operator', 'all') == 'any':
+                return any(results)
+            return all(results)
+        # end handle nested filters
+
+        field, relation, value = condition
+        if relation == 'is':
+            return event.get(field) == value
+        elif relation == 'in':
+            return event.get(field) in value
+        raise AssertionError("unsupported relation: %s" % relation)
+
+    # -------------------------
+    ## @name Shotgun Interface
+    # @{
+
+    def find(self, entity_type, filters, fields=None, order=None, filter_operator=None, limit=0, **kwargs):
+        assert entity_type == 'EventLogEntry'
+        self.num_queries += 1
+        first, last = 0, len(self._events)
+        conditions = list()
+        for condition in filters:
+            if isinstance(condition, dict) or condition[0] != 'id':
+                conditions.append(condition)
+            elif condition[1] == 'greater_than':
+                first = max(first, bisect_right(self._ids, condition[2]))
+            elif condition[1] == 'between':
+                first = max(first, bisect_left(self._ids, condition[2][0]))
+                last = min(last, bisect_right(self._ids, condition[2][1]))
+            elif condition[1] == 'in':
+                if not condition[2]:
+                    return list()
+                # end handle empty set
+                first = max(first, bisect_left(self._ids, min(condition[2])))
+                last = min(last, bisect_right(self._ids, max(condition[2])))
+                conditions.append(('id', 'in', frozenset(condition[2])))
+            else:
+                raise AssertionError("unsupported id relation: %s" % condition[1])
+            # end handle condition
+        # end for each condition
+
+        res = list()
+        now = time.time()
+        fields = fields and frozenset(fields)
+        for event in itertools.islice(self._events, first, last):
+            if conditions and not all(self._matches(event, condition) for condition in conditions):
+                continue
+            # end apply filters
+            self._fetched_at[event['id']] = now
+            if fields and not fields.issuperset(event):
+                # like shotgun, only return the requested fields
+                event = dict((name, event[name]) for name in fields if name in event)
+            # end project fields
+            res.append(event)
+            if limit and len(res) == limit:
+                break
+            # end stop at limit
+        # end for each event in range
+        return res
+
+    def find_one(self, entity_type, filters, fields=None, order=None, **kwargs):
+        assert entity_type == 'EventLogEntry'
+        if not self._events:
+            return None
+        # end handle empty stream
+        return dict(id=self._events[-1]['id'])
+
+    def set_session_uuid(self, session_uuid):
+        pass
+
+    ## -- End Shotgun Interface -- @}
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def fetched_at(self, event_id):
+        """@return time at which the event with the given id was last returned by find()"""
+        return self._fetched_at[event_id]
+
+    ## -- End Interface -- @}
+
+# end class InMemoryShotgunConnection
+
+
+class BenchmarkPlugin(EventEnginePlugin):
+    """Records the time between fetching an event and handling it"""
+    __slots__ = ()
+
+    ## A list to which to append latencies, in seconds. Shared by all plugins of a scenario
+    latencies = None
+
+    def handle_event(self, shotgun, log, event):
+        self.latencies.append(time.time() - shotgun.fetched_at(event['id']))
+
+# end class BenchmarkPlugin
+
+
+class BenchmarkEventEngine(EventEngine):
+    """An engine whose settings can be overridden, and which doesn't persist anything beyond the scenario"""
+    __slots__ = ('_overrides', )
+
+    def __init__(self, overrides, sg_connection):
+        """Initialize this instance
+        @param overrides dict mapping tuples of keys, like ('fetch', 'page-size'), to the value to use"""
+        self._overrides = overrides
+        super(BenchmarkEventEngine, self).__init__(sg_connection)
+
+    def settings_value(self, *args, **kwargs):
+        res = super(BenchmarkEventEngine, self).settings_value(*args, **kwargs)
+        for keys, value in self._overrides.iteritems():
+            parent = res
+            for key in keys[:-1]:
+                parent = parent[key]
+            # end for each parent key
+            parent[keys[-1]] = value
+        # end for each override
+        return res
+
+# end class BenchmarkEventEngine
+
+## -- End Types -- @}
+
+
+
+# ==============================================================================
+## @name Commandline
+# ------------------------------------------------------------------------------
+## @{
+
+def _csv(item_type):
+    """@return a function converting comma separated values to a list of the given type"""
+    return lambda value: [item_type(item) for item in value.split(',') if item]
+
+def main(argv=None):
+    # argparse isn't part of python 2.6, and only needed on the commandline
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the dispatching of events to plugins")
+    parser.add_argument('--events', type=int, default=10000, help="amount of synthetic events to process")
+    parser.add_argument('--recorded', metavar='DIRECTORY',
+                        help="process events stored by the EventRecorder plugin instead of synthetic ones")
+    parser.add_argument('--plugins', type=_csv(int), default=[1, 10], help="amounts of plugins, e.g. 1,10,50")
+    parser.add_argument('--selectivity', type=_csv(float), default=[0.1, 1.0],
+                        help="fractions of event types each plugin is interested in")
+    parser.add_argument('--backlog', type=_csv(int), default=[0],
+                        help="amounts of missing synthetic events, which end up in the backlog")
+    parser.add_argument('--journal', type=_csv(str), default=['pickle'],
+                        help="journal types, any of %s" % ', '.join(sorted(EventEngine.EventJournalTypes)))
+    parser.add_argument('--page-size', type=_csv(int), default=[500], help="event page sizes")
+    parser.add_argument('--threads', type=_csv(int), default=[0], help="amounts of dispatch threads")
+    parser.add_argument('--output', metavar='FILE', help="write results to FILE instead of stdout")
+    args = parser.parse_args(argv)
+
+    if bapp.main() is None:
+        bapp.Application.new()
+    # end assure we have an application
+
+    results = list()
+    if args.recorded:
+        streams = [recorded_events(args.recorded)]
+    else:
+        streams = [synthetic_events(args.events, backlog=backlog) for backlog in args.backlog]
+    # end obtain event streams
+    for events in streams:
+        results.extend(run_benchmark(events, args.plugins, args.selectivity, args.journal, args.page_size,
+                                     args.threads))
+    # end for each stream
+
+    output = args.output and open(args.output, 'w') or sys.stdout
+    try:
+        json.dump(results, output, indent=2, sort_keys=True)
+        output.write('\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        # end close file
+    # end assure file is closed
+    return 0
+
+## -- End Commandline -- @}
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,308 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.cache
+@brief Lets plugins share the results of shotgun queries made while handling the same events
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['ShotgunRequestCache', 'CachingShotgunConnection']
+
+import copy
+import threading
+
+
+# ==============================================================================
+## @name Functions
+# ------------------------------------------------------------------------------
+## @{
+
+def _freeze(value):
+    """@return a hashable version of the given shotgun query argument"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.iteritems()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _entity_id(filters):
+    """@return the id if the given filters select a single entity by id, like [['id', 'is', 5]], or None"""
+    if (isinstance(filters, (list, tuple)) and len(filters) == 1 and
+        isinstance(filters[0], (list, tuple)) and len(filters[0]) == 3 and
+        filters[0][0] == 'id' and filters[0][1] == 'is'):
+        return filters[0][2]
+    return None
+
+## -- End Functions -- @}
+
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class _Generation(object):
+    """All cached data of one batch of events"""
+    __slots__ = ('results',   # dict of query key: result
+                 'entities'   # dict of (entity_type, id): dict of fields
+                 )
+
+    def __init__(self):
+        self.results = dict()
+        self.entities = dict()
+
+# end class _Generation
+
+
+class ShotgunRequestCache(object):
+    """A cache of query results, shared by all plugins handling a batch of events.
+
+    Results are kept for the current and the previous batch, as plugins may still be handling events of the
+    previous batch when the next one starts. Identical queries issued concurrently are sent only once.
+    Entities can be prefetched in bulk, and are used to answer find_one() queries by id.
+    @note all methods are thread-safe
+    """
+    __slots__ = ('_lock',
+                 '_current',
+                 '_previous',
+                 '_in_flight',
+                 '_invalidations',
+                 'hits',
+                 'misses')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = _Generation()
+        self._previous = _Generation()
+        self._in_flight = dict()
+        self._invalidations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key, entity_type, entity_id, fields):
+        """@return tuple(found, result) for the given query key or entity. Must be called with lock held"""
+        for generation in (self._current, self._previous):
+            if key in generation.results:
+                return True, generation.results[key]
+            # end handle query result
+            if entity_id is None:
+                continue
+            # end skip entity lookup
+            entity = generation.entities.get((entity_type, entity_id))
+            if entity is not None and all(field in entity for field in fields or ()):
+                res = dict(type=entity_type, id=entity_id)
+                res.update((field, entity[field]) for field in fields or ())
+                return True, res
+            # end handle prefetched entity
+        # end for each generation
+        return False, None
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def rotate(self):
+        """Start a new batch. Results of the batch before the previous one are dropped"""
+        self._lock.acquire()
+        try:
+            self._previous = self._current
+            self._current = _Generation()
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def clear(self):
+        """Drop all cached data"""
+        self._lock.acquire()
+        try:
+            self._previous = _Generation()
+            self._current = _Generation()
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def invalidate(self, entity_type, entity_id=None):
+        """Drop all query results for the given entity type, and the prefetched entity with the given id"""
+        self._lock.acquire()
+        try:
+            self._invalidations += 1
+            for generation in (self._current, self._previous):
+                for key in [key for key in generation.results if key[1] == entity_type]:
+                    del generation.results[key]
+                # end for each query of the type
+                if entity_id is not None:
+                    generation.entities.pop((entity_type, entity_id), None)
+                # end drop entity
+            # end for each generation
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def query(self, key, entity_type, fun, entity_id=None, fields=None):
+        """@return a deep copy of the cached result for the given key, or of the result of fun(), which is
+        called only if no other thread is currently obtaining the same result
+        @param key a hashable identifying the query, whose second item must be the entity_type
+        @param entity_id if not None, a prefetched entity with the given id may answer the query if it has
+        all the given fields"""
+        while True:
+            self._lock.acquire()
+            try:
+                found, res = self._lookup(key, entity_type, entity_id, fields)
+                if found:
+                    self.hits += 1
+                    return copy.deepcopy(res)
+                # end handle hit
+                waiter = self._in_flight.get(key)
+                if waiter is None:
+                    self.misses += 1
+                    waiter = self._in_flight[key] = threading.Event()
+                    generation = self._current
+                    invalidations = self._invalidations
+                    break
+                # end become the one to query
+            finally:
+                self._lock.release()
+            # end assure lock is released
+            # someone else is querying it right now - if that fails, we try ourselves
+            waiter.wait()
+        # end while we don't have a result
+
+        try:
+            res = fun()
+            self._lock.acquire()
+            try:
+                # don't fill a generation that was dropped, or keep what may have changed in the meanwhile
+                if ((generation is self._current or generation is self._previous) and
+                    invalidations == self._invalidations):
+                    generation.results[key] = res
+                # end store result
+            finally:
+                self._lock.release()
+            # end assure lock is released
+            return copy.deepcopy(res)
+        finally:
+            self._lock.acquire()
+            try:
+                del self._in_flight[key]
+            finally:
+                self._lock.release()
+            # end assure lock is released
+            waiter.set()
+        # end assure waiters wake up
+
+    def prefetch(self, connection, entity_type, entity_ids, fields):
+        """Fetch all given entities with the given fields using a single query, and keep them for the current
+        batch. Shotgun errors are passed on to the caller"""
+        entity_ids = sorted(set(entity_ids))
+        if not entity_ids:
+            return
+        # end bail out if there is nothing to do
+        entities = connection.find(entity_type, [['id', 'in', entity_ids]], list(fields))
+        self._lock.acquire()
+        try:
+            for entity in entities:
+                self._current.entities[(entity_type, entity['id'])] = entity
+            # end for each entity
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    ## -- End Interface -- @}
+
+# end class ShotgunRequestCache
+
+
+class CachingShotgunConnection(object):
+    """Wraps a shotgun connection to answer find() and find_one() from a ShotgunRequestCache.
+
+    Changes made through us invalidate cached results of the changed entity type once they are done. All other methods are
+    passed on to the wrapped connection.
+    """
+    __slots__ = ('_connection',
+                 '_cache')
+
+    def __init__(self, connection, cache):
+        """Initialize this instance
+        @param connection the shotgun connection to wrap
+        @param cache a ShotgunRequestCache, usually shared with other instances"""
+        self._connection = connection
+        self._cache = cache
+
+    def __getattr__(self, name):
+        if name == '_connection':
+            raise AttributeError(name)
+        # end prevent recursion if we are not initialized
+        return getattr(self._connection, name)
+
+    # -------------------------
+    ## @name Shotgun Interface
+    # @{
+
+    def find(self, entity_type, filters, fields=None, *args, **kwargs):
+        key = ('find', entity_type, _freeze(filters), _freeze(fields), _freeze(args), _freeze(kwargs))
+        return self._cache.query(key, entity_type,
+                                 lambda: self._connection.find(entity_type, filters, fields, *args, **kwargs))
+
+    def find_one(self, entity_type, filters, fields=None, *args, **kwargs):
+        key = ('find_one', entity_type, _freeze(filters), _freeze(fields), _freeze(args), _freeze(kwargs))
+        entity_id = None
+        if not args and not kwargs:
+            entity_id = _entity_id(filters)
+        # end only simple queries can be answered from prefetched entities
+        return self._cache.query(key, entity_type,
+                                 lambda: self._connection.find_one(entity_type, filters, fields, *args, **kwargs),
+                                 entity_id, fields)
+
+    def create(self, entity_type, *args, **kwargs):
+        try:
+            return self._connection.create(entity_type, *args, **kwargs)
+        finally:
+            self._cache.invalidate(entity_type)
+        # end assure cache is invalidated
+
+    def update(self, entity_type, entity_id, *args, **kwargs):
+        try:
+            return self._connection.update(entity_type, entity_id, *args, **kwargs)
+        finally:
+            self._cache.invalidate(entity_type, entity_id)
+        # end assure cache is invalidated
+
+    def delete(self, entity_type, entity_id, *args, **kwargs):
+        try:
+            return self._connection.delete(entity_type, entity_id, *args, **kwargs)
+        finally:
+            self._cache.invalidate(entity_type, entity_id)
+        # end assure cache is invalidated
+
+    def revive(self, entity_type, entity_id, *args, **kwargs):
+        try:
+            return self._connection.revive(entity_type, entity_id, *args, **kwargs)
+        finally:
+            self._cache.invalidate(entity_type, entity_id)
+        # end assure cache is invalidated
+
+    def batch(self, requests, *args, **kwargs):
+        try:
+            return self._connection.batch(requests, *args, **kwargs)
+        finally:
+            for request in requests:
+                self._cache.invalidate(request['entity_type'], request.get('entity_id'))
+            # end for each request
+        # end assure cache is invalidated
+
+    ## -- End Shotgun Interface -- @}
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def connection(self):
+        """@return the connection we wrap"""
+        return self._connection
+
+    ## -- End Interface -- @}
+
+# end class CachingShotgunConnection
+
+## -- End Types -- @}
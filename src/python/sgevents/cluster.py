@@ -0,0 +1,280 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.cluster
+@brief Lets multiple engines split the plugins between them, using leases in a shared store
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['LeaseStore', 'SQLiteLeaseStore', 'PluginLeaseManager']
+
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+
+from butility import abstractmethod
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class LeaseStore(object):
+    """Keeps named leases, each of which is held by at most one owner until it expires.
+    @note all methods must be safe to call from multiple threads and processes"""
+    __slots__ = ()
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    @abstractmethod
+    def acquire(self, name, owner, ttl):
+        """Obtain or renew the lease of the given name for the given owner, for ttl seconds from now
+        @return True if owner holds the lease, False if someone else holds it"""
+
+    @abstractmethod
+    def release(self, name, owner):
+        """Give up the lease of the given name, if it is held by owner"""
+
+    @abstractmethod
+    def leases(self):
+        """@return dict of name: owner pairs of all leases which didn't yet expire"""
+
+    ## -- End Interface -- @}
+
+# end class LeaseStore
+
+
+class SQLiteLeaseStore(LeaseStore):
+    """Keeps leases in an sqlite database, which can be shared by processes on one host, or on a file system
+    with working file locks. Expiry times are based on the clock of each node, which must be in sync"""
+    __slots__ = ('_path', )
+
+    ## Seconds to wait for a lock on the database
+    LOCK_TIMEOUT = 10.0
+
+    def __init__(self, path):
+        self._path = path
+        db = self._connect()
+        try:
+            db.execute('CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires REAL)')
+        finally:
+            db.close()
+        # end assure database is closed
+
+    def _connect(self):
+        """@return a new database connection in autocommit mode. We never share them between threads"""
+        return sqlite3.connect(self._path, timeout=self.LOCK_TIMEOUT, isolation_level=None)
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def acquire(self, name, owner, ttl):
+        db = self._connect()
+        try:
+            # take the write lock right away, so nobody can acquire the lease between our read and write
+            db.execute('BEGIN IMMEDIATE')
+            now = time.time()
+            row = db.execute('SELECT owner, expires FROM leases WHERE name = ?', (name, )).fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                db.execute('ROLLBACK')
+                return False
+            # end bail out if held by someone else
+            db.execute('INSERT OR REPLACE INTO leases (name, owner, expires) VALUES (?, ?, ?)',
+                       (name, owner, now + ttl))
+            db.execute('COMMIT')
+            return True
+        finally:
+            db.close()
+        # end assure database is closed
+
+    def release(self, name, owner):
+        db = self._connect()
+        try:
+            db.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
+        finally:
+            db.close()
+        # end assure database is closed
+
+    def leases(self):
+        db = self._connect()
+        try:
+            return dict(db.execute('SELECT name, owner FROM leases WHERE expires > ?', (time.time(), )))
+        finally:
+            db.close()
+        # end assure database is closed
+
+    ## -- End Interface -- @}
+
+# end class SQLiteLeaseStore
+
+
+class PluginLeaseManager(object):
+    """Decides which plugins a node owns, by holding one lease per plugin in a LeaseStore.
+
+    Each node announces itself with a lease of its own, and takes its fair share of all plugins, which is
+    the amount of plugins divided by the amount of live nodes. Plugins of nodes which stop renewing their
+    leases are taken over by the others once the leases expire.
+    Leases are renewed by rebalance(), and by a thread started with start() to cover long polls.
+    @note all methods are thread-safe
+    """
+    __slots__ = ('_store',
+                 '_node_id',
+                 '_ttl',
+                 '_log',
+                 '_lock',
+                 '_held',
+                 '_stop_event',
+                 '_thread')
+
+    def __init__(self, store, node_id, ttl, log=None):
+        """Initialize this instance
+        @param store the LeaseStore shared by all nodes
+        @param node_id a string identifying this node, unique in the cluster
+        @param ttl seconds after which the leases of a node expire if they are not renewed"""
+        self._store = store
+        self._node_id = node_id
+        self._ttl = ttl
+        self._log = log or logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._held = set()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def _plugin_lease(cls, key):
+        return 'plugin:' + key
+
+    @classmethod
+    def _node_lease(cls, node_id):
+        return 'node:' + node_id
+
+    def _acquire(self, key):
+        return self._store.acquire(self._plugin_lease(key), self._node_id, self._ttl)
+
+    def _release(self, key):
+        self._store.release(self._plugin_lease(key), self._node_id)
+        self._held.discard(key)
+
+    def _keep_renewing(self, interval):
+        while True:
+            # Event.wait() returns None instead of the flag on python 2.6
+            self._stop_event.wait(interval)
+            if self._stop_event.is_set():
+                break
+            # end stop once asked to
+            try:
+                self.renew()
+            except Exception:
+                self._log.error("Failed to renew leases of node '%s'", self._node_id, exc_info=True)
+            # end keep trying
+        # end while not stopped
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def node_id(self):
+        """@return the id of our node"""
+        return self._node_id
+
+    def owned(self):
+        """@return frozenset of the keys of all plugins we hold leases for"""
+        return frozenset(self._held)
+
+    def renew(self):
+        """Renew our node lease and the leases of all plugins we hold
+        @return frozenset of keys of plugins we still hold"""
+        self._lock.acquire()
+        try:
+            self._store.acquire(self._node_lease(self._node_id), self._node_id, self._ttl)
+            lost = set(key for key in self._held if not self._acquire(key))
+            if lost:
+                self._log.warning("Node '%s' lost the leases of plugins %s", self._node_id, ', '.join(sorted(lost)))
+                self._held -= lost
+            # end handle lost leases
+            return frozenset(self._held)
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def rebalance(self, keys):
+        """Renew our leases, and acquire or release leases of the plugins with the given keys until we hold
+        our fair share of them
+        @return frozenset of keys of plugins we hold afterwards"""
+        self._lock.acquire()
+        try:
+            self.renew()
+            leases = self._store.leases()
+            nodes = set(owner for name, owner in leases.iteritems() if name == self._node_lease(owner))
+            nodes.add(self._node_id)
+            share = -(-len(keys) // len(nodes))
+
+            for key in self._held - set(keys):
+                self._release(key)
+            # end release leases of plugins which are gone
+
+            held = [key for key in keys if key in self._held]
+            while len(held) > share:
+                self._release(held.pop())
+            # end give plugins to other nodes
+
+            # nodes try free plugins in different orders, to avoid contention
+            free = sorted((key for key in keys if key not in self._held and self._plugin_lease(key) not in leases),
+                          key=lambda key: zlib.crc32(self._node_id + key))
+            for key in free:
+                if len(self._held) >= share:
+                    break
+                # end stop at our share
+                if self._acquire(key):
+                    self._held.add(key)
+                # end take plugin
+            # end for each free plugin
+            return frozenset(self._held)
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def start(self, interval=None):
+        """Renew our leases in a daemon thread, every given amount of seconds, a third of our ttl by default"""
+        if self._thread is not None:
+            return
+        # end bail out if running
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._keep_renewing, args=(interval or self._ttl / 3.0, ),
+                                        name='sg-events-leases')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, release=True):
+        """Stop renewing leases
+        @param release if True, all our leases are released, so other nodes can take over right away"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        # end stop thread
+        if not release:
+            return
+        # end bail out if leases are kept
+
+        self._lock.acquire()
+        try:
+            for key in list(self._held):
+                self._release(key)
+            # end for each plugin
+            self._store.release(self._node_lease(self._node_id), self._node_id)
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    ## -- End Interface -- @}
+
+# end class PluginLeaseManager
+
+## -- End Types -- @}
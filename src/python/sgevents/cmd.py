@@ -8,23 +8,72 @@
 """
 __all__ = ['ShotgunEventEngineCommand']
 
+import sys
+
 from bcmd import DaemonCommandMixin
 
 from butility import Version
 from bcmd import Command
 
-from .engine import EventEngine
-
 
 class ShotgunEventEngineCommand(DaemonCommandMixin, Command):
     """Makes the events engine available from the commandline"""
-    __slots__ = ()
+    __slots__ = ('_thread_type', )
 
     name = 'shotgun-events'
     version = Version('0.1.0')
     description = "polls shotgun events and have plugins react to them"
 
-    ThreadType = EventEngine
+    def __init__(self, *args, **kwargs):
+        super(ShotgunEventEngineCommand, self).__init__(*args, **kwargs)
+        self._thread_type = None
+
+    @property
+    def ThreadType(self):
+        """@return the engine type to run, as chosen on the commandline"""
+        if self._thread_type is None:
+            # the engine imports shotgun_api3 and more, which isn't needed to parse our arguments
+            from .engine import EventEngine
+            self._thread_type = EventEngine
+        # end import engine on first use
+        return self._thread_type
+
+    def _profile_startup(self):
+        """Start an engine without processing events, and write a report about where the time went to stdout
+        @return exit code"""
+        from .startup import StartupProfile
+        profile = StartupProfile()
+        engine_type = profile.run('import engine', lambda: self.ThreadType)
+        engine = profile.run('create engine and plugins', engine_type)
+        try:
+            profile.run('prepare event processing', engine._prepare_event_processing)
+        finally:
+            engine._shutdown()
+        # end assure engine releases everything
+        profile.write_report(sys.stdout)
+        return 0
+
+    def setup_argparser(self, parser):
+        super(ShotgunEventEngineCommand, self).setup_argparser(parser)
+        help = "Dispatch events on an asyncio event loop, allowing plugins with coroutine handlers to run "
+        help += "concurrently. Requires the trollius package"
+        parser.add_argument('--async', dest='async_engine', action='store_true', default=False, help=help)
+        help = "Start the engine and its plugins without processing any event, and print how long each step "
+        help += "took, along with the functions taking most of the time"
+        parser.add_argument('--profile-startup', dest='profile_startup', action='store_true', default=False,
+                            help=help)
+        return self
+
+    def execute(self, args, remaining_args):
+        if args.async_engine:
+            # only import it if needed, as it has additional dependencies
+            from .asyncengine import AsyncEventEngine
+            self._thread_type = AsyncEventEngine
+        # end choose engine
+        if args.profile_startup:
+            return self._profile_startup()
+        # end handle profiling
+        return super(ShotgunEventEngineCommand, self).execute(args, remaining_args)
 
 # end class ShotgunEventEngineCommand
 
@@ -0,0 +1,229 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.dispatch
+@brief Strategies to dispatch work to plugins, either serially or concurrently
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['EventDispatcher', 'ThreadPoolEventDispatcher']
+
+import logging
+import threading
+import Queue
+from collections import deque
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class EventDispatcher(object):
+    """Runs work submitted for a plugin right away, in the calling thread.
+
+    Work submitted for the same plugin is always executed in submission order, which is what all
+    dispatchers have in common.
+    """
+    __slots__ = ('_log', )
+
+    def __init__(self, log=None):
+        """Initialize this instance
+        @param log logger to use for reporting unhandled exceptions"""
+        self._log = log or logging.getLogger(__name__)
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def is_concurrent(self):
+        """@return True if submitted work may run concurrently with the caller"""
+        return False
+
+    def submit(self, plugin, fun, *args):
+        """Run fun(*args) once all work previously submitted for plugin is done.
+        @param plugin any hashable object identifying the order in which work is to be done"""
+        fun(*args)
+
+    def drain(self, plugin):
+        """Block until all work submitted for the given plugin is done"""
+
+    def forget(self, plugin):
+        """Release everything kept for the given plugin, once all work submitted for it is done"""
+        self.drain(plugin)
+
+    def wait(self):
+        """Block until all submitted work is done"""
+
+    def shutdown(self):
+        """Wait for all work to be done and release all resources. Submitting work afterwards is possible,
+        but may reacquire resources"""
+
+    ## -- End Interface -- @}
+
+# end class EventDispatcher
+
+
+class _PluginLane(object):
+    """Keeps work items for a single plugin"""
+    __slots__ = ('items',     # a deque of (fun, args) tuples
+                 'scheduled'  # if True, a worker owns this lane, or it is waiting for one
+                 )
+
+    def __init__(self):
+        self.items = deque()
+        self.scheduled = False
+
+# end class _PluginLane
+
+
+class ThreadPoolEventDispatcher(EventDispatcher):
+    """Dispatches work to a fixed amount of worker threads.
+
+    Each plugin has its own lane of work, which is processed by at most one worker at a time. This keeps
+    the order of events per plugin, while independent plugins run concurrently.
+    """
+    __slots__ = ('_cond',
+                 '_lanes',
+                 '_ready',
+                 '_workers',
+                 '_num_threads',
+                 '_max_queue_depth',
+                 '_outstanding')
+
+    ## Amount of items a worker processes from a lane before giving other lanes a chance
+    QUANTUM = 16
+
+    def __init__(self, num_threads, max_queue_depth=1000, log=None):
+        """Initialize this instance
+        @param num_threads amount of worker threads to use
+        @param max_queue_depth amount of items which may be queued per plugin before submit() blocks"""
+        super(ThreadPoolEventDispatcher, self).__init__(log)
+        assert num_threads > 0, "need at least one thread"
+        self._cond = threading.Condition()
+        self._lanes = dict()
+        self._ready = Queue.Queue()
+        self._max_queue_depth = max(1, max_queue_depth)
+        self._outstanding = 0
+        self._num_threads = num_threads
+        self._workers = list()
+
+    def _start_workers(self):
+        """Start all of our worker threads"""
+        for tid in range(self._num_threads):
+            worker = threading.Thread(target=self._work, name='sg-events-dispatch-%i' % tid)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+        # end for each thread to start
+
+    def _work(self):
+        """Worker thread main loop"""
+        while True:
+            lane = self._ready.get()
+            if lane is None:
+                break
+            # end handle shutdown
+
+            for count in xrange(self.QUANTUM):
+                with self._cond:
+                    if not lane.items:
+                        lane.scheduled = False
+                        self._cond.notify_all()
+                        break
+                    # end stop if there is nothing to do
+                    fun, args = lane.items.popleft()
+                    self._cond.notify_all()
+                # end pop item
+
+                try:
+                    fun(*args)
+                except Exception:
+                    self._log.critical("Unhandled exception while dispatching work", exc_info=True)
+                # end log unexpected errors
+
+                with self._cond:
+                    self._outstanding -= 1
+                    if not self._outstanding:
+                        self._cond.notify_all()
+                    # end wake up waiters
+                # end update counter
+            else:
+                with self._cond:
+                    if lane.items:
+                        self._ready.put(lane)
+                    else:
+                        lane.scheduled = False
+                        self._cond.notify_all()
+                    # end reschedule lane to be fair
+                # end handle quantum exhausted
+            # end for each item in quantum
+        # end while we are not shut down
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def is_concurrent(self):
+        return True
+
+    def submit(self, plugin, fun, *args):
+        """Queue the work, blocking while the plugin's lane holds too many items already"""
+        with self._cond:
+            if not self._workers:
+                self._start_workers()
+            # end start workers on demand
+            lane = self._lanes.get(plugin)
+            if lane is None:
+                lane = self._lanes[plugin] = _PluginLane()
+            # end create lane on demand
+            while len(lane.items) >= self._max_queue_depth:
+                self._cond.wait()
+            # end wait for space
+
+            lane.items.append((fun, args))
+            self._outstanding += 1
+            if not lane.scheduled:
+                lane.scheduled = True
+                self._ready.put(lane)
+            # end schedule lane
+        # end with lock
+
+    def drain(self, plugin):
+        with self._cond:
+            lane = self._lanes.get(plugin)
+            while lane is not None and (lane.items or lane.scheduled):
+                self._cond.wait()
+            # end wait for lane
+        # end with lock
+
+    def forget(self, plugin):
+        with self._cond:
+            while plugin in self._lanes and (self._lanes[plugin].items or self._lanes[plugin].scheduled):
+                self._cond.wait()
+            # end wait for lane
+            self._lanes.pop(plugin, None)
+        # end with lock
+
+    def wait(self):
+        with self._cond:
+            while self._outstanding:
+                self._cond.wait()
+            # end wait for work
+        # end with lock
+
+    def shutdown(self):
+        self.wait()
+        for worker in self._workers:
+            self._ready.put(None)
+        # end for each worker
+        for worker in self._workers:
+            worker.join()
+        # end for each worker
+        del self._workers[:]
+
+    ## -- End Interface -- @}
+
+# end class ThreadPoolEventDispatcher
+
+## -- End Types -- @}
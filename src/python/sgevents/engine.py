@@ -9,10 +9,12 @@
 __all__ = ['EventEngine']
 
 
+import os
 import time
 import logging
 import socket
-import cPickle as pickle
+import threading
+import Queue
 
 import shotgun_api3 as sg
 
@@ -20,10 +22,28 @@ import bapp
 from bshotgun import ProxyShotgunConnection
 from bapp import ApplicationSettingsMixin
 from butility import (TerminatableThread,
-                      DictObject,
                       Path)
 
 from .plugin import EventEnginePlugin
+from .event import EventView
+from .dispatch import (EventDispatcher,
+                       ThreadPoolEventDispatcher)
+from .routing import EventFilterIndex
+from .pool import (ShotgunConnectionPool,
+                   PooledShotgunConnection)
+from .logqueue import LogQueue
+from .reload import (PluginModuleWatcher,
+                     reload_module)
+from .cache import (ShotgunRequestCache,
+                    CachingShotgunConnection)
+from .scheduler import (PollScheduler,
+                        AdaptivePollScheduler)
+from .metrics import (EngineMetrics,
+                      MetricsHTTPServer)
+from .journal import (PickleEventJournal,
+                      WriteAheadLogEventJournal,
+                      SQLiteEventJournal,
+                      EventJournalError)
 from .utility import (CustomSMTPHandler,
                       engine_schema,
                       set_file_path_on_logger,
@@ -31,6 +51,16 @@ from .utility import (CustomSMTPHandler,
                       EventEngineError)
 
 
+class EventPage(list):
+    """A list of events, which knows the ids of all events in its range, including the ones that didn't
+    match the filter used to fetch the page"""
+    __slots__ = ('event_ids', # sorted list of ids of all existing events in the page's range
+                 'num_rows'   # amount of rows the id query returned
+                 )
+
+# end class EventPage
+
+
 class EventEngine(TerminatableThread, ApplicationSettingsMixin):
     """
     The engine holds the main loop of event processing.
@@ -39,9 +69,30 @@ class EventEngine(TerminatableThread, ApplicationSettingsMixin):
     """
 
     __slots__ = ('log',
-                 '_event_id_data',
+                 '_log_queue',
+                 '_journal',
+                 '_dispatcher',
+                 '_filter_index',
+                 '_filter_indices',
+                 '_request_cache',
+                 '_scheduler',
+                 '_wakeup',
+                 '_metrics',
+                 '_metrics_server',
+                 '_last_snapshot_time',
+                 '_newest_event_id',
                  '_plugin_context',
-                 '_sg')
+                 '_plugins',
+                 '_module_watcher',
+                 '_last_reload_check',
+                 '_cluster',
+                 '_owned_plugins',
+                 '_spool',
+                 '_dead_letters',
+                 '_pool',
+                 '_pooled_connections',
+                 '_sg',
+                 '_sg_is_shared')
 
     _schema = engine_schema
 
@@ -54,32 +105,86 @@ class EventEngine(TerminatableThread, ApplicationSettingsMixin):
 
     ## A type which can create a shotgun connection without any arguments
     ProxyShotgunConnectionType = ProxyShotgunConnection
+
+    ## EventLogEntry fields we always fetch, as we need them to dispatch events
+    REQUIRED_EVENT_FIELDS = ('id', 'event_type', 'attribute_name', 'session_uuid')
+
+    ## EventLogEntry fields we fetch for plugins which don't declare their required_fields
+    EVENT_FIELDS = REQUIRED_EVENT_FIELDS + ('meta', 'entity', 'user', 'project')
+
+    ## Priorities plugins may have, in the order in which their lanes are served, see EventEnginePlugin.priority
+    PRIORITY_LANES = ('interactive', 'normal', 'bulk')
+
+    ## Maps the journal.type configuration value to the EventJournal type to use
+    EventJournalTypes = {'pickle' : PickleEventJournal,
+                         'wal' : WriteAheadLogEventJournal,
+                         'sqlite' : SQLiteEventJournal}
     
     ## -- End Configuration -- @}
 
     def __init__(self, sg_connection = None):
         """
         Initialize this instance, with an optional sg_connection.
-        @param sg_connection if unset, it will be created from ProxyShotgunConnectionType. Useful for testing,
-        as the entire connection can be mocked as needed
+        @param sg_connection if unset, it will be created from ProxyShotgunConnectionType, or leased from our
+        connection pool if one is configured. Useful for testing, as the entire connection can be mocked as needed
         """
         super(EventEngine, self).__init__()
-        self._event_id_data = {}
-        self._sg = sg_connection or self.ProxyShotgunConnectionType()
-        self._plugin_context = None
-
         config = self.settings_value()
 
         # Setup the logger for the main engine
+        self._log_queue = None
+        if config.logging.asynchronous:
+            self._log_queue = LogQueue(config.logging['queue-size'])
+        # end keep slow handlers off the dispatch path
         self.log = logging.getLogger(self.LOG_NAME)
         if config.logging.path:
-            set_file_path_on_logger(self.log, config.logging.path.expand_or_raise())
+            set_file_path_on_logger(self.log, config.logging.path.expand_or_raise(), self._log_queue)
         # end don't do path logging unless required
         # Set the engine logger for email output.
-        set_emails_on_logger(self.log, config.logging.email, True)
+        set_emails_on_logger(self.log, config.logging.email, True, self._log_queue)
 
         # end handle initial logging configuration
+        self._journal = None
+        self._pool = None
+        self._pooled_connections = dict()
+        self._sg_is_shared = sg_connection is not None
+        if sg_connection is None and config['connection-pool'].size:
+            self._pool = self._new_connection_pool(config)
+            sg_connection = self._pooled_connection()
+        # end setup pool
+        self._sg = sg_connection or self.ProxyShotgunConnectionType()
+        self._plugin_context = None
+        self._plugins = list()
+        self._module_watcher = PluginModuleWatcher()
+        self._last_reload_check = time.time()
+
+        self._dispatcher = self._new_dispatcher(config.dispatch)
+        # the index of the lane we currently dispatch to, see _select_lane()
+        self._filter_index = EventFilterIndex()
+        self._filter_indices = dict()
+        self._request_cache = config.cache.enabled and ShotgunRequestCache() or None
+        self._scheduler = self._new_scheduler(config)
+        self._wakeup = threading.Event()
+        self._metrics = EngineMetrics()
+        self._metrics_server = None
+        self._last_snapshot_time = 0
+        self._newest_event_id = None
+        self._spool = None
+        if config.spool.directory:
+            from .spool import EventSpool
+            self._spool = EventSpool(config.spool.directory.expand_or_raise(), config.spool['segment-size'],
+                                     config.spool['max-segments'])
+        # end setup spool
+        # plugin state key: EventSpool with the events the plugin gave up on
+        self._dead_letters = dict()
+        self._cluster = self._new_cluster(config)
+        # keys of the plugins we own in a cluster, or None if we own all of them
+        self._owned_plugins = None
+        if self._cluster is not None:
+            self._owned_plugins = frozenset()
+        # end own nothing until we have leases
         self._instantiate_plugins(config)
+        self._release_connection(self._sg)
 
 
     def _instantiate_plugins(self, settings):
@@ -87,26 +192,27 @@ class EventEngine(TerminatableThread, ApplicationSettingsMixin):
         We will initialize them with everything they need"""
         num_plugins = None
 
-        # This would allow us to reload, assuming the state was saved previously
+        # This would allow us to instantiate everything again, assuming the state was saved previously.
+        # Plugins of changed modules are replaced one by one in _check_plugin_modules()
         stack = bapp.main().context()
         if self._plugin_context:
+            self._stop_plugin_workers()
+            for plugin in self._iter_all_plugins():
+                self._close_plugin(plugin)
+            # end for each previous plugin
             stack.remove(self._plugin_context)
         # end pop previous context
 
         self._plugin_context = stack.push('%s-plugins' % self.LOG_NAME)
+        self._pooled_connections = dict()
+        self._plugins = list()
         for num_plugins, plugin_type in enumerate(stack.types(EventEnginePlugin)):
-            plugin_prefix = '%s.plugin.%s.log' % (self.LOG_NAME, plugin_type.plugin_name())
-            log = logging.getLogger(plugin_prefix)
-            set_emails_on_logger(log, settings.logging.email, True)
-            log.setLevel(self.log.level)
-            assert plugin_type._auto_register_instance_, 'plugin-instances are expected to be auto-registered'
-
-            if settings.logging['one-file-per-plugin']:
-                set_file_path_on_logger(log, settings.logging['plugin-log-tree'].expand_or_raise() / plugin_prefix)
-            # end setup file logging
-
-            plugin_type(self._sg, log)
+            self._plugins.append(self._new_plugin(plugin_type, settings))
         # end for each plugin to create
+        if settings.reload.enabled:
+            # each module costs a stat, which adds up on network file systems
+            self._module_watcher.watch(type(plugin) for plugin in self._plugins)
+        # end watch plugin modules
 
         if num_plugins is None:
             stack.pop()
@@ -116,9 +222,313 @@ class EventEngine(TerminatableThread, ApplicationSettingsMixin):
             self._load_event_id_data()
         # end remove our context if it's empty
 
-    def _iter_plugins(self):
+    def _new_dispatcher(self, settings):
+        """@return a new EventDispatcher, as configured by the given dispatch settings"""
+        if settings.threads:
+            return ThreadPoolEventDispatcher(settings.threads, settings['max-queue-depth'], self.log)
+        return EventDispatcher(self.log)
+
+    def _new_scheduler(self, settings):
+        """@return a new PollScheduler, as configured by the given engine settings"""
+        polling = settings.polling
+        if polling.adaptive:
+            return AdaptivePollScheduler(settings['poll-every'].seconds, polling['busy-interval-ms'] / 1000.0,
+                                         polling['backoff-factor'], polling['busy-threshold'])
+        return PollScheduler(settings['poll-every'].seconds)
+
+    def _new_plugin(self, plugin_type, settings):
+        """@return a new instance of the given plugin type, with its own logger and connection, as configured by
+        the given engine settings"""
+        plugin_prefix = '%s.plugin.%s.log' % (self.LOG_NAME, plugin_type.plugin_name())
+        log = logging.getLogger(plugin_prefix)
+        set_emails_on_logger(log, settings.logging.email, True, self._log_queue)
+        log.setLevel(self.log.level)
+        assert plugin_type._auto_register_instance_, 'plugin-instances are expected to be auto-registered'
+        if plugin_type.priority not in self.PRIORITY_LANES:
+            raise EventEngineError("Plugin '%s' has priority '%s', but it must be one of %s"
+                                   % (plugin_type.plugin_name(), plugin_type.priority, 
+                                      ', '.join(self.PRIORITY_LANES)))
+        # end verify priority
+
+        if settings.logging['one-file-per-plugin']:
+            set_file_path_on_logger(log, settings.logging['plugin-log-tree'].expand_or_raise() / plugin_prefix,
+                                    self._log_queue)
+        # end setup file logging
+
+        pooled_connection = connection = self._plugin_connection(plugin_type)
+        if self._request_cache is not None:
+            connection = CachingShotgunConnection(connection, self._request_cache)
+        # end share query results
+        plugin = plugin_type(connection, log)
+        if isinstance(pooled_connection, PooledShotgunConnection):
+            self._pooled_connections[plugin] = pooled_connection
+        # end keep connection to release it after each dispatch
+        if plugin_type.run_in_process or plugin_type.plugin_name() in settings['process-isolation'].plugins:
+            # only import it if needed, like all optional parts, to keep our startup fast
+            from .isolation import ProcessPluginWorker
+            plugin.set_worker(ProcessPluginWorker(plugin_type, self.ProxyShotgunConnectionType, log))
+        # end setup process isolation
+        plugin.set_dead_letter_store(self._dead_letter_store(plugin, settings))
+        return plugin
+
+    def _dead_letter_store(self, plugin, settings):
+        """@return the EventSpool keeping the events the given plugin gave up on, or None if they are not kept.
+        Instances replacing a plugin after a reload use the same store"""
+        config = settings['dead-letter']
+        if not config.directory:
+            return None
+        # end bail out if parked events are just logged
+        key = plugin.state_key()
+        store = self._dead_letters.get(key)
+        if store is None:
+            from .spool import EventSpool
+            store = self._dead_letters[key] = EventSpool(config.directory.expand_or_raise() / key,
+                                                         config['segment-size'])
+        # end create store on first use
+        return store
+
+    def _forget_plugin(self, plugin):
+        """Release everything we keep for the given plugin, which was replaced and will not be called anymore"""
+        self._dispatcher.forget(plugin)
+        if plugin.worker() is not None:
+            plugin.worker().stop()
+        # end stop worker
+        self._close_plugin(plugin)
+        self._release_connection(self._pooled_connections.pop(plugin, None))
+
+    def _close_plugin(self, plugin):
+        """Have the given plugin release its resources, logging any error"""
+        try:
+            plugin.close()
+        except Exception:
+            self.log.error("Failed to close plugin %s", plugin, exc_info=True)
+        # end ignore errors, we are done with the plugin anyway
+
+    def _check_plugin_modules(self):
+        """Reload changed plugin modules if it is time to check for changes.
+        Must only be called while no plugin is processing events"""
+        config = self.settings_value().reload
+        if not config.enabled or time.time() - self._last_reload_check < config['check-every'].seconds:
+            return
+        # end bail out if there is nothing to do
+        self._last_reload_check = time.time()
+        for module_name in self._module_watcher.changed():
+            self._reload_plugin_module(module_name)
+        # end for each changed module
+
+    def _reload_plugin_module(self, module_name):
+        """Import the module of the given name again, and replace all plugins defined in it by new instances of 
+        the new plugin types. The new instances continue where the previous ones left off. If anything fails, the 
+        previous instances are kept"""
+        plugins = [plugin for plugin in self._plugins if type(plugin).__module__ == module_name]
+        if not plugins:
+            return
+        # end bail out if there is nothing to replace
+
+        # make sure the state we pass on doesn't depend on anything kept in memory
+        for plugin in plugins:
+            if plugin.is_active():
+                plugin.flush_events()
+                plugin.flush_writes()
+            # end finish work
+        # end for each plugin
+
+        try:
+            module = reload_module(module_name)
+        except Exception:
+            self.log.error("Failed to reload plugin module '%s' - keeping its previous version", module_name,
+                           exc_info=True)
+            return
+        # end handle import errors
+
+        settings = self.settings_value()
+        for plugin in plugins:
+            plugin_type = getattr(module, type(plugin).__name__, None)
+            if not isinstance(plugin_type, type) or not issubclass(plugin_type, EventEnginePlugin):
+                self.log.error("Plugin type '%s' is gone from module '%s' - keeping its previous version",
+                               type(plugin).__name__, module_name)
+                continue
+            # end handle removed types
+            try:
+                new_plugin = self._new_plugin(plugin_type, settings)
+                new_plugin.set_state(plugin.state())
+            except Exception:
+                self.log.error("Failed to create a new instance of plugin '%s' - keeping its previous version",
+                               plugin, exc_info=True)
+                continue
+            # end handle instantiation errors
+            self._forget_plugin(plugin)
+            self._plugins[self._plugins.index(plugin)] = new_plugin
+            self.log.info("Reloaded plugin '%s' from module '%s'", new_plugin, module_name)
+        # end for each plugin to replace
+
+    def _new_cluster(self, settings):
+        """@return a new PluginLeaseManager, as configured by the given engine settings, or None if this
+        engine isn't part of a cluster"""
+        config = settings.cluster
+        if not config['lease-store']:
+            return None
+        # end bail out if not clustered
+        if settings.journal.type != 'sqlite':
+            raise EventEngineError("Engines in a cluster must share an 'sqlite' journal, got '%s'"
+                                   % settings.journal.type)
+        # end assure journal can be shared
+        node_id = config['node-id'] or '%s:%i' % (socket.gethostname(), os.getpid())
+        from .cluster import (SQLiteLeaseStore,
+                              PluginLeaseManager)
+        return PluginLeaseManager(SQLiteLeaseStore(config['lease-store'].expand_or_raise()), node_id,
+                                  config['lease-ttl'].seconds, self.log)
+
+    def _new_connection_pool(self, settings):
+        """@return a new ShotgunConnectionPool, as configured by the given engine settings
+        @throws EventEngineError if the pool is too small for all connections we use at the same time"""
+        config = settings['connection-pool']
+        # we keep one connection while fetching, the prefetching thread uses another one, and each dispatching
+        # thread leases one as well
+        min_size = 1 + int(settings.fetch.prefetch) + self._num_dispatching_threads(settings)
+        if config.size < min_size:
+            raise EventEngineError("connection-pool.size must be at least %i with the current fetch and dispatch "
+                                   "settings, got %i" % (min_size, config.size))
+        # end assure leases don't time out
+        return ShotgunConnectionPool(self.ProxyShotgunConnectionType, config.size,
+                                     settings['socket-timeout'].seconds, config['check-idle-after'].seconds,
+                                     self.log)
+
+    def _num_dispatching_threads(self, settings):
+        """@return the amount of threads calling plugins at the same time, as configured by the given engine 
+        settings"""
+        return max(1, settings.dispatch.threads)
+
+    def _pooled_connection(self, keep_lease=True):
+        """@return a new connection facade leasing from our pool
+        @param keep_lease see PooledShotgunConnection"""
+        return PooledShotgunConnection(self._pool, self.settings_value()['connection-pool']['lease-timeout'].seconds,
+                                       keep_lease)
+
+    def _release_connection(self, connection):
+        """Return the connection leased by the given connection facade to our pool, if there is one"""
+        if isinstance(connection, PooledShotgunConnection):
+            connection.release()
+        # end release leased connection
+
+    def _wait(self, seconds):
+        """Wait the given amount of seconds, unless we are asked to stop in the meantime"""
+        if seconds > 0:
+            self._wakeup.wait(seconds)
+        # end don't bother waiting
+
+    def _plugin_connection(self, plugin_type):
+        """@return a shotgun connection for use by a plugin of the given type"""
+        if self._pool is not None:
+            # the connection is leased for the duration of each dispatch
+            return self._pooled_connection()
+        if self._sg_is_shared or not self._dispatcher.is_concurrent():
+            return self._sg
+        # Connections aren't thread-safe, so each plugin gets its own one
+        return self.ProxyShotgunConnectionType()
+
+    def _stop_plugin_workers(self):
+        """Stop the worker processes of all plugins that have one"""
+        for plugin in self._iter_all_plugins():
+            if plugin.worker() is not None:
+                plugin.worker().stop()
+            # end stop worker
+        # end for each plugin
+
+    def _iter_all_plugins(self):
         """@return iterator over all our plugin instances"""
-        return iter(bapp.main().context().instances(EventEnginePlugin))
+        return iter(self._plugins)
+
+    def _iter_plugins(self):
+        """@return iterator over all plugin instances we own, which are all of them unless we are in a cluster"""
+        if self._owned_plugins is None:
+            return self._iter_all_plugins()
+        return (plugin for plugin in self._iter_all_plugins() if plugin.state_key() in self._owned_plugins)
+
+    def _priority_lanes(self):
+        """@return list of tuple(priority, plugins) with a list of our plugins for each lane that has any, 
+        in the order of PRIORITY_LANES. The lanes configured in our settings take precedence over the 
+        priority of the plugins"""
+        config = self.settings_value().lanes
+        lanes = dict()
+        for plugin in self._iter_plugins():
+            priority = plugin.priority
+            for name in self.PRIORITY_LANES:
+                if plugin.plugin_name() in config[name].plugins:
+                    priority = name
+                    break
+                # end use configured lane
+            # end for each lane
+            lanes.setdefault(priority, list()).append(plugin)
+        # end for each plugin
+        return [(priority, lanes[priority]) for priority in self.PRIORITY_LANES if priority in lanes]
+
+    def _select_lane(self, priority, plugins):
+        """Dispatch events to the given plugins of the lane with the given priority from now on. Each lane
+        keeps its own filter index.
+        @return maximum amount of pages the lane may fetch per poll, or 0 if there is no limit"""
+        index = self._filter_indices.get(priority)
+        if index is None:
+            index = self._filter_indices[priority] = EventFilterIndex()
+        # end create index on first use
+        index.update(plugins)
+        self._filter_index = index
+        return self.settings_value().lanes[priority]['max-pages-per-poll']
+
+    def _update_ownership(self):
+        """Take or give up plugins to own our share of them in the cluster, and load the state of the ones we
+        took from the journal. Must only be called while no plugin is processing events"""
+        owned = self._cluster.rebalance(sorted(plugin.state_key() for plugin in self._iter_all_plugins()))
+        gained = owned - self._owned_plugins
+        lost = self._owned_plugins - owned
+        self._owned_plugins = owned
+        if lost:
+            self.log.info("Node '%s' handed over plugins %s", self._cluster.node_id(), ', '.join(sorted(lost)))
+        # end log lost plugins
+        if gained:
+            self.log.info("Node '%s' took over plugins %s", self._cluster.node_id(), ', '.join(sorted(gained)))
+            self._adopt_plugins(gained)
+        # end load state of new plugins
+        self._metrics.owned_plugins.set(len(owned))
+
+    def _adopt_plugins(self, keys):
+        """Load the journaled state of the plugins with the given keys, which were possibly processed by 
+        another node until now. Plugins without state start at the latest event"""
+        plugins = [plugin for plugin in self._iter_all_plugins() if plugin.state_key() in keys]
+        if not plugins:
+            return
+        # end bail out if there is nothing to do
+
+        # loading discards uncommitted changes
+        self._save_event_id_data(gather=False)
+        states = dict()
+        try:
+            states = self._journal.load()
+        except EventJournalError as err:
+            self.log.error(str(err))
+        except (OSError, IOError) as err:
+            raise EventEngineError("Could not open event journal at '%s': %s" % (self._journal.path(), err))
+        # end convert OSErrors
+
+        missing = list()
+        for plugin in plugins:
+            state = states.get(plugin.state_key())
+            if state:
+                plugin.set_state(state)
+            else:
+                missing.append(plugin)
+            # end handle missing state
+        # end for each plugin
+        if not missing:
+            return
+        # end bail out if all states were loaded
+
+        last_event_id = self._fetch_last_event_id()
+        for plugin in missing:
+            plugin.set_event_id(last_event_id)
+            self._journal.record(plugin.state_key(), plugin.state())
+        # end for each plugin without state
+        self._save_event_id_data(gather=False)
 
     def _journal_path(self):
         """@return path to journal file"""
@@ -140,92 +550,143 @@ class EventEngine(TerminatableThread, ApplicationSettingsMixin):
         processing from there.
         @throws EventEngineError
         """
-        event_id_file = self._journal_path()
+        if self._journal is None:
+            self._journal = self._new_journal()
+        # end create journal on first use
+        if self._cluster is not None:
+            # plugins are loaded once we own them
+            self._adopt_plugins(self._owned_plugins)
+            return
+        # end handle cluster
 
-        read_journal = False
-        if event_id_file.exists():
-            try:
-                fh = open(event_id_file, 'rb')
-                try:
-                    self._event_id_data = pickle.load(fh)
-
-                    # Provide event id info to the plugin. Once
-                    # they've figured out what to do with it, ask them for their
-                    # last processed id.
-                    for plugin in self._iter_plugins():
-                        state = self._event_id_data.get(plugin.state_key())
-                        if state:
-                            plugin.set_state(state)
-                        # end have state for collection
-                    # end for each collection
-                    read_journal = True
-                except pickle.UnpicklingError as err:
-                    self.log.error(str(err))
-                # end ignore 
-                fh.close()
-            except OSError as err:
-                # this must stop operation !
-                msg = "Could not open event journal at '%s'." % event_id_file
-                raise EventDaemonError(msg, exc_info=True)
-            # end convert OSErrors
-        # end try reading event journal
+        states = None
+        try:
+            states = self._journal.load()
+        except EventJournalError as err:
+            self.log.error(str(err))
+        except (OSError, IOError) as err:
+            # this must stop operation !
+            raise EventEngineError("Could not open event journal at '%s': %s" % (self._journal.path(), err))
+        # end convert OSErrors
+
+        # Provide event id info to the plugin. Once
+        # they've figured out what to do with it, ask them for their
+        # last processed id.
+        read_journal = bool(states)
+        for plugin in self._iter_plugins():
+            state = states and states.get(plugin.state_key())
+            if state:
+                plugin.set_state(state)
+            # end have state for collection
+        # end for each collection
 
         if not read_journal:
             # No id file?
             # Get the latest event data from the database.
-            conn_attempts = 0
-            last_event_id = None
-            while last_event_id is None:
-                order = [{'column':'id', 'direction':'desc'}]
-                try:
-                    result = self._sg.find_one("EventLogEntry", filters=[], fields=['id'], order=order)
-                except (sg.ProtocolError, sg.ResponseError, socket.error) as err:
-                    conn_attempts = self._check_connection_attempts(conn_attempts, str(err))
-                except Exception as err:
-                    self.log.critical("unhandled exception while fetching events", exc_info=True)
-                    # By all means, we shouldn't have a non-shotgun related error here
-                    # Everything else could be AssertionErrors or something we really don't want to deal with
-                    raise
-                else:
-                    last_event_id = result['id']
-                    self.log.info('Last event id (%d) from the Shotgun database.', last_event_id)
-
-                    # pretend for this was the last id for plugins as well, even though they 
-                    # didn't actually process it
-                    for collection in self._iter_plugins():
-                        collection.set_event_id(last_event_id)
-                    # end
-                # end 
+            last_event_id = self._fetch_last_event_id()
+
+            # pretend for this was the last id for plugins as well, even though they 
+            # didn't actually process it
+            for collection in self._iter_plugins():
+                collection.set_event_id(last_event_id)
             # end
 
             self._save_event_id_data()
         # end no journal exists
 
-    def _fetch_new_events(self):
-        """
-        Fetch new events from Shotgun.
+    def _fetch_last_event_id(self):
+        """@return the id of the latest event in the Shotgun database, retrying until it could be obtained"""
+        conn_attempts = 0
+        while True:
+            order = [{'column':'id', 'direction':'desc'}]
+            try:
+                result = self._sg.find_one("EventLogEntry", filters=[], fields=['id'], order=order)
+            except (sg.ProtocolError, sg.ResponseError, socket.error) as err:
+                conn_attempts = self._check_connection_attempts(conn_attempts, str(err))
+            except Exception as err:
+                self.log.critical("unhandled exception while fetching events", exc_info=True)
+                # By all means, we shouldn't have a non-shotgun related error here
+                # Everything else could be AssertionErrors or something we really don't want to deal with
+                raise
+            else:
+                self.log.info('Last event id (%d) from the Shotgun database.', result['id'])
+                return result['id']
+            # end 
+        # end
 
-        @return: Recent events that need to be processed by the engine.
-        """
+    def _next_event_id(self, plugins=None):
+        """@return the smallest event id any of our plugins still has to process, or None if there is none
+        @param plugins the plugins to consider, or None to consider all of ours"""
         next_event_id = None
-        for new_id in [coll.next_unprocessed_event_id() for coll in self._iter_plugins()]:
+        for new_id in [coll.next_unprocessed_event_id() for coll in plugins or self._iter_plugins()]:
             if new_id is not None and (next_event_id is None or new_id < next_event_id):
                 next_event_id = new_id
         # end find smallest event id
+        return next_event_id
 
-        if next_event_id is None:
-            return list()
-        # end bail out early
+    def _server_side_event_filter(self, plugins=None):
+        """@return a shotgun filter matching only events that at least one active plugin is interested in, 
+        or None if all events are required
+        @param plugins see _next_event_id()"""
+        by_type = dict()
+        for plugin in plugins or self._iter_plugins():
+            if not plugin.is_active():
+                continue
+            # end ignore inactive plugins
+            event_filters = plugin._event_filters()
+            if not event_filters or '*' in event_filters:
+                return None
+            # end handle wildcards
+
+            for event_type, attributes in event_filters.iteritems():
+                if not attributes or '*' in attributes:
+                    by_type[event_type] = None
+                elif by_type.get(event_type, ()) is not None:
+                    by_type.setdefault(event_type, set()).update(attributes)
+                # end handle attributes
+            # end for each event type
+        # end for each plugin
+
+        if not by_type:
+            return None
+        # end handle no plugins
+
+        filters = list()
+        any_attribute_types = sorted(event_type for event_type, attributes in by_type.iteritems() 
+                                     if attributes is None)
+        if any_attribute_types:
+            filters.append(['event_type', 'in', any_attribute_types])
+        # end handle types without attribute filter
+        for event_type, attributes in sorted(by_type.iteritems()):
+            if attributes is None:
+                continue
+            # end skip types handled above
+            filters.append({'filter_operator' : 'all',
+                            'filters' : [['event_type', 'is', event_type],
+                                         ['attribute_name', 'in', sorted(attributes)]]})
+        # end for each type with attributes
+        return {'filter_operator' : 'any', 'filters' : filters}
+
+    def _find_events(self, connection, filters, fields, limit):
+        """
+        Find events in ascending id order, retrying on connection errors.
 
-        filters = [['id', 'greater_than', next_event_id - 1]]
-        fields = ['id', 'event_type', 'attribute_name', 'meta', 'entity', 'user', 'project', 'session_uuid']
+        @param connection the shotgun connection to use for the query
+        @param filters shotgun filters to apply
+        @param fields list of fields to fetch
+        @param limit maximum amount of events to return, or 0 to return all of them
+        @return list of events
+        """
         order = [{'column':'id', 'direction':'asc'}]
 
         conn_attempts = 0
         while True:
+            start = time.time()
             try:
-                return self._sg.find("EventLogEntry", filters=filters, fields=fields, 
-                                      order=order, filter_operator='all')
+                events = connection.find("EventLogEntry", filters=filters, fields=fields, 
+                                         order=order, filter_operator='all', limit=limit)
+                self._metrics.fetch_seconds.observe(time.time() - start)
+                return events
             except (sg.ProtocolError, sg.ResponseError, socket.error) as err:
                 conn_attempts = self._check_connection_attempts(conn_attempts, str(err))
             except Exception:
@@ -235,95 +696,559 @@ class EventEngine(TerminatableThread, ApplicationSettingsMixin):
         # end query events forever
         assert False, "shouldn't get here"
 
-    def _save_event_id_data(self):
+    def _event_fields(self, plugins=None):
+        """@return tuple(fields, lazy_fields) of lists of EventLogEntry fields to fetch with each page, and of
+        fields to fetch only for the events accepted by plugins requiring them, see _fetch_lazy_fields()
+        @param plugins see _next_event_id()"""
+        if self._spool is not None:
+            # spooled events must be complete to be replayed
+            return list(self.EVENT_FIELDS), list()
+        # end handle spool
+
+        fields = set(self.REQUIRED_EVENT_FIELDS)
+        for plugin in plugins or self._iter_plugins():
+            if not plugin.is_active():
+                continue
+            # end ignore inactive plugins
+            if plugin.required_fields is None:
+                fields.update(self.EVENT_FIELDS)
+            else:
+                fields.update(plugin.required_fields)
+            # end handle undeclared fields
+            if plugin.prefetch_fields:
+                fields.add('entity')
+            # end prefetching needs the entity
+        # end for each plugin
+
+        lazy_fields = list()
+        if 'meta' in fields and self.settings_value().fetch['lazy-meta']:
+            fields.remove('meta')
+            lazy_fields.append('meta')
+        # end handle lazy meta
+        return sorted(fields), lazy_fields
+
+    def _fetch_lazy_fields(self, connection, events, fields):
+        """Fetch the given fields in one query for all events accepted by plugins which require them, and add
+        them to the events. The other events remain without them"""
+        for field in fields:
+            plugins = set(plugin for plugin in self._filter_index.plugins() 
+                                 if plugin.is_active() and (plugin.required_fields is None or 
+                                                            field in plugin.required_fields))
+            event_ids = [event['id'] for event in events 
+                                     if event and any(plugin in plugins 
+                                                      for plugin in self._filter_index.candidates(event))]
+            if not event_ids:
+                continue
+            # end skip fields nobody needs
+
+            values = dict((item['id'], item.get(field)) 
+                          for item in self._find_events(connection, [['id', 'in', event_ids]], ['id', field], 0))
+            for event in events:
+                if event and event['id'] in values:
+                    event[field] = values[event['id']]
+                # end add value
+            # end for each event
+        # end for each field
+
+    def _fetch_event_page(self, connection, first_event_id, limit, event_filter=None, fields=None):
+        """
+        Fetch a single page of events.
+
+        @param connection the shotgun connection to use for the query
+        @param first_event_id the smallest event id to return
+        @param limit maximum amount of events to return, or 0 to return all of them
+        @param event_filter if not None, a shotgun filter that events must match, see _server_side_event_filter().
+        In that case, the ids of all existing events in the page are fetched separately, which allows plugins
+        to tell filtered events apart from missing ones.
+        @param fields list of fields to fetch, or None to fetch all EVENT_FIELDS
+        @return list of events in ascending id order. If an event_filter was used, it will be an EventPage
+        """
+        filters = [['id', 'greater_than', first_event_id - 1]]
+        fields = list(fields or self.EVENT_FIELDS)
+        if event_filter is None:
+            return self._find_events(connection, filters, fields, limit)
+        # end handle unfiltered
+
+        event_ids = [event['id'] for event in self._find_events(connection, filters, ['id'], limit) if event]
+        page = EventPage()
+        if event_ids:
+            filters = [['id', 'between', [event_ids[0], event_ids[-1]]], event_filter]
+            page.extend(self._find_events(connection, filters, fields, 0))
+        # end fetch matching events
+        page.num_rows = len(event_ids)
+        # events may have been committed between our queries
+        page.event_ids = sorted(set(event_ids).union(event['id'] for event in page if event))
+        return page
+
+    def _iter_event_pages(self, connection, first_event_id, page_size, event_filter=None, fields=None, 
+                          lazy_fields=()):
+        """@return iterator yielding pages of events, starting at first_event_id, until there are no more.
+        @param page_size if 0, there will be only one page containing all events
+        @param event_filter see _fetch_event_page()
+        @param fields see _fetch_event_page()
+        @param lazy_fields list of fields to fetch for each page in a separate query, see _fetch_lazy_fields()"""
+        while True:
+            page = self._fetch_event_page(connection, first_event_id, page_size, event_filter, fields)
+            if lazy_fields:
+                self._fetch_lazy_fields(connection, page, lazy_fields)
+            # end fetch lazy fields
+            yield page
+
+            if isinstance(page, EventPage):
+                num_rows, ids = page.num_rows, page.event_ids
+            else:
+                num_rows, ids = len(page), [event['id'] for event in page if event]
+            # end obtain ids
+            if not page_size or num_rows < page_size or not ids:
+                break
+            # end stop once there is nothing more to get
+            first_event_id = ids[-1] + 1
+        # end for each page
+
+    def _iter_prefetched_event_pages(self, first_event_id, page_size, max_pages, event_filter=None, fields=None, 
+                                     lazy_fields=()):
+        """As _iter_event_pages(), but fetches pages in a separate thread while the caller dispatches the 
+        current one.
+        @param max_pages amount of pages which may be waiting for being consumed at most"""
+        pages = Queue.Queue(max_pages)
+        done = threading.Event()
+        end_marker = object()
+
+        def put(item):
+            while not done.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except Queue.Full:
+                    continue
+                # end retry until we are cancelled
+            # end while consumer is interested
+            return False
+        # end put
+
+        def produce():
+            # Shotgun connections aren't thread-safe, so we use our own one
+            if self._pool is not None:
+                connection = self._pooled_connection()
+            else:
+                connection = self.ProxyShotgunConnectionType()
+            # end choose connection
+            try:
+                for page in self._iter_event_pages(connection, first_event_id, page_size, event_filter, fields, 
+                                                   lazy_fields):
+                    if not put(page):
+                        return
+                    # end bail out if consumer is gone
+                # end for each page
+                put(end_marker)
+            except Exception as err:
+                put(err)
+            finally:
+                self._release_connection(connection)
+            # end pass exceptions on to consumer
+        # end produce
+
+        producer = threading.Thread(target=produce, name='%s-prefetch' % self.LOG_NAME)
+        producer.daemon = True
+        producer.start()
+
+        try:
+            while True:
+                page = pages.get()
+                if page is end_marker:
+                    break
+                elif isinstance(page, Exception):
+                    raise page
+                # end handle special items
+                yield page
+            # end for each prefetched page
+        finally:
+            done.set()
+        # end assure producer stops
+
+    def _fetch_new_event_pages(self, plugins=None):
+        """
+        Fetch new events from Shotgun, one page at a time.
+
+        @param plugins the plugins to fetch events for, or None to fetch them for all of ours
+        @return: iterator yielding lists of recent events that need to be processed by the engine, 
+        with ascending id
+        """
+        next_event_id = self._next_event_id(plugins)
+        if next_event_id is None:
+            return iter(())
+        # end bail out early
+
+        config = self.settings_value().fetch
+        page_size = config['page-size']
+        event_filter = None
+        if config['server-side-filtering']:
+            event_filter = self._server_side_event_filter(plugins)
+        # end build filter
+        fields, lazy_fields = self._event_fields(plugins)
+
+        if page_size and config.prefetch:
+            # one page is dispatched, one is fetched, the rest waits in the queue
+            max_pages = max(1, config['max-in-flight'] // page_size - 2)
+            pages = self._iter_prefetched_event_pages(next_event_id, page_size, max_pages, event_filter, fields, 
+                                                      lazy_fields)
+        else:
+            pages = self._iter_event_pages(self._sg, next_event_id, page_size, event_filter, fields, lazy_fields)
+        # end choose fetch mode
+        return pages
+
+    def _fetch_new_events(self):
+        """
+        Fetch new events from Shotgun.
+
+        @return: iterator yielding recent events that need to be processed by the engine, with ascending id
         """
-        Save an event Id to persistent storage.
+        for page in self._fetch_new_event_pages():
+            for event in page:
+                yield event
+            # end for each event
+        # end for each page
+
+    def _new_journal(self):
+        """@return a new EventJournal instance, as configured"""
+        config = self.settings_value().journal
+        journal_type = self.EventJournalTypes.get(config.type)
+        if journal_type is None:
+            raise EventEngineError("Unknown journal type '%s' - must be one of %s"
+                                   % (config.type, ', '.join(sorted(self.EventJournalTypes))))
+        # end handle unknown type
+
+        kwargs = dict(commit_every_events=config['commit-every-events'], 
+                      commit_every_seconds=config['commit-every'].seconds)
+        if journal_type is WriteAheadLogEventJournal:
+            kwargs['compact_every'] = config['compact-every']
+        # end handle wal options
+        return journal_type(self._journal_path(), **kwargs)
+
+    def _save_event_id_data(self, gather=True):
+        """
+        Save the state of all plugins to persistent storage.
 
         Next time the engine is started it will try to read the event id from
         this location to know at which event it should start processing.
+        Only plugins whose state changed will actually cause a write.
+        @param gather if True, the state of all plugins will be recorded before committing the journal.
+        Otherwise only what was previously recorded will be committed.
         """
-        event_id_file = self.settings_value()['event-journal-file'].expand_or_raise()
-
-        if not event_id_file:
+        if self._journal is None:
             return
         # end bail out early
 
-        self._event_id_data.clear()
-        for plugin in self._iter_plugins():
-            key = plugin.state_key()
-            assert key not in self._event_id_data, "duplicate plugin ID '%s' - cannot operate like this" % key
-            self._event_id_data[key] = plugin.state()
-        # end gather plugin state
+        if gather:
+            keys = set()
+            for plugin in self._iter_plugins():
+                key = plugin.state_key()
+                assert key not in keys, "duplicate plugin ID '%s' - cannot operate like this" % key
+                keys.add(key)
+                self._journal.record(key, plugin.state())
+            # end gather plugin state
 
-        if not self._event_id_data:
-            self.log.warning('No state was found. Not saving to disk.')
-        # end bail out if there is nothing to save
+            if not keys:
+                self.log.warning('No state was found. Not saving to disk.')
+                return
+            # end bail out if there is nothing to save
+        # end gather state
 
         try:
-            fh = open(event_id_file, 'wb')
-            pickle.dump(self._event_id_data, fh)
-            fh.close()
-        except OSError as err:
+            start = time.time()
+            self._journal.commit()
+            self._metrics.journal_commit_seconds.observe(time.time() - start)
+        except (OSError, IOError) as err:
             # NOTE: it's not an immediate error if writes fail, as we have our state in-memory
             # However, we can't recover until this is fixed
-            self.log.error("Can not write event id data to '%s.'", event_id_file, exc_info=True)
+            self.log.error("Can not write event id data to '%s'.", self._journal.path(), exc_info=True)
         # end handle errors
             
 
     def _check_connection_attempts(self, conn_attempts, msg):
         conn_attempts += 1
+        self._metrics.connection_retries.inc()
         config = self.settings_value().connection
         if conn_attempts == config.retries:
             self.log.error('Unable to connect to Shotgun (attempt %s of %s): %s', conn_attempts, config.retries, msg)
             conn_attempts = 0
-            time.sleep(config['retry-every'].seconds)
+            self._wait(config['retry-every'].seconds)
         else:
             self.log.warning('Unable to connect to Shotgun (attempt %s of %s): %s', conn_attempts, config.retries, msg)
         # end 
         return conn_attempts
 
 
+    def _dispatch_event(self, plugin, event, skipped_event_ids=()):
+        """Have the given plugin process the given event. Called by our dispatcher, possibly from another thread.
+        When dispatching concurrently, the plugin's state is recorded right away, as only the thread handling
+        the plugin may safely access it
+        @param event the event to process, or None to just skip events and end the page, see _end_page()
+        @param skipped_event_ids ids of events prior to the given one, which don't match the plugin's filters"""
+        if not plugin.is_active() or plugin.is_paused():
+            self.log.debug("Skipping inactive or paused plugin %s", plugin)
+            return
+        # end ignore inactive
+        if skipped_event_ids:
+            self._metrics.events_skipped.inc(len(skipped_event_ids), (str(plugin), ))
+            plugin.skip_events(skipped_event_ids)
+        # end advance over uninteresting events
+        try:
+            if event is not None:
+                start = time.time()
+                plugin.process(event)
+                self._metrics.handle_seconds.observe(time.time() - start, (str(plugin), ))
+            else:
+                self._end_page(plugin)
+            # end process event
+        finally:
+            self._release_connection(self._pooled_connections.get(plugin))
+        # end assure leased connection is returned
+        if self._dispatcher.is_concurrent():
+            self._journal.record(plugin.state_key(), plugin.state())
+        # end record state
+
+    def _end_page(self, plugin):
+        """Called once the given plugin saw all events of a page. Handles its queued events if due, and writes 
+        all of its buffered changes"""
+        plugin.flush_events(force=False)
+        plugin.flush_writes()
+
+    def _submit(self, plugin, event, skipped_event_ids):
+        """Have our dispatcher call _dispatch_event() with the given arguments"""
+        self._dispatcher.submit(plugin, self._dispatch_event, plugin, event, skipped_event_ids)
+
+    def _prefetch_entities(self, events):
+        """Fetch the entities of the given events into our request cache, with all fields declared by the
+        plugins interested in the event"""
+        fields_by_type = dict()
+        ids_by_type = dict()
+        for event in events:
+            entity = event.get('entity')
+            if not entity:
+                continue
+            # end skip events without entity
+            for plugin in self._filter_index.candidates(event):
+                fields = (plugin.prefetch_fields or dict()).get(entity['type'])
+                if fields:
+                    fields_by_type.setdefault(entity['type'], set()).update(fields)
+                    ids_by_type.setdefault(entity['type'], set()).add(entity['id'])
+                # end gather fields
+            # end for each interested plugin
+        # end for each event
+
+        for entity_type, entity_ids in ids_by_type.iteritems():
+            try:
+                self._request_cache.prefetch(self._sg, entity_type, entity_ids, sorted(fields_by_type[entity_type]))
+            except (sg.ProtocolError, sg.ResponseError, sg.Fault, socket.error) as err:
+                # not fatal, plugins will query what they need themselves
+                self.log.warning("Failed to prefetch %i %s entities: %s", len(entity_ids), entity_type, err)
+            # end handle errors
+        # end for each entity type
+
+    def _dispatch_page(self, page, gather, counted=None):
+        """Dispatch all events in the given page to the plugins whose filters match, and have all other plugins
+        skip them in bulk.
+        @param gather see _save_event_id_data()
+        @param counted if not None, a set of ids of events another lane dispatched during this poll already. 
+        They are not counted again, and the ids of the page are added to it
+        @return amount of events in the page, including the ones filtered on the server, which were not 
+        counted before"""
+        events = [event for event in page if event is not None]
+        # it can be that we don't get anything (usually in test-cases that iterate through a range)
+        if isinstance(page, EventPage):
+            event_ids = page.event_ids
+        else:
+            event_ids = [event['id'] for event in events]
+        # end obtain ids of all existing events
+        if event_ids:
+            self._newest_event_id = max(self._newest_event_id, event_ids[-1])
+        # end track newest event
+        if self._spool is not None:
+            try:
+                self._spool.append(events)
+            except (OSError, IOError):
+                self.log.error("Failed to spool events to '%s'", self._spool.directory(), exc_info=True)
+            # end spooling is optional
+        # end spool events
+        if self._request_cache is not None:
+            self._request_cache.rotate()
+            if self.settings_value().cache.prefetch:
+                self._prefetch_entities(events)
+            # end prefetch entities
+        # end start a new batch
+        # index into event_ids of the first event a plugin didn't see yet
+        positions = dict()
+
+        pos = 0
+        for event in events:
+            # both lists are sorted, and event_ids contains all ids of events
+            while event_ids[pos] != event['id']:
+                pos += 1
+            # end find position of event
+
+            candidates = self._filter_index.candidates(event)
+            if candidates:
+                # nested fields are wrapped once a plugin accesses them
+                event = EventView(event)
+            # end wrap only if needed
+            for plugin in candidates:
+                self._submit(plugin, event, event_ids[positions.get(plugin, 0):pos])
+                positions[plugin] = pos + 1
+            # end for each plugin
+
+            if (counted is None or event['id'] not in counted) and self._journal.event_processed():
+                self._save_event_id_data(gather)
+            # end commit in batches
+        # end for each event to dispatch
+
+        for plugin in self._filter_index.plugins():
+            first = positions.get(plugin, 0)
+            if first < len(event_ids) or plugin in positions or plugin.has_queued_events():
+                # skip remaining events, and handle queued ones
+                self._submit(plugin, None, event_ids[first:])
+            # end end page for plugin
+        # end for each plugin
+
+        if counted is None:
+            return len(event_ids)
+        # end handle single lane
+        num_events = len(counted)
+        counted.update(event_ids)
+        return len(counted) - num_events
+
+    def _update_metrics(self, num_events):
+        """Update all metrics which are measured once per poll, and write a snapshot if one is due.
+        Must only be called while no plugin is processing events
+        @param num_events the amount of events the poll returned"""
+        metrics = self._metrics
+        metrics.polls.inc()
+        metrics.events_fetched.inc(num_events)
+        metrics.poll_events.set(num_events)
+        for plugin in self._iter_plugins():
+            labels = (str(plugin), )
+            metrics.backlog_events.set(len(plugin._backlog), labels)
+            metrics.plugin_failures.set(plugin.failures(), labels)
+            store = self._dead_letters.get(plugin.state_key())
+            if store is not None:
+                metrics.dead_letter_events.set(len(store), labels)
+            # end handle dead letters
+            if self._newest_event_id is not None and plugin._last_event_id is not None:
+                metrics.lag_events.set(max(0, self._newest_event_id - plugin._last_event_id), labels)
+            # end handle lag
+        # end for each plugin
+        if self._log_queue is not None:
+            metrics.log_records_dropped.set(self._log_queue.dropped())
+        # end handle log queue
+        if self._pool is not None:
+            stats = self._pool.stats()
+            for state in ('idle', 'leased', 'peak_leased'):
+                metrics.pool_connections.set(stats[state], (state, ))
+            # end for each state
+            metrics.pool_leases.set(stats['leases'])
+            metrics.pool_waits.set(stats['waits'])
+            metrics.pool_wait_seconds.set(stats['wait_seconds'])
+        # end handle pool
+
+        config = self.settings_value().metrics
+        if config['snapshot-file'] and time.time() - self._last_snapshot_time >= config['snapshot-every'].seconds:
+            path = config['snapshot-file'].expand_or_raise()
+            try:
+                metrics.registry.write_snapshot(path)
+            except (OSError, IOError):
+                self.log.error("Failed to write metrics snapshot to '%s'", path, exc_info=True)
+            # end ignore write errors
+            self._last_snapshot_time = time.time()
+        # end write snapshot
+
     def _prepare_event_processing(self):
         """Setup everything to be ready for doing work"""
         config = self.settings_value()
-        socket.setdefaulttimeout(config['socket-timeout'].seconds)
+        if self._pool is None:
+            socket.setdefaulttimeout(config['socket-timeout'].seconds)
+        # end pooled connections have their own timeout
+
+        metrics = config.metrics
+        if metrics['http-port'] and self._metrics_server is None:
+            server = MetricsHTTPServer(self._metrics.registry, metrics['http-port'], metrics['http-host'])
+            try:
+                server.start()
+            except socket.error:
+                self.log.error("Could not serve metrics on port %i", metrics['http-port'], exc_info=True)
+            else:
+                self._metrics_server = server
+                self.log.info("Serving metrics at http://%s:%i/metrics", metrics['http-host'], server.port())
+            # end handle bind errors
+        # end start metrics server
 
     def _process_events(self):
         """A single process run, which will poll events and process them, exactly once.
 
         General behavior:
         - Load plugins from disk - see L{load} method.
-        - Get new events from Shotgun
+        - For each priority lane, starting with the 'interactive' one, get new events from Shotgun page by page,
+          beginning with the oldest event a plugin of the lane still has to process
         - Loop through events
-        - Loop through each plugin
+        - Loop through each plugin whose filters match the event, the others skip it in bulk
         - Loop through each callback
-        - Send the callback an event
-        - Once all callbacks are done in all plugins, save the eventId
+        - Send the callback an event, which may happen concurrently in a thread per plugin
+        - Once all callbacks are done in all plugins, save the eventId if the journal wants us to commit
         - Go to the next event
-        - Once all events are processed, wait for the defined fetch interval time and start over.
+        - Once all events are processed by all plugins, save the eventId of all plugins which changed
+        - Once all events are processed, wait as long as the scheduler says and start over. If a lane fetched 
+          as many pages as it may per poll, start over right away.
 
         Caveats:
         - If a plugin is deemed "inactive" (an error occured during
           registration), skip it.
-        - If a callback is deemed "inactive" (an error occured during callback
-          execution), skip it.
+        - If a callback failed, skip it until it is due to retry the failed event, which is fetched again.
+          If it failed too often on the same event, the event is parked in its dead-letter store.
         """
-        for event in self._fetch_new_events():
-            if event is None:
-                continue
-            # end it can be that we don't get anything (usually in test-cases that iterate through a range)
-            event = DictObject(event)
-            for plugin in self._iter_plugins():
-                if not plugin.is_active():
-                    self.log.debug("Skipping inactive plugin %s", plugin)
-                    continue
-                # end ignore inactive
-                plugin.process(event)
-            self._save_event_id_data()
-        # end for each event to dispatch
+        gather = not self._dispatcher.is_concurrent()
+        num_events = 0
+        # the ranges of lanes overlap, but events are counted once
+        counted = set()
+        throttled = False
+        self._check_plugin_modules()
+        if self._cluster is not None:
+            self._update_ownership()
+        # end take our share of plugins
+        try:
+            # plugins of different lanes are disjoint, so they don't need to wait for each other
+            for priority, plugins in self._priority_lanes():
+                max_pages = self._select_lane(priority, plugins)
+                pages = self._fetch_new_event_pages(plugins)
+                for num_pages, page in enumerate(pages, 1):
+                    num_events += self._dispatch_page(page, gather, counted)
+                    if max_pages and num_pages >= max_pages:
+                        self.log.debug("Lane '%s' fetched %i pages - continuing with the next poll",
+                                       priority, num_pages)
+                        throttled = True
+                        # stops prefetching
+                        pages.close()
+                        break
+                    # end handle throttled lanes
+                # end for each page to dispatch
+            # end for each lane
+        finally:
+            # plugins must be done before we may query their state again
+            self._dispatcher.wait()
+            self._release_connection(self._sg)
+        # end assure dispatched events are processed
 
-        config = self.settings_value()
-        time.sleep(config['poll-every'].seconds)
+        if num_events:
+            self._save_event_id_data(gather)
+        # end assure everything is saved
+        self._update_metrics(num_events)
+
+        page_size = self.settings_value().fetch['page-size']
+        full = throttled or bool(page_size) and num_events >= page_size
+        interval = self._scheduler.next_interval(num_events, full)
+        if throttled:
+            # lanes which didn't catch up continue right away
+            interval = 0.0
+        # end handle throttled lanes
+        self._wait(interval)
 
     # -------------------------
     ## @name Interface
@@ -338,10 +1263,15 @@ class EventEngine(TerminatableThread, ApplicationSettingsMixin):
 
         @note usually called as part of threading, but will work without it as well
         """
+        self._wakeup.clear()
         self._prepare_event_processing()
 
         # Notify which version of shotgun api we are using
         self.log.info('Using Shotgun version %s' % sg.__version__)
+        if self._cluster is not None:
+            self.log.info("Running as node '%s' of a cluster", self._cluster.node_id())
+            self._cluster.start()
+        # end keep leases while we run
 
         try:
             self.log.debug('Starting the event processing loop.')
@@ -352,5 +1282,57 @@ class EventEngine(TerminatableThread, ApplicationSettingsMixin):
         except Exception as err:
             self.log.critical('Unexpected error (%s) in main loop.', type(err), exc_info=True)
         # end exception handling
-    
+
+        self._shutdown()
+
+    def stop_and_join(self):
+        """Stop the processing of events, interrupting any wait, and return once the thread is done"""
+        self._wakeup.set()
+        super(EventEngine, self).stop_and_join()
+
+    def metrics(self):
+        """@return our EngineMetrics, whose registry contains all metrics we maintain"""
+        return self._metrics
+
+    def connection_pool(self):
+        """@return our ShotgunConnectionPool, or None if connections aren't pooled"""
+        return self._pool
+
     ## -- End Interface -- @}
+
+    def _shutdown(self):
+        """Release all resources once the main loop ended"""
+        self._dispatcher.shutdown()
+        self._stop_plugin_workers()
+        for plugin in self._iter_all_plugins():
+            self._close_plugin(plugin)
+        # end for each plugin
+        if self._metrics_server is not None:
+            self._metrics_server.stop()
+            self._metrics_server = None
+        # end stop metrics server
+        if self._pool is not None:
+            self._release_connection(self._sg)
+            self._pool.clear()
+        # end close pooled connections
+        if self._journal is not None:
+            try:
+                self._journal.close()
+            except (OSError, IOError):
+                self.log.error("Failed to close event journal at '%s'", self._journal.path(), exc_info=True)
+            # end ignore errors on shutdown
+        # end close journal
+        if self._spool is not None:
+            self._spool.close()
+        # end close spool
+        for store in self._dead_letters.values():
+            store.close()
+        # end for each dead-letter store
+        if self._cluster is not None:
+            # our state is committed, others may take over
+            self._cluster.stop(release=True)
+            self._owned_plugins = frozenset()
+        # end leave cluster
+        if self._log_queue is not None:
+            self._log_queue.stop()
+        # end write all logs
@@ -0,0 +1,147 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.event
+@brief Immutable views on events, as passed to plugins
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['EventView', 'DataView']
+
+
+# ==============================================================================
+## @name Functions
+# ------------------------------------------------------------------------------
+## @{
+
+def _view(value):
+    """@return a view on the given value if it is a dict or a list, or the value itself"""
+    if isinstance(value, dict):
+        return DataView(value)
+    elif isinstance(value, list):
+        return tuple(_view(item) for item in value)
+    return value
+
+def _copy(value):
+    """@return a deep copy of the given dicts and lists"""
+    if isinstance(value, dict):
+        return dict((key, _copy(item)) for key, item in value.iteritems())
+    elif isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+## -- End Functions -- @}
+
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class DataView(dict):
+    """An immutable dict which allows to access its keys as attributes too, like a DictObject.
+
+    Nested dicts are provided as views as well, and lists as tuples, which are created once they are first 
+    accessed. Views may be shared between threads. As they are dicts, they can be passed to shotgun as is.
+    @note only the dict we are created from is copied, and only shallowly
+    """
+    __slots__ = ('_views', )
+
+    def __init__(self, data):
+        """Initialize this instance with the dict to provide a view on"""
+        dict.__init__(self, data)
+        DataView._views.__set__(self, dict())
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("'%s' is read-only" % type(self).__name__)
+
+    __setitem__ = __delitem__ = __setattr__ = __delattr__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __getattr__(self, name):
+        # prevent recursion before our slots are set, during unpickling for instance
+        if name in DataView.__slots__:
+            raise AttributeError(name)
+        # end handle slots
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError("'%s' has no attribute '%s'" % (type(self).__name__, name))
+        # end convert exception
+
+    def __getitem__(self, key):
+        try:
+            return self._views[key]
+        except KeyError:
+            pass
+        # end use existing view
+        value = dict.__getitem__(self, key)
+        if isinstance(value, (dict, list)):
+            # concurrent readers may create a view each, which is harmless as they are equal
+            value = self._views[key] = _view(value)
+        # end create view on first access
+        return value
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, dict.__repr__(self))
+
+    def __reduce__(self):
+        return (type(self), (dict(self), ))
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def get(self, key, default=None):
+        """@return the value at the given key, or default if there is none"""
+        if key not in self:
+            return default
+        return self[key]
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def itervalues(self):
+        return (self[key] for key in self)
+
+    def iteritems(self):
+        return ((key, self[key]) for key in self)
+
+    def copy(self):
+        """@return a shallow copy of our data as plain dict"""
+        return dict(self)
+
+    def to_dict(self):
+        """@return a deep copy of our data, made of plain dicts and lists, which may be changed freely"""
+        return _copy(dict(self))
+
+    ## -- End Interface -- @}
+
+# end class DataView
+
+
+class EventView(DataView):
+    """A DataView on an EventLogEntry, as passed to plugins. Its id, event_type and attribute_name are
+    available without any indirection"""
+    __slots__ = ('id', 'event_type', 'attribute_name')
+
+    def __init__(self, data):
+        super(EventView, self).__init__(data)
+        for name in EventView.__slots__:
+            getattr(EventView, name).__set__(self, data.get(name))
+        # end for each direct attribute
+
+    def __getattr__(self, name):
+        if name in EventView.__slots__:
+            raise AttributeError(name)
+        # end handle unset slots
+        return super(EventView, self).__getattr__(name)
+
+# end class EventView
+
+## -- End Types -- @}
+
@@ -0,0 +1,166 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.isolation
+@brief Runs EventEnginePlugins in separate processes
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['ProcessPluginWorker', 'PluginWorkerError']
+
+import logging
+import multiprocessing
+
+from .utility import EventEngineError
+
+
+# ==============================================================================
+## @name Functions
+# ------------------------------------------------------------------------------
+## @{
+
+def _run_plugin_worker(plugin_type, connection_type, log_name, pipe):
+    """Main loop of a worker process, which receives (event, state) tuples and sends 
+    (active, resume_at, state, parked) tuples back once the event was processed. A None event stops the worker.
+    The plugin applies its failure policy as usual, and the engine-side plugin adopts the outcome"""
+    plugin = plugin_type(connection_type(), logging.getLogger(log_name))
+    # lists of events the plugin gave up on, to be stored by the engine-side plugin
+    parked = list()
+    plugin.set_dead_letter_store(parked)
+    while True:
+        try:
+            event, state = pipe.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        # end handle parent going away
+
+        if event is None:
+            break
+        # end handle shutdown request
+
+        plugin.set_state(state)
+        # the engine-side plugin decides when to retry
+        plugin._resume_at = None
+        plugin.process(event)
+        plugin.flush_events()
+        plugin.flush_writes()
+        pipe.send((plugin.is_active(), plugin._resume_at, plugin.state(), parked[:]))
+        del parked[:]
+    # end while we are supposed to work
+    plugin.close()
+
+## -- End Functions -- @}
+
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class PluginWorkerError(EventEngineError):
+    """Thrown if a worker process keeps failing"""
+    __slots__ = ()
+
+# end class PluginWorkerError
+
+
+class ProcessPluginWorker(object):
+    """Manages a process which runs its own instance of a plugin type, and its own shotgun connection.
+
+    Events are sent to the process along with the plugin's current state, and the state after processing
+    the event is sent back. That way, the engine-side plugin can journal the state as usual.
+    If the process dies, it will be restarted.
+    """
+    __slots__ = ('_plugin_type',
+                 '_connection_type',
+                 '_log',
+                 '_process',
+                 '_pipe')
+
+    ## Amount of seconds to wait for the process to stop before terminating it
+    STOP_TIMEOUT = 5.0
+
+    def __init__(self, plugin_type, connection_type, log):
+        """Initialize this instance. The process is started on first use.
+        @param plugin_type the EventEnginePlugin type to instantiate in the worker process
+        @param connection_type a type to instantiate without arguments, producing a shotgun connection
+        @param log the logger of the plugin, which is to be used in the worker process too"""
+        self._plugin_type = plugin_type
+        self._connection_type = connection_type
+        self._log = log
+        self._process = None
+        self._pipe = None
+
+    def _start(self):
+        """Start our process"""
+        self._pipe, child_pipe = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_run_plugin_worker,
+                                                args=(self._plugin_type, self._connection_type,
+                                                      self._log.name, child_pipe),
+                                                name='%s-worker' % self._log.name)
+        self._process.daemon = True
+        self._process.start()
+        child_pipe.close()
+        self._log.debug('Started worker process %i', self._process.pid)
+
+    def _kill(self):
+        """Terminate our process, if it is running"""
+        if self._process is None:
+            return
+        # end bail out if there is nothing to do
+
+        self._pipe.close()
+        if self._process.is_alive():
+            self._process.terminate()
+        # end terminate process
+        self._process.join()
+        self._process = self._pipe = None
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def process(self, event, state):
+        """Process the given event in our process, after setting the given state on the plugin there.
+        @return tuple(is_active, resume_at, state, parked) of the plugin after processing the event, where
+        resume_at is the time until which the plugin pauses after a failure, or None, and parked is a list of 
+        lists of events it gave up on
+        @throws PluginWorkerError if the process died twice while processing the event"""
+        for attempt in range(2):
+            if self._process is None or not self._process.is_alive():
+                self._kill()
+                self._start()
+            # end assure process is running
+
+            try:
+                self._pipe.send((event, state))
+                return self._pipe.recv()
+            except (EOFError, IOError, OSError) as err:
+                self._log.error('Worker process died while processing event %d (%s) - restarting it',
+                                event['id'], err)
+                self._kill()
+            # end handle crashes
+        # end for each attempt
+        raise PluginWorkerError("Worker process of %s died repeatedly while processing event %d"
+                                % (self._plugin_type.__name__, event['id']))
+
+    def stop(self):
+        """Stop our process, if it is running. It will be started on the next call to process()"""
+        if self._process is None:
+            return
+        # end bail out if there is nothing to do
+
+        try:
+            self._pipe.send((None, None))
+            self._process.join(self.STOP_TIMEOUT)
+        except (IOError, OSError):
+            pass
+        # end ignore errors of dead processes
+        self._kill()
+
+    ## -- End Interface -- @}
+
+# end class ProcessPluginWorker
+
+## -- End Types -- @}
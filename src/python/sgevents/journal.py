@@ -0,0 +1,377 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.journal
+@brief Persistent storage for the state of EventEnginePlugins
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['EventJournal', 'PickleEventJournal', 'WriteAheadLogEventJournal', 'SQLiteEventJournal',
+           'EventJournalError']
+
+import os
+import time
+import zlib
+import struct
+import sqlite3
+import threading
+import cPickle as pickle
+
+from butility import abstractmethod
+
+from .utility import EventEngineError
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class EventJournalError(EventEngineError):
+    """Thrown if a journal could not be read"""
+    __slots__ = ()
+
+# end class EventJournalError
+
+
+class EventJournal(object):
+    """Stores the state of plugins, one state per key.
+
+    Changes are recorded in memory and written to disk once a commit is due, which is every N processed
+    events or every T seconds, whichever comes first. Only states which actually changed are written.
+    @note all methods are thread-safe
+    """
+    __slots__ = ('_path',
+                 '_lock',
+                 '_states',
+                 '_pending',
+                 '_commit_every_events',
+                 '_commit_every_seconds',
+                 '_events_since_commit',
+                 '_last_commit_time')
+
+    ## Protocol to use when pickling states
+    PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, path, commit_every_events=1, commit_every_seconds=0):
+        """Initialize this instance
+        @param path at which to store our data
+        @param commit_every_events the amount of events after which a commit is due. 1 commits after each event
+        @param commit_every_seconds if not 0, a commit is due if the last commit is longer ago than the given
+        amount of seconds"""
+        self._path = path
+        self._lock = threading.RLock()
+        self._states = dict()
+        self._pending = dict()
+        self._commit_every_events = max(1, commit_every_events)
+        self._commit_every_seconds = commit_every_seconds
+        self._events_since_commit = 0
+        self._last_commit_time = time.time()
+
+    def __str__(self):
+        return '%s(%s)' % (type(self).__name__, self._path)
+
+    # -------------------------
+    ## @name Subclass Interface
+    # @{
+
+    @abstractmethod
+    def _read(self):
+        """@return a dict of key: pickled_state pairs as read from our path, which exists
+        @throws EventJournalError if the data could not be read"""
+        raise NotImplementedError("to be implemented in subclass")
+
+    @abstractmethod
+    def _write(self, changes):
+        """Persist the given dict of key: pickled_state pairs, which are changes to what's in self._states.
+        Must not return before the data is safely stored, and must not corrupt existing data if interrupted."""
+        raise NotImplementedError("to be implemented in subclass")
+
+    def _close(self):
+        """Called when the journal is closed, release all resources here"""
+
+    ## -- End Subclass Interface -- @}
+
+    # -------------------------
+    ## @name Utilities
+    # @{
+
+    def _write_file_atomically(self, data):
+        """Replace the file at our path with the given data such that it's either the old, or the new data"""
+        tmp_path = self._path + '.tmp'
+        fh = open(tmp_path, 'wb')
+        try:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        finally:
+            fh.close()
+        # end assure file is closed
+
+        if os.name == 'nt' and os.path.exists(self._path):
+            os.remove(self._path)
+        # end windows can't rename onto existing files
+        os.rename(tmp_path, self._path)
+
+    ## -- End Utilities -- @}
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def path(self):
+        """@return the path we are writing to"""
+        return self._path
+
+    def load(self):
+        """@return a dict of key: state pairs as previously stored, or an empty dict if there is no journal yet.
+        Previously recorded, but uncommitted changes are discarded.
+        @throws EventJournalError if the journal exists, but could not be read"""
+        self._lock.acquire()
+        try:
+            self._pending.clear()
+            self._states.clear()
+            if not os.path.exists(self._path):
+                return dict()
+            # end handle new journal
+
+            try:
+                self._states.update(self._read())
+                return dict((key, pickle.loads(blob)) for key, blob in self._states.iteritems())
+            except EventJournalError:
+                raise
+            except Exception as err:
+                raise EventJournalError("Failed to read journal at '%s': %s" % (self._path, err))
+            # end convert errors
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def record(self, key, state):
+        """Record the given state for the given key. It will be written with the next commit, unless it
+        is the same as the one already stored"""
+        blob = pickle.dumps(state, self.PICKLE_PROTOCOL)
+        self._lock.acquire()
+        try:
+            if self._states.get(key) == blob:
+                self._pending.pop(key, None)
+            else:
+                self._pending[key] = blob
+            # end only record actual changes
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def event_processed(self):
+        """Inform the journal about an event being processed
+        @return True if a commit is due"""
+        self._lock.acquire()
+        try:
+            self._events_since_commit += 1
+            return self.is_commit_due()
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def is_commit_due(self):
+        """@return True if we should commit now, based on our configuration"""
+        if not self._events_since_commit:
+            return False
+        if self._events_since_commit >= self._commit_every_events:
+            return True
+        return bool(self._commit_every_seconds and
+                    time.time() - self._last_commit_time >= self._commit_every_seconds)
+
+    def commit(self):
+        """Write all recorded changes to disk
+        @throws OSError or IOError if the data could not be written. Recorded changes are kept in that case"""
+        self._lock.acquire()
+        try:
+            if self._pending:
+                self._write(self._pending)
+                self._states.update(self._pending)
+                self._pending.clear()
+            # end write changes
+            self._events_since_commit = 0
+            self._last_commit_time = time.time()
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def close(self):
+        """Commit all changes and release resources"""
+        self._lock.acquire()
+        try:
+            try:
+                self.commit()
+            finally:
+                self._close()
+            # end assure we close
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    ## -- End Interface -- @}
+
+# end class EventJournal
+
+
+class PickleEventJournal(EventJournal):
+    """Stores all states in a single pickled dict, which is rewritten on each commit.
+    This is the original journal format, which is most efficient for small numbers of plugins"""
+    __slots__ = ()
+
+    def _read(self):
+        fh = open(self._path, 'rb')
+        try:
+            states = pickle.load(fh)
+        finally:
+            fh.close()
+        # end assure file is closed
+        if not isinstance(states, dict):
+            raise EventJournalError("Journal at '%s' did not contain a dict" % self._path)
+        # end verify type
+        return dict((key, pickle.dumps(state, self.PICKLE_PROTOCOL)) for key, state in states.iteritems())
+
+    def _write(self, changes):
+        states = dict((key, pickle.loads(blob)) for key, blob in self._states.iteritems())
+        states.update((key, pickle.loads(blob)) for key, blob in changes.iteritems())
+        self._write_file_atomically(pickle.dumps(states, self.PICKLE_PROTOCOL))
+
+# end class PickleEventJournal
+
+
+class WriteAheadLogEventJournal(EventJournal):
+    """Appends changed states to a log file, which is compacted into a single snapshot once it grows too large.
+
+    Each record is prefixed with its length and checksum, which allows to detect and ignore a record that
+    was only partially written due to a crash.
+    """
+    __slots__ = ('_compact_every',
+                 '_num_records',
+                 '_fh')
+
+    ## length and crc32 of the following record
+    HEADER = struct.Struct('<II')
+
+    def __init__(self, path, commit_every_events=1, commit_every_seconds=0, compact_every=10000):
+        """Initialize this instance
+        @param compact_every amount of records after which the log will be compacted"""
+        super(WriteAheadLogEventJournal, self).__init__(path, commit_every_events, commit_every_seconds)
+        self._compact_every = compact_every
+        self._num_records = 0
+        self._fh = None
+
+    @classmethod
+    def _encode(cls, key, blob):
+        """@return a record suitable for writing into our log"""
+        payload = pickle.dumps((key, blob), cls.PICKLE_PROTOCOL)
+        return cls.HEADER.pack(len(payload), zlib.crc32(payload) & 0xffffffff) + payload
+
+    def _read(self):
+        self._close()
+        states = dict()
+        self._num_records = 0
+
+        fh = open(self._path, 'rb')
+        try:
+            while True:
+                header = fh.read(self.HEADER.size)
+                if len(header) < self.HEADER.size:
+                    break
+                # end handle end of file
+                size, crc = self.HEADER.unpack(header)
+                payload = fh.read(size)
+                if len(payload) < size or zlib.crc32(payload) & 0xffffffff != crc:
+                    break
+                # end ignore partially written records
+                key, blob = pickle.loads(payload)
+                states[key] = blob
+                self._num_records += 1
+            # end for each record
+        finally:
+            fh.close()
+        # end assure file is closed
+
+        if self._num_records == 0 and os.path.getsize(self._path):
+            raise EventJournalError("Journal at '%s' did not contain a single valid record" % self._path)
+        # end handle garbage
+
+        # rewrite the log if there was a partial record, so we can append safely
+        self._compact(states)
+        return states
+
+    def _compact(self, states):
+        """Rewrite our log to contain only the given states"""
+        self._close()
+        self._write_file_atomically(''.join(self._encode(key, blob) for key, blob in states.iteritems()))
+        self._num_records = len(states)
+
+    def _write(self, changes):
+        if self._num_records + len(changes) > self._compact_every:
+            states = self._states.copy()
+            states.update(changes)
+            self._compact(states)
+            return
+        # end compact if required
+
+        if self._fh is None:
+            self._fh = open(self._path, 'ab')
+        # end open file lazily
+        self._fh.write(''.join(self._encode(key, blob) for key, blob in changes.iteritems()))
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._num_records += len(changes)
+
+    def _close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        # end close file
+
+# end class WriteAheadLogEventJournal
+
+
+class SQLiteEventJournal(EventJournal):
+    """Stores one row per state in an sqlite database, and updates only the rows that changed"""
+    __slots__ = ('_connection', )
+
+    def __init__(self, path, commit_every_events=1, commit_every_seconds=0):
+        super(SQLiteEventJournal, self).__init__(path, commit_every_events, commit_every_seconds)
+        self._connection = None
+
+    def _db(self):
+        """@return our database connection, which is created on demand"""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self._path, check_same_thread=False)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS plugin_state (key TEXT PRIMARY KEY, state BLOB)')
+            self._connection.commit()
+        # end create connection
+        return self._connection
+
+    def _read(self):
+        # reconnect to see the latest state on disk
+        self._close()
+        try:
+            rows = self._db().execute('SELECT key, state FROM plugin_state').fetchall()
+        except sqlite3.DatabaseError as err:
+            self._close()
+            raise EventJournalError("Journal at '%s' is not a valid database: %s" % (self._path, err))
+        # end convert errors
+        return dict((key, str(blob)) for key, blob in rows)
+
+    def _write(self, changes):
+        db = self._db()
+        db.executemany('INSERT OR REPLACE INTO plugin_state (key, state) VALUES (?, ?)',
+                        [(key, sqlite3.Binary(blob)) for key, blob in changes.iteritems()])
+        db.commit()
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        # end close connection
+
+# end class SQLiteEventJournal
+
+## -- End Types -- @}
@@ -0,0 +1,194 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.logqueue
+@brief Runs logging handlers on a background thread, to keep slow ones like SMTP off the dispatch path
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['LogQueue', 'QueuedHandler']
+
+import os
+import Queue
+import logging
+import threading
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class LogQueue(object):
+    """A bounded queue of log records, which are passed to their handlers by a background thread.
+
+    The thread is started on first use. While it is idle, it flushes all handlers it has seen once every
+    flush_interval, which allows handlers to send what they collected.
+    If the queue is full, records are dropped instead of blocking the thread which logs them.
+    In processes forked after the queue was created, records are not queued, see put().
+    @note all methods are thread-safe
+    """
+    __slots__ = ('_queue',
+                 '_flush_interval',
+                 '_lock',
+                 '_thread',
+                 '_pid',
+                 '_handlers',
+                 '_dropped')
+
+    def __init__(self, max_size=10000, flush_interval=1.0):
+        """Initialize this instance
+        @param max_size amount of records which may wait for being handled at most
+        @param flush_interval seconds after which idle handlers are flushed"""
+        self._queue = Queue.Queue(max_size)
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = os.getpid()
+        self._handlers = set()
+        self._dropped = 0
+
+    def _run(self):
+        """Main loop of our thread"""
+        while True:
+            try:
+                item = self._queue.get(timeout=self._flush_interval)
+            except Queue.Empty:
+                self._flush_handlers()
+                continue
+            # end flush while idle
+
+            if item is None:
+                break
+            # end handle stop request
+            handler, record = item
+            try:
+                handler.handle(record)
+            except Exception:
+                handler.handleError(record)
+            # end handle errors like logging does
+        # end while we are supposed to work
+        self._flush_handlers()
+
+    def _flush_handlers(self):
+        """Flush all handlers we passed records to"""
+        self._lock.acquire()
+        try:
+            handlers = list(self._handlers)
+        finally:
+            self._lock.release()
+        # end assure lock is released
+        for handler in handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
+            # end ignore errors, handlers report them on their own
+        # end for each handler
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def put(self, handler, record):
+        """Have the given handler handle the given record on our thread, which is started if needed
+        @return True if the record was queued, False if it was dropped because the queue was full, or None
+        if the caller should handle it on its own, which is the case in forked processes, or once we stopped"""
+        if os.getpid() != self._pid:
+            return None
+        # end our thread didn't survive the fork
+
+        self._lock.acquire()
+        try:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sg-events-logging')
+                self._thread.daemon = True
+                self._thread.start()
+            elif not self._thread.is_alive():
+                return None
+            # end start thread on first use
+            self._handlers.add(handler)
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+        try:
+            self._queue.put_nowait((handler, record))
+        except Queue.Full:
+            self._lock.acquire()
+            self._dropped += 1
+            self._lock.release()
+            return False
+        # end handle full queue
+        return True
+
+    def wrap(self, handler):
+        """@return a QueuedHandler passing records to the given handler on our thread"""
+        return QueuedHandler(handler, self)
+
+    def dropped(self):
+        """@return amount of records we dropped as the queue was full"""
+        return self._dropped
+
+    def stop(self, timeout=5.0):
+        """Handle all queued records, flush all handlers, and stop our thread. Records logged afterwards are
+        handled by the thread logging them
+        @param timeout seconds to wait for the thread to finish"""
+        self._lock.acquire()
+        try:
+            thread = self._thread
+        finally:
+            self._lock.release()
+        # end assure lock is released
+        if thread is None or not thread.is_alive() or os.getpid() != self._pid:
+            return
+        # end bail out if there is nothing to do
+        self._queue.put(None)
+        thread.join(timeout)
+
+    ## -- End Interface -- @}
+
+# end class LogQueue
+
+
+class QueuedHandler(logging.Handler):
+    """Passes records to a target handler through a LogQueue, or directly if the queue can't take them.
+
+    Messages and exceptions are formatted before queuing, as the objects they refer to may change until the
+    record is handled.
+    """
+
+    def __init__(self, target, log_queue):
+        """Initialize this instance with the handler to pass records to, and the LogQueue to use.
+        Our level is the one of the target"""
+        logging.Handler.__init__(self, target.level)
+        self.target = target
+        self._log_queue = log_queue
+
+    def handle(self, record):
+        """Queue the record without taking our lock, the target takes care of filtering and locking"""
+        if not self.filter(record):
+            return False
+        # end handle filters
+        self.emit(record)
+        return True
+
+    def emit(self, record):
+        """Queue the given record for our target, or handle it right away if the queue can't take it"""
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        # end format message
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            # end format traceback once
+            record.exc_info = None
+        # end format exception
+        if self._log_queue.put(self.target, record) is None:
+            self.target.handle(record)
+        # end handle record right away if the queue can't
+
+# end class QueuedHandler
+
+## -- End Types -- @}
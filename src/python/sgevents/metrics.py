@@ -0,0 +1,397 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.metrics
+@brief Counters, gauges and histograms describing what the engine does, in prometheus text format
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['Metric', 'Counter', 'Gauge', 'Histogram', 'MetricsRegistry', 'MetricsHTTPServer', 'EngineMetrics']
+
+import os
+import json
+import time
+import threading
+import BaseHTTPServer
+from bisect import bisect_left
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class Metric(object):
+    """Base for all metrics, which keep one value per combination of label values.
+    @note all methods are thread-safe"""
+    __slots__ = ('name',
+                 'help',
+                 'label_names',
+                 '_lock',
+                 '_values')
+
+    ## The prometheus type name
+    kind = None
+
+    def __init__(self, name, help, label_names=()):
+        """Initialize this instance
+        @param name of the metric, like 'sgevents_events_fetched_total'
+        @param help a one-line description
+        @param label_names names of the labels, whose values are to be passed as tuple to all updates"""
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = dict()
+
+    def _format_labels(self, labels, extra=()):
+        """@return labels in prometheus format, like '{plugin="name"}', or an empty string"""
+        pairs = zip(self.label_names, labels) + list(extra)
+        if not pairs:
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                                 for name, value in pairs)
+
+    def _samples(self):
+        """@return list of (suffix, labels, extra_labels, value) tuples to render"""
+        self._lock.acquire()
+        try:
+            return [('', labels, (), value) for labels, value in sorted(self._values.iteritems())]
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def value(self, labels=()):
+        """@return the current value for the given label values, or None if there is none"""
+        return self._values.get(tuple(labels))
+
+    def render(self):
+        """@return list of lines in prometheus text exposition format"""
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s %s' % (self.name, self.kind)]
+        for suffix, labels, extra, value in self._samples():
+            lines.append('%s%s%s %r' % (self.name, suffix, self._format_labels(labels, extra), float(value)))
+        # end for each sample
+        return lines
+
+    def snapshot(self):
+        """@return a json-compatible representation of our values"""
+        self._lock.acquire()
+        try:
+            return [dict(labels=dict(zip(self.label_names, labels)), value=value)
+                    for labels, value in sorted(self._values.iteritems())]
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    ## -- End Interface -- @}
+
+# end class Metric
+
+
+class Counter(Metric):
+    """A value which only ever increases"""
+    __slots__ = ()
+
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        """Increase the counter for the given label values by the given amount"""
+        labels = tuple(labels)
+        self._lock.acquire()
+        try:
+            self._values[labels] = self._values.get(labels, 0) + amount
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+# end class Counter
+
+
+class Gauge(Metric):
+    """A value which may go up and down"""
+    __slots__ = ()
+
+    kind = 'gauge'
+
+    def set(self, value, labels=()):
+        """Set the value for the given label values"""
+        self._lock.acquire()
+        try:
+            self._values[tuple(labels)] = value
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+# end class Gauge
+
+
+class Histogram(Metric):
+    """Counts observed values in buckets, and keeps their sum"""
+    __slots__ = ('buckets', )
+
+    kind = 'histogram'
+
+    ## Default upper bounds of buckets, suitable for durations in seconds
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        """Initialize this instance
+        @param buckets sorted upper bounds of all buckets. An unbounded one is implied"""
+        super(Histogram, self).__init__(name, help, label_names)
+        self.buckets = tuple(buckets)
+
+    def _samples(self):
+        res = list()
+        self._lock.acquire()
+        try:
+            for labels, (counts, total) in sorted(self._values.iteritems()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'), ), counts):
+                    cumulative += count
+                    res.append(('_bucket', labels, (('le', bound == float('inf') and '+Inf' or repr(bound)), ),
+                                cumulative))
+                # end for each bucket
+                res.append(('_sum', labels, (), total))
+                res.append(('_count', labels, (), cumulative))
+            # end for each label set
+        finally:
+            self._lock.release()
+        # end assure lock is released
+        return res
+
+    def observe(self, value, labels=()):
+        """Count the given value into its bucket for the given label values"""
+        labels = tuple(labels)
+        self._lock.acquire()
+        try:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            # end create entry on demand
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def value(self, labels=()):
+        """@return tuple(count, sum) of all values observed for the given label values, or None"""
+        entry = self._values.get(tuple(labels))
+        if entry is None:
+            return None
+        return sum(entry[0]), entry[1]
+
+    def snapshot(self):
+        self._lock.acquire()
+        try:
+            return [dict(labels=dict(zip(self.label_names, labels)),
+                         buckets=dict(zip(map(repr, self.buckets) + ['+Inf'], counts)),
+                         count=sum(counts),
+                         sum=total)
+                    for labels, (counts, total) in sorted(self._values.iteritems())]
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+# end class Histogram
+
+
+class MetricsRegistry(object):
+    """Keeps metrics by name, and renders all of them at once"""
+    __slots__ = ('_metrics', )
+
+    def __init__(self):
+        self._metrics = list()
+
+    def _add(self, metric):
+        assert metric.name not in set(item.name for item in self._metrics), "duplicate metric %s" % metric.name
+        self._metrics.append(metric)
+        return metric
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def counter(self, name, help, label_names=()):
+        """@return a new Counter, registered with us"""
+        return self._add(Counter(name, help, label_names))
+
+    def gauge(self, name, help, label_names=()):
+        """@return a new Gauge, registered with us"""
+        return self._add(Gauge(name, help, label_names))
+
+    def histogram(self, name, help, label_names=(), buckets=Histogram.DEFAULT_BUCKETS):
+        """@return a new Histogram, registered with us"""
+        return self._add(Histogram(name, help, label_names, buckets))
+
+    def metrics(self):
+        """@return list of all our metrics, in registration order"""
+        return list(self._metrics)
+
+    def render(self):
+        """@return all metrics in prometheus text exposition format"""
+        lines = list()
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        # end for each metric
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """@return a json-compatible dict of all metrics by name"""
+        return dict((metric.name, dict(type=metric.kind, help=metric.help, values=metric.snapshot()))
+                    for metric in self._metrics)
+
+    def write_snapshot(self, path):
+        """Write our snapshot as json to the given path, replacing the previous file atomically"""
+        tmp_path = path + '.tmp'
+        fh = open(tmp_path, 'w')
+        try:
+            json.dump(dict(time=time.time(), metrics=self.snapshot()), fh, indent=1, sort_keys=True)
+        finally:
+            fh.close()
+        # end assure file is closed
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        # end windows can't rename onto existing files
+        os.rename(tmp_path, path)
+
+    ## -- End Interface -- @}
+
+# end class MetricsRegistry
+
+
+class _MetricsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves the registry of our server at any path"""
+
+    def do_GET(self):
+        body = self.server.registry.render()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Don't log each scrape to stderr"""
+
+# end class _MetricsRequestHandler
+
+
+class MetricsHTTPServer(object):
+    """Serves a MetricsRegistry over HTTP from a daemon thread"""
+    __slots__ = ('_registry',
+                 '_address',
+                 '_server',
+                 '_thread')
+
+    def __init__(self, registry, port, host='localhost'):
+        """Initialize this instance. The server is started with start()
+        @param port to listen on, or 0 to choose a free one"""
+        self._registry = registry
+        self._address = (host, port)
+        self._server = None
+        self._thread = None
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def start(self):
+        """Start serving, if we are not yet doing so
+        @throws socket.error if the port can't be bound"""
+        if self._server is not None:
+            return
+        # end bail out if running
+        self._server = BaseHTTPServer.HTTPServer(self._address, _MetricsRequestHandler)
+        self._server.registry = self._registry
+        self._thread = threading.Thread(target=self._server.serve_forever, name='sg-events-metrics')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def port(self):
+        """@return the port we are listening on, or None if we are not running"""
+        if self._server is None:
+            return None
+        return self._server.server_address[1]
+
+    def stop(self):
+        """Stop serving, if we are running"""
+        if self._server is None:
+            return
+        # end bail out if not running
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = self._thread = None
+
+    ## -- End Interface -- @}
+
+# end class MetricsHTTPServer
+
+
+class EngineMetrics(object):
+    """All metrics maintained by the EventEngine, available as attributes"""
+    __slots__ = ('registry',
+                 'polls',
+                 'events_fetched',
+                 'poll_events',
+                 'fetch_seconds',
+                 'handle_seconds',
+                 'events_skipped',
+                 'backlog_events',
+                 'lag_events',
+                 'journal_commit_seconds',
+                 'connection_retries',
+                 'pool_connections',
+                 'pool_leases',
+                 'pool_waits',
+                 'pool_wait_seconds',
+                 'owned_plugins')
+
+    def __init__(self, registry=None):
+        """Initialize this instance
+        @param registry the MetricsRegistry to add our metrics to, a new one by default"""
+        self.registry = registry = registry or MetricsRegistry()
+        self.polls = registry.counter('sgevents_polls_total', "Amount of polls for new events")
+        self.events_fetched = registry.counter('sgevents_events_fetched_total', "Amount of events fetched")
+        self.poll_events = registry.gauge('sgevents_poll_events', "Amount of events fetched by the last poll")
+        self.fetch_seconds = registry.histogram('sgevents_fetch_seconds', "Duration of event queries")
+        self.handle_seconds = registry.histogram('sgevents_handle_event_seconds',
+                                                 "Duration of event handling per plugin", ('plugin', ))
+        self.events_skipped = registry.counter('sgevents_events_skipped_total',
+                                               "Amount of events skipped as they didn't match a plugin's filters",
+                                               ('plugin', ))
+        self.backlog_events = registry.gauge('sgevents_backlog_events',
+                                             "Amount of missing events a plugin waits for", ('plugin', ))
+        self.lag_events = registry.gauge('sgevents_lag_events',
+                                         "Newest fetched event id minus the last event id processed by a plugin",
+                                         ('plugin', ))
+        self.journal_commit_seconds = registry.histogram('sgevents_journal_commit_seconds',
+                                                         "Duration of journal commits")
+        self.connection_retries = registry.counter('sgevents_connection_retries_total',
+                                                   "Amount of failed attempts to reach shotgun")
+        self.pool_connections = registry.gauge('sgevents_pool_connections',
+                                               "Amount of pooled shotgun connections by state", ('state', ))
+        self.pool_leases = registry.gauge('sgevents_pool_leases', "Amount of connections leased from the pool")
+        self.pool_waits = registry.gauge('sgevents_pool_waits',
+                                         "Amount of leases which had to wait for a free connection")
+        self.pool_wait_seconds = registry.gauge('sgevents_pool_wait_seconds',
+                                                "Time spent waiting for free connections")
+        self.owned_plugins = registry.gauge('sgevents_owned_plugins',
+                                            "Amount of plugins this node owns in a cluster")
+        self.plugin_failures = registry.gauge('sgevents_plugin_failures',
+                                              "Amount of consecutive failures of a plugin to handle events",
+                                              ('plugin', ))
+        self.dead_letter_events = registry.gauge('sgevents_dead_letter_events',
+                                                 "Amount of events a plugin gave up on, kept in its dead-letter store",
+                                                 ('plugin', ))
+        self.log_records_dropped = registry.gauge('sgevents_log_records_dropped',
+                                                  "Amount of log records dropped as the logging queue was full")
+
+# end class EngineMetrics
+
+## -- End Types -- @}
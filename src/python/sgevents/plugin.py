@@ -6,18 +6,23 @@
 @author Sebastian Thiel
 @copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
 """
-__all__ = ['EventEnginePlugin', 'with_event_application', 'with_global_event_application']
+__all__ = ['EventEnginePlugin', 'with_event_application', 'with_global_event_application', 
+           'event_filters_match']
 
 import os
+import sys
+import time
+import socket
 import logging
-from datetime import (datetime,
-                      timedelta)
 
 import bapp
 from bapp import preserve_application
 from butility import (abstractmethod,
                       wraps)
 
+from .backlog import EventBacklog
+from .writeback import ShotgunWriteBuffer
+
 
 # ==============================================================================
 ## @name Decorators
@@ -48,6 +53,33 @@ def with_global_event_application(fun):
 
 
 
+# ==============================================================================
+## @name Functions
+# ------------------------------------------------------------------------------
+## @{
+
+def event_filters_match(event_filters, event_type, attribute_name):
+    """@return True if an event of the given type and attribute matches the given event filters
+    @param event_filters a dict as described in EventEnginePlugin.event_filters"""
+    if not event_filters:
+        return True
+
+    if '*' in event_filters:
+        event_type = '*'
+    elif event_type not in event_filters:
+        return False
+    # end 
+
+    attributes = event_filters[event_type]
+    if not attributes or '*' in attributes:
+        return True
+
+    return bool(attribute_name) and attribute_name in attributes
+
+## -- End Functions -- @}
+
+
+
 # ==============================================================================
 ## @name Type
 # ------------------------------------------------------------------------------
@@ -61,7 +93,19 @@ class EventEnginePlugin(object):
                  '_sg',
                  '_active',
                  '_last_event_id',
-                 '_backlog'
+                 '_backlog',
+                 '_worker',
+                 '_write_buffer',
+                 '_unflushed',
+                 '_written_ids',
+                 '_batch',
+                 '_batched_ids',
+                 '_batch_started_at',
+                 '_failures',
+                 '_failed_event_id',
+                 '_event_attempts',
+                 '_resume_at',
+                 '_dead_letters'
                  )
 
 
@@ -73,6 +117,62 @@ class EventEnginePlugin(object):
     # dict('APPLICATION_ENTITYTYPE_ACTION', attributes|None), 
     # see https://github.com/shotgunsoftware/python-api/wiki/Event-Types for more information
     event_filters = None
+
+    ## If True, handle_event() will be called in a separate process. This is useful if it is CPU-bound.
+    # The engine's settings may also select plugins for running in a process.
+    run_in_process = False
+
+    ## The lane in which the engine dispatches events to us, one of 'interactive', 'normal' or 'bulk'.
+    # Each lane fetches events starting at the oldest one its plugins still have to process, and lanes are 
+    # served in that order. That way, interactive plugins see new events right away, even while bulk plugins
+    # catch up on a large backlog. The engine's settings may also put plugins into a lane.
+    priority = 'normal'
+
+    ## Amount of seconds to wait for missing events to show up before giving up on them
+    backlog_timeout = 5 * 60
+
+    ## If the engine's request cache is enabled, the entity of each event we handle will be fetched before
+    # handle_event() is called, along with the fields of all plugins interested in the event.
+    # dict('ENTITYTYPE', [field, ...]), e.g. {'Shot' : ['sg_cut_in', 'sg_cut_out']}
+    prefetch_fields = None
+
+    ## If not None, a list of the EventLogEntry fields handle_event() uses, like ['entity', 'meta']. The engine 
+    # fetches only the fields its plugins need, in addition to id, event_type, attribute_name and session_uuid.
+    # Accessing other fields of the event fails. If None, all fields the engine knows are fetched
+    required_fields = None
+
+    ## If not 0, create(), update() and delete() calls made on the connection passed to handle_event() are 
+    # buffered, and sent in batches of about the given size, each holding all changes of the events in it. Events
+    # count as processed only once all changes made while handling them are written. Buffered calls return None.
+    write_batch_size = 0
+
+    ## If not 0, events are queued and passed to handle_events() in batches of up to the given size
+    event_batch_size = 0
+
+    ## If not 0, queued events are kept for up to the given amount of seconds to fill a batch, otherwise they are
+    # handled at the end of each page of events. The timeout is checked once per page, which happens at least 
+    # every poll
+    event_batch_timeout = 0
+
+    ## Amount of times an event on which handle_event() failed is retried before it is parked in our dead-letter
+    # store and skipped. Failures due to transient_errors don't count. While retrying, we are paused, without
+    # holding back other plugins. If None, the first failure disables us until the engine is restarted
+    retry_attempts = 3
+
+    ## Amount of seconds to wait before retrying after the first failure. It doubles with every consecutive
+    # failure, up to retry_max_delay
+    retry_delay = 1.0
+    retry_max_delay = 60.0
+
+    ## Amount of consecutive failures after which the circuit opens, or 0 to never open it. While it is open,
+    # the failed event is retried only every circuit_probe_interval seconds
+    circuit_failures = 5
+    circuit_probe_interval = 5 * 60
+
+    ## Exceptions which indicate a problem outside of the plugin, like connection failures. Events failing with 
+    # them are retried until they succeed. shotgun_api3.ProtocolError and ConnectionPoolError, raised if the
+    # engine's pool has no free connection, are always transient
+    transient_errors = (socket.error, )
     
     ## -- End Subclass Interface -- @}
 
@@ -84,7 +184,23 @@ class EventEnginePlugin(object):
         """
         self._active = True
         self._last_event_id = None
-        self._backlog = {}
+        self._backlog = EventBacklog()
+        self._worker = None
+        self._write_buffer = None
+        self._unflushed = list()
+        # ids of events after a failed write whose changes were written, and which must not be handled again
+        self._written_ids = set()
+        self._batch = list()
+        self._batched_ids = set()
+        self._batch_started_at = None
+        self._failures = 0
+        self._failed_event_id = None
+        self._event_attempts = 0
+        self._resume_at = None
+        self._dead_letters = None
+        if self.write_batch_size:
+            self._write_buffer = ShotgunWriteBuffer(sg, self.write_batch_size, log)
+        # end setup write buffer
 
         # Setup the plugin's logger
         self._sg = sg
@@ -96,35 +212,242 @@ class EventEnginePlugin(object):
 
     def _process(self, event):
         """run through all callbacks and process them.
-        Disable ourselves on failure
+        Apply our failure policy on failure
         @return True on success"""
         assert self.is_active(), "shold be active when engine calls us"
         if self._can_process_event(event):
             self._log.debug('Dispatching event %d to callback %s.', event['id'], str(self))
 
-            # set session_uuid for UI updates
-            self._sg.set_session_uuid(event['session_uuid'])
+            shotgun = self._connection_for(event)
             try:
-                self.handle_event(self._sg, self._log, event)
+                self.handle_event(shotgun, self._log, event)
             except Exception:
-                msg = 'An error occured processing an event in callback %s'
-                self._log.critical(msg, str(self), exc_info=True)
-                self._active = False
+                self._handle_failure(event)
+                return False
             # end log errors
+            self._clear_failures()
         else:
             self._log.debug("Ignored event '%s' as it didn't match our filters", event.event_type)
         # end
 
-        return self._active
+        return True
+
+    def _connection_for(self, event):
+        """@return the connection to pass to our handlers when handling the given event, or the batch of events 
+        starting with it"""
+        shotgun = self._sg
+        if self._write_buffer is not None:
+            shotgun = self._write_buffer
+            shotgun.set_event_id(event['id'])
+        # end use write buffer
+
+        # set session_uuid for UI updates
+        shotgun.set_session_uuid(event['session_uuid'])
+        return shotgun
+
+    def _process_batch(self, events):
+        """Have handle_events() process the given events. On failure, a batch of multiple events is just
+        logged, whereas the failure of a single event is subject to our failure policy
+        @return True on success"""
+        assert self.is_active(), "shold be active when engine calls us"
+        accepted = [event for event in events if self._can_process_event(event)]
+        if not accepted:
+            return True
+        # end bail out if there is nothing to do
+
+        self._log.debug('Dispatching batch of %d events to callback %s.', len(accepted), str(self))
+        try:
+            self.handle_events(self._connection_for(accepted[0]), self._log, accepted)
+        except Exception:
+            if len(events) == 1:
+                self._handle_failure(events[0])
+            else:
+                self._log.warning('Failed to process a batch of %d events in callback %s - replaying them one '
+                                  'by one', len(events), str(self), exc_info=True)
+                if self._write_buffer is not None:
+                    self._write_buffer.discard(accepted[0]['id'])
+                # end drop changes of batch
+            # end handle failure
+            return False
+        # end handle errors
+        self._clear_failures()
+        return True
+
+    def _events_done(self, event_ids):
+        """Mark the events with the given ids as processed once all changes made while handling them are 
+        written"""
+        if self._write_buffer is None or not (self._write_buffer or self._unflushed):
+            for event_id in sorted(event_ids):
+                self._mark_processed(event_id)
+            # end for each event id
+        else:
+            self._unflushed.append(tuple(event_ids))
+            if len(self._write_buffer) >= self.write_batch_size:
+                self.flush_writes()
+            # end flush full batches
+        # end handle buffered changes
+
+    def _queue_event(self, event):
+        """Put the given event into our batch, and handle the batch if it is full"""
+        if not self._batch:
+            self._batch_started_at = time.time()
+        # end track age of batch
+        self._batch.append(event)
+        self._batched_ids.add(event['id'])
+        if len(self._batch) >= self.event_batch_size:
+            self.flush_events()
+        # end handle full batches
+
+    def _handle_failure(self, event):
+        """Called from within an exception handler if handle_event() failed on the given event.
+        Pauses ourselves until the event is due to be retried, or parks it if it failed too often"""
+        msg = 'An error occured processing event %d in callback %s'
+        self._log.error(msg, event['id'], str(self), exc_info=True)
+        if self._write_buffer is not None:
+            # keep what previous events did
+            self._write_buffer.discard(event['id'])
+            self.flush_writes()
+        # end handle buffered changes
+
+        if self.retry_attempts is None:
+            self._log.critical('Disabling plugin %s', str(self))
+            self._active = False
+            return
+        # end handle legacy policy
+
+        if self._fail(event['id'], self._is_transient(sys.exc_info()[1])):
+            self._park_event(event)
+        # end handle poison events
+
+    def _is_transient(self, error):
+        """@return True if the given exception indicates a problem outside of ourselves, see transient_errors"""
+        # shotgun_api3 is slow to import, and not needed until something failed
+        import shotgun_api3
+        from .pool import ConnectionPoolError
+        return isinstance(error, self.transient_errors + (shotgun_api3.ProtocolError, ConnectionPoolError))
+
+    def _fail(self, event_id, transient):
+        """Count a failed attempt to handle the event with the given id, and pause until it may be retried
+        @param transient if True, the attempt doesn't count towards retry_attempts
+        @return True if the event failed too often, and should be parked instead of being retried"""
+        if event_id != self._failed_event_id:
+            self._failed_event_id = event_id
+            self._event_attempts = 0
+        # end track attempts per event
+        self._failures += 1
+        if not transient:
+            self._event_attempts += 1
+        # end count attempts
+        if self._event_attempts > self.retry_attempts:
+            return True
+        # end handle poison events
+
+        if self.circuit_failures and self._failures >= self.circuit_failures:
+            delay = self.circuit_probe_interval
+            self._log.error('Plugin %s failed %d times in a row - circuit is open, probing event %d again in %.1fs',
+                            str(self), self._failures, event_id, delay)
+        else:
+            delay = min(self.retry_delay * 2 ** (self._failures - 1), self.retry_max_delay)
+            self._log.warning('Plugin %s retries event %d in %.1fs', str(self), event_id, delay)
+        # end choose delay
+        self._resume_at = time.time() + delay
+        return False
+
+    def _park_event(self, event):
+        """Put the given event into our dead-letter store, and consider it processed"""
+        self._log.critical('Plugin %s failed on event %d %d times - parking it', 
+                           str(self), event['id'], self._event_attempts)
+        self._store_dead_letters([event])
+        self._clear_failures()
+        self._events_done([event['id']])
+
+    def _store_dead_letters(self, events):
+        """Append the given parked events to our dead-letter store, if we have one"""
+        if self._dead_letters is None:
+            return
+        # end bail out if parked events are just logged
+        try:
+            self._dead_letters.append(events)
+        except (OSError, IOError):
+            self._log.error('Failed to store parked event(s) %s', ', '.join(str(event['id']) for event in events),
+                            exc_info=True)
+        # end ignore storage errors
+
+    def _clear_failures(self):
+        """Reset our failure policy after an event was handled successfully"""
+        if self.circuit_failures and self._failures >= self.circuit_failures:
+            self._log.info('Plugin %s recovered - circuit is closed', str(self))
+        # end log recovery
+        self._failures = 0
+        self._failed_event_id = None
+        self._event_attempts = 0
+        self._resume_at = None
+
+    def _process_in_worker(self, event):
+        """Have our worker process the event, and adopt the state it returns"""
+        if not self._can_process_event(event):
+            self._log.debug("Ignored event '%s' as it didn't match our filters", event.event_type)
+            self._mark_processed(event['id'])
+            return
+        # end don't bother the worker with events it won't handle
+
+        try:
+            active, resume_at, state, parked = self._worker.process(event, self.state())
+        except Exception:
+            msg = 'Worker process of plugin %s failed to process event %d'
+            self._log.critical(msg, str(self), event['id'], exc_info=True)
+            self._active = False
+        else:
+            self.set_state(state)
+            self._active = active
+            # the worker's instance applied our failure policy
+            self._resume_at = resume_at
+            for events in parked:
+                self._store_dead_letters(events)
+            # end for each batch of parked events
+        # end handle worker failure
+
+    def _is_pending(self, event_id):
+        """@return True if the event with the given id still has to be processed by us"""
+        if event_id in self._batched_ids or event_id in self._written_ids:
+            return False
+        # end queued and written events are taken care of
+        return (event_id in self._backlog or 
+                self._last_event_id is None or 
+                event_id > self._last_event_id)
+
+    def _take_written(self, event_id):
+        """Mark the event with the given id as done if its changes were written while an earlier event failed
+        to write its own, now that we got to it again.
+        @return True if it was written, False if it still has to be processed"""
+        if event_id not in self._written_ids:
+            return False
+        # end bail out if it wasn't written
+        self._written_ids.remove(event_id)
+        # it must not count as processed before the events prior to it, which may still be unflushed
+        self._events_done([event_id])
+        return True
+
+    def _mark_processed(self, event_id):
+        """Update our bookkeeping once the event with the given id was processed"""
+        self._backlog.discard(event_id)
+        self._update_last_event_id(event_id)
 
     def _update_last_event_id(self, event_id):
-        if self._last_event_id is not None and event_id > self._last_event_id + 1:
-            expiration = datetime.now() + timedelta(minutes=5)
-            for skipped_id in range(self._last_event_id + 1, event_id):
-                self._log.debug('Adding event id %d to backlog.', skipped_id)
-                self._backlog[skipped_id] = expiration
-            # for each skipped id
-        # end if there is an event gap / we missed events
+        """Set the given id as the last one we processed. All ids between the previous last id and the given one
+        are considered missing, and are put into the backlog to be processed once they show up.
+        @note existing events which were filtered, on the server or by us, must be passed to skip_events() 
+        before, so they are not mistaken as missing"""
+        if self._last_event_id is not None:
+            if event_id <= self._last_event_id:
+                # it was an event from the backlog, we don't go back in time
+                return
+            elif event_id > self._last_event_id + 1:
+                first_id, last_id = self._last_event_id + 1, event_id - 1
+                self._log.debug('Adding event ids %d to %d to backlog.', first_id, last_id)
+                self._backlog.add_range(first_id, last_id, time.time() + self.backlog_timeout)
+            # end if there is an event gap / we missed events
+        # end handle previous id
         self._last_event_id = event_id
 
 
@@ -140,24 +463,7 @@ class EventEnginePlugin(object):
 
     def _can_process_event(self, event):
         """@return True if the given event matches our event_fitlers"""
-        event_filters = self._event_filters()
-        if not event_filters:
-            return True
-
-        if '*' in event_filters:
-            event_type = '*'
-        else:
-            event_type = event['event_type']
-            if event_type not in event_filters:
-                return False
-            # end
-        # end 
-
-        attributes = event_filters[event_type]
-        if not attributes or '*' in attributes:
-            return True
-
-        return event['attribute_name'] and event['attribute_name'] in attributes
+        return event_filters_match(self._event_filters(), event['event_type'], event['attribute_name'])
 
     ## -- End Callback Logic -- @}
 
@@ -173,7 +479,12 @@ class EventEnginePlugin(object):
     def set_state(self, state):
         """Sets the previously persisted state, as returned by state()"""
         if isinstance(state, tuple):
-            self._last_event_id, self._backlog = state
+            self._last_event_id, backlog = state
+            if isinstance(backlog, dict):
+                # migrate state written by previous versions
+                backlog = EventBacklog.from_dict(backlog)
+            # end convert backlog
+            self._backlog = backlog
         else:
             raise ValueError('Unknown state type: %s.' % type(state))
         # end handle state type
@@ -189,21 +500,40 @@ class EventEnginePlugin(object):
         return str(self)
 
     def next_unprocessed_event_id(self):
+        """@return id of the oldest event we still have to process, or None if we don't need any events.
+        The latter is the case while we are paused after a failure. Once the pause is over, we are ready to
+        retry the failed event"""
+        if self._resume_at is not None:
+            if time.time() < self._resume_at:
+                return None
+            # end wait until pause is over
+            self._log.info('Plugin %s resumes after %d failure(s)', str(self), self._failures)
+            self._resume_at = None
+        # end handle pause
+
         if self._last_event_id:
             next_id = self._last_event_id + 1
         else:
             next_id = None
         # end 
 
-        now = datetime.now()
-        for k, v in self._backlog.items():
-            if v < now:
-                self._log.warning('Timeout elapsed on backlog event id %d.', k)
-                del(self._backlog[k])
-            elif next_id is None or k < next_id:
-                next_id = k
-            # end 
-        # end for each entry in backlog
+        if self._batched_ids:
+            # queued events are not yet processed, but must not be fetched again
+            next_id = max(next_id, max(self._batched_ids) + 1)
+        # end skip queued events
+
+        for first_id, last_id in self._backlog.expire():
+            if first_id == last_id:
+                self._log.warning('Timeout elapsed on backlog event id %d.', first_id)
+            else:
+                self._log.warning('Timeout elapsed on backlog event ids %d to %d.', first_id, last_id)
+            # end log expired events
+        # end for each expired range
+
+        backlog_id = self._backlog.min_id()
+        if backlog_id is not None and (next_id is None or backlog_id < next_id):
+            next_id = backlog_id
+        # end use oldest missing event
 
         return next_id
 
@@ -216,17 +546,127 @@ class EventEnginePlugin(object):
         """
         return self._active
 
+    def is_paused(self):
+        """@return True if we failed recently, and must not be passed any events until next_unprocessed_event_id() 
+        was called after the pause is over"""
+        return self._resume_at is not None
+
+    def failures(self):
+        """@return amount of consecutive failures to handle events"""
+        return self._failures
+
+    def set_dead_letter_store(self, store):
+        """Set the store to keep events we gave up on, or None to just log them. It must provide an
+        append(events) method, like an EventSpool"""
+        self._dead_letters = store
+
+    def set_worker(self, worker):
+        """Set a ProcessPluginWorker to call handle_event() in a separate process, or None to call it directly"""
+        self._worker = worker
+
+    def worker(self):
+        """@return our ProcessPluginWorker, or None if we handle events in the engine's process"""
+        return self._worker
+
+    def flush_writes(self):
+        """Write all changes buffered while handling events, and mark these events as processed.
+        If a change could not be written, the event which made it remains unprocessed, and we pause until it may
+        be retried, as if handling it failed with a transient error. Our last event id stays below it, and later
+        events whose changes were written are remembered, to skip them once they are fetched again"""
+        if self._write_buffer is None:
+            return
+        # end bail out if we don't buffer
+
+        failed_event_ids = set(failure.event_id for failure in self._write_buffer.flush())
+        # changes made while handling a batch are associated with its first event
+        written_ids = [event_id for event_ids in self._unflushed if event_ids[0] not in failed_event_ids
+                                for event_id in event_ids]
+        first_failed_id = failed_event_ids and min(failed_event_ids) or None
+        for event_id in sorted(written_ids):
+            if first_failed_id is not None and event_id > first_failed_id:
+                # we may not advance past the failed event, but its successors must not be handled again
+                self._written_ids.add(event_id)
+            else:
+                self._mark_processed(event_id)
+            # end handle events after the failed one
+        # end for each written event
+        del self._unflushed[:]
+
+        if failed_event_ids:
+            self._log.error("Failed to write changes made for event(s) %s in plugin %s",
+                            ', '.join(map(str, sorted(failed_event_ids))), str(self))
+            if self.retry_attempts is None:
+                self._log.critical('Disabling plugin %s', str(self))
+                self._active = False
+            else:
+                self._fail(first_failed_id, True)
+            # end apply failure policy
+        # end handle failures
+
+    def has_queued_events(self):
+        """@return True if there are events waiting to be passed to handle_events()"""
+        return bool(self._batch)
+
+    def flush_events(self, force=True):
+        """Pass all queued events to handle_events(). If that fails, each event is passed on its own, to find 
+        the one that fails, which pauses us. Events handled before it count as processed, the ones after it will
+        be fetched again.
+        @param force if False, only handle the events if the batch is full, or if our event_batch_timeout
+        elapsed"""
+        if not self._batch:
+            return
+        # end bail out if there is nothing to do
+        if (not force and self.event_batch_timeout and len(self._batch) < self.event_batch_size and
+            time.time() - self._batch_started_at < self.event_batch_timeout):
+            return
+        # end keep filling the batch
+
+        events = self._batch
+        self._batch = list()
+        self._batched_ids.clear()
+        if not self._active:
+            return
+        # end inactive plugins don't handle anything
+
+        if self._process_batch(events):
+            self._events_done([event['id'] for event in events])
+            return
+        # end handle success
+
+        for event in events:
+            if not self._process_batch([event]):
+                if self.is_paused() or not self._active:
+                    break
+                # end stop at failing event
+                continue
+            # end skip parked events
+            self._events_done([event['id']])
+        # end for each event to replay
+
+    def skip_events(self, event_ids):
+        """Mark the given events as processed without handling them, usually because they don't match our
+        filters. Events which were processed already are ignored.
+        @param event_ids sorted iterable of event ids"""
+        for event_id in event_ids:
+            if self._take_written(event_id):
+                continue
+            elif self._is_pending(event_id):
+                self._mark_processed(event_id)
+            # end advance on pending events
+        # end for each event id
+
     def process(self, event):
-        if event['id'] in self._backlog:
-            if self._process(event):
-                del(self._backlog[event['id']])
-                self._update_last_event_id(event['id'])
-        elif self._last_event_id is not None and event['id'] <= self._last_event_id:
+        if self._take_written(event['id']):
+            self._log.debug('Changes made for event %d were written already', event['id'])
+        elif not self._is_pending(event['id']):
             msg = 'Event %d is too old. Last event processed was (%d).'
             self._log.debug(msg, event['id'], self._last_event_id)
-        else:
-            if self._process(event):
-                self._update_last_event_id(event['id'])
+        elif self._worker is not None:
+            self._process_in_worker(event)
+        elif self.event_batch_size:
+            self._queue_event(event)
+        elif self._process(event):
+            self._events_done([event['id']])
         # end handle event id
 
         return self._active
@@ -242,7 +682,8 @@ class EventEnginePlugin(object):
     def handle_event(self, shotgun, log, event):
         """Perform an operation on the given event
         @param shotgun a ShotgunConnection for querying additional data
-        @param event a DictObject of the event entity representing the event in question
+        @param event an EventView of the event entity representing the event in question. It is shared with
+        other plugins, and can't be changed
         @note your context will by default be the one your Application started up with. However, 
         it might not be suitable for processing the given event. Instead, use the with_event_application()
         wrapper to produce a suitable one. Code processing events shouldn't rely on the global Application
@@ -252,12 +693,25 @@ class EventEnginePlugin(object):
         """
         raise NotImplementedError("to be implemented in subclass")
 
+    def handle_events(self, shotgun, log, events):
+        """Perform an operation on all the given events, which is called instead of handle_event() if 
+        event_batch_size is set. Allows to query all entities affected by the events at once, for instance.
+        @param events a list of EventViews, see handle_event(), in the order they were dispatched
+        @note if it fails, each event will be passed on its own, and thus may be handled more than once.
+        The default implementation calls handle_event() for each event"""
+        for event in events:
+            self.handle_event(shotgun, log, event)
+        # end for each event
 
     def event_application(self, shotgun, log, event):
         """@return an Application instance suitable for providing context for the given event
         @note default implementation just returns the active global instance."""
         return bapp.main()
 
+    def close(self):
+        """Called once the engine discards us, after it passed the last event, to release files or connections
+        we keep. The default implementation does nothing"""
+
     ## -- End Subclass Interface -- @}
 
 # end class EventEnginePlugin
@@ -1,50 +1,105 @@
-
 import os
+import time
 import logging
 import pprint
 
 import bapp
 from butility import Path
 from sgevents import EventEnginePlugin
-
-try:
-	import yaml
-except ImportError:
-	raise ImportError("The python yaml package is not available")
-#END handle yaml
+from sgevents.spool import EventSpool
 
 
 class EventRecorder(EventEnginePlugin, bapp.plugin_type()):
 	"""Record events taken from the daemon
 	Configure the script using the invariants at the top of the file.
-	Then take the recordings of the events as fixtures into your test suite.
-	
+	Then take the recordings of the events as fixtures into your test suite, loading them with
+	sgevents.spool.recorded_events().
+
 	If your want to use this code, just import this module and derive from this type,
 	overriding the configuration invariants accordingly.
-	
+
 	Then implement the registerCallbacks method using your type in your plugin accordingly."""
+	__slots__ = ('_spool', '_unsynced', '_last_sync_time')
 
 	#{ Configuration
-	
+
 	# directory at which to store the events
 	storage_root_path = Path('.')
-	
+
+	# 'segments' appends events to rotating binary segment files, 'yaml' writes one yaml file per event,
+	# which requires the yaml package. Existing yaml recordings can be converted with sgevents.spool
+	storage_format = 'segments'
+
+	# size in bytes after which a new segment is started
+	segment_size = 64 * 1024 * 1024
+
+	# recorded events are handed to the operating system right away, and synced to disk after this amount of 
+	# events, or this amount of seconds, whichever comes first. 0 disables the respective limit
+	fsync_every_events = 100
+	fsync_every_seconds = 5.0
+
 	# if true, events will be logged as well using debug priority
 	debug_events = True
 
 	# handled all events
 	event_filters = dict()
-	
+
 	#}END configuration
-	
-	def handle_event(self, sg, log, event):
-		"""Perform actual event recording."""
+
+	def __init__(self, *args, **kwargs):
+		super(EventRecorder, self).__init__(*args, **kwargs)
+		self._spool = None
+		self._unsynced = 0
+		self._last_sync_time = time.time()
+
+	def _record_segments(self, event):
+		"""Append the event to our spool, and sync it according to our configuration"""
+		if self._spool is None:
+			self._spool = EventSpool(self.storage_root_path, self.segment_size)
+		#END create spool on first use
+		# flushing is cheap and survives crashes of our process, only syncing is deferred
+		self._unsynced += self._spool.append([event], flush=True)
+		if ((self.fsync_every_events and self._unsynced >= self.fsync_every_events) or
+			(self.fsync_every_seconds and time.time() - self._last_sync_time >= self.fsync_every_seconds)):
+			self._spool.sync()
+			self._unsynced = 0
+			self._last_sync_time = time.time()
+		#END sync if due
+
+	def _record_yaml(self, event, log):
+		"""Write the event into a yaml file of its own"""
+		try:
+			import yaml
+		except ImportError:
+			raise ImportError("The python yaml package is not available")
+		#END handle yaml
 		name = "%s_%s.yaml" % (event.event_type, event.id)
 		event_path = self.storage_root_path / name
-		yaml.dump(event, open(event_path, 'wb'))
+		fh = open(event_path, 'wb')
+		try:
+			yaml.dump(event.to_dict(), fh)
+		finally:
+			fh.close()
+		#END assure file is closed
 		log.info("Storing event at %s", event_path)
-		
-		if self.debug_events:
+
+	def close(self):
+		"""Sync and close our spool"""
+		if self._spool is not None:
+			self._spool.sync()
+			self._spool.close()
+			self._spool = None
+		#END close spool
+
+	def handle_event(self, sg, log, event):
+		"""Perform actual event recording."""
+		if self.storage_format == 'yaml':
+			self._record_yaml(event, log)
+		else:
+			self._record_segments(event)
+		#END handle format
+
+		if self.debug_events and log.isEnabledFor(logging.DEBUG):
 			log.debug(pprint.pformat(event))
 		#END debug logging
 
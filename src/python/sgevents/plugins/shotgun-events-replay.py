@@ -0,0 +1,58 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.plugins.shotgun-events-replay
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import sys
+import json
+
+import bapp
+from bcmd import SubCommand
+
+from sgevents import ShotgunEventEngineCommand
+
+
+class ShotgunEventsReplaySubCommand(SubCommand, bapp.plugin_type()):
+    """Feeds events from a spool through plugins, as in `shotgun-events replay --first 100 --last 200 SPOOL`"""
+    __slots__ = ()
+
+    name = 'replay'
+    version = ShotgunEventEngineCommand.version
+    description = "feeds spooled events through plugins, without talking to shotgun"
+    main_command_name = ShotgunEventEngineCommand.name
+
+    def setup_argparser(self, parser):
+        super(ShotgunEventsReplaySubCommand, self).setup_argparser(parser)
+        parser.add_argument('spool', help="directory of the spool, as configured in spool.directory")
+        parser.add_argument('--first', dest='first_id', type=int, default=None,
+                            help="id of the first event to replay, the oldest spooled one by default")
+        parser.add_argument('--last', dest='last_id', type=int, default=None,
+                            help="id of the last event to replay, the newest spooled one by default")
+        parser.add_argument('--plugin', dest='plugins', action='append', default=list(),
+                            help="name of a plugin to feed events to. Can be given multiple times. "
+                                 "All plugins are used by default")
+        parser.add_argument('--page-size', dest='page_size', type=int, default=500,
+                            help="amount of events to dispatch at once")
+        return self
+
+    def execute(self, args, remaining_args):
+        # the replay imports the engine, which isn't needed to register our command
+        from sgevents.spool import EventSpool
+        from sgevents.replay import replay_events
+        from sgevents.utility import EventEngineError
+
+        try:
+            result = replay_events(EventSpool(args.spool), args.first_id, args.last_id, args.plugins,
+                                   args.page_size)
+        except EventEngineError as err:
+            self.log().error(str(err))
+            return self.ERROR
+        # end handle user errors
+        sys.stdout.write(json.dumps(result, indent=1, sort_keys=True) + '\n')
+        return self.SUCCESS
+
+# end class ShotgunEventsReplaySubCommand
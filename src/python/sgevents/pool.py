@@ -0,0 +1,321 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.pool
+@brief A bounded pool of shotgun connections, shared by the engine and its plugins
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['ShotgunConnectionPool', 'PooledShotgunConnection', 'ConnectionPoolError']
+
+import time
+import socket
+import logging
+import threading
+
+import shotgun_api3 as sg
+
+from .utility import EventEngineError
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class ConnectionPoolError(EventEngineError):
+    """Thrown if no connection could be leased in time"""
+    __slots__ = ()
+
+# end class ConnectionPoolError
+
+
+class ShotgunConnectionPool(object):
+    """Creates up to max_size connections, and leases them to one user at a time.
+
+    Connections which were idle for a while are checked before being leased again, and connections which
+    were returned as broken are discarded, to be replaced by new ones on demand.
+    @note all methods are thread-safe
+    """
+    __slots__ = ('_factory',
+                 '_max_size',
+                 '_socket_timeout',
+                 '_check_idle_after',
+                 '_log',
+                 '_cond',
+                 '_idle',
+                 '_num_leased',
+                 '_stats')
+
+    def __init__(self, factory, max_size, socket_timeout=None, check_idle_after=60.0, log=None):
+        """Initialize this instance
+        @param factory callable returning a new shotgun connection
+        @param max_size maximum amount of connections to create
+        @param socket_timeout if not None, seconds after which requests of our connections time out
+        @param check_idle_after seconds after which idle connections are checked before being leased"""
+        assert max_size > 0, "need at least one connection"
+        self._factory = factory
+        self._max_size = max_size
+        self._socket_timeout = socket_timeout
+        self._check_idle_after = check_idle_after
+        self._log = log or logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._idle = list()          # list of (connection, released_at) tuples, most recently used last
+        self._num_leased = 0
+        self._stats = dict(created=0, discarded=0, leases=0, waits=0, wait_seconds=0.0, peak_leased=0)
+
+    def _new_connection(self):
+        """@return a new connection, configured to use our timeout"""
+        connection = self._factory()
+        if self._socket_timeout is not None:
+            config = getattr(connection, 'config', None)
+            if config is not None:
+                config.timeout_secs = self._socket_timeout
+            # end set timeout
+        # end handle timeout
+        return connection
+
+    def _is_healthy(self, connection):
+        """@return True if the given connection can talk to the server"""
+        try:
+            connection.info()
+        except (sg.ProtocolError, sg.ResponseError, socket.error, EnvironmentError) as err:
+            self._log.warning("Discarding broken shotgun connection: %s", err)
+            return False
+        # end handle errors
+        return True
+
+    def _close(self, connection):
+        """Close the given connection, ignoring all errors"""
+        close = getattr(connection, 'close', None)
+        if close is None:
+            return
+        # end bail out if it can't be closed
+        try:
+            close()
+        except Exception:
+            pass
+        # end ignore errors
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def acquire(self, session_uuid=None, timeout=None):
+        """@return a connection for exclusive use by the caller, until it is passed to release()
+        @param session_uuid if not None, it is set on the connection
+        @param timeout seconds to wait for a free connection, or None to wait forever
+        @throws ConnectionPoolError if there was no free connection in time"""
+        self._cond.acquire()
+        try:
+            start = None
+            while not self._idle and self._num_leased >= self._max_size:
+                if start is None:
+                    start = time.time()
+                    self._stats['waits'] += 1
+                # end track waits
+                remaining = None
+                if timeout is not None:
+                    remaining = timeout - (time.time() - start)
+                    if remaining <= 0:
+                        raise ConnectionPoolError("No shotgun connection became free within %ss" % timeout)
+                    # end handle timeout
+                # end compute remaining wait time
+                self._cond.wait(remaining)
+            # end wait for connection
+            if start is not None:
+                self._stats['wait_seconds'] += time.time() - start
+            # end track wait time
+
+            connection, released_at = None, None
+            if self._idle:
+                connection, released_at = self._idle.pop()
+            # end take most recently used one
+            self._num_leased += 1
+            self._stats['leases'] += 1
+            self._stats['peak_leased'] = max(self._stats['peak_leased'], self._num_leased)
+        finally:
+            self._cond.release()
+        # end assure lock is released
+
+        try:
+            # talk to the server without holding the lock
+            if connection is not None and time.time() - released_at >= self._check_idle_after:
+                if not self._is_healthy(connection):
+                    self._discarded(connection)
+                    connection = None
+                # end recycle broken connection
+            # end check idle connection
+            if connection is None:
+                connection = self._new_connection()
+                self._cond.acquire()
+                self._stats['created'] += 1
+                self._cond.release()
+            # end create connection on demand
+            if session_uuid is not None:
+                connection.set_session_uuid(session_uuid)
+            # end apply session
+        except Exception:
+            self._cond.acquire()
+            try:
+                self._num_leased -= 1
+                self._cond.notify()
+            finally:
+                self._cond.release()
+            # end assure lock is released
+            raise
+        # end give back our slot on failure
+        return connection
+
+    def _discarded(self, connection):
+        """Account for the given connection being dropped"""
+        self._close(connection)
+        self._cond.acquire()
+        self._stats['discarded'] += 1
+        self._cond.release()
+
+    def release(self, connection, broken=False):
+        """Return a connection previously obtained by acquire()
+        @param broken if True, the connection is closed and replaced by a new one when needed"""
+        if broken:
+            self._discarded(connection)
+        # end drop broken connection
+
+        self._cond.acquire()
+        try:
+            self._num_leased -= 1
+            if not broken:
+                self._idle.append((connection, time.time()))
+            # end keep healthy connection
+            self._cond.notify()
+        finally:
+            self._cond.release()
+        # end assure lock is released
+
+    def clear(self):
+        """Close all idle connections"""
+        self._cond.acquire()
+        try:
+            idle, self._idle = self._idle, list()
+        finally:
+            self._cond.release()
+        # end assure lock is released
+        for connection, released_at in idle:
+            self._close(connection)
+        # end for each connection
+
+    def stats(self):
+        """@return dict with the current utilization of the pool, as well as cumulative counts
+        - max_size, idle, leased: amount of connections
+        - created, discarded: connections created and dropped as broken
+        - leases, waits, wait_seconds: amount of leases, how many had to wait, and for how long in total
+        - peak_leased: the maximum amount of connections leased at once"""
+        self._cond.acquire()
+        try:
+            res = dict(self._stats)
+            res.update(max_size=self._max_size, idle=len(self._idle), leased=self._num_leased)
+            return res
+        finally:
+            self._cond.release()
+        # end assure lock is released
+
+    ## -- End Interface -- @}
+
+# end class ShotgunConnectionPool
+
+
+class PooledShotgunConnection(object):
+    """A connection facade for a single user at a time, like a plugin, which leases a connection from a pool
+    on first use and keeps it until release() is called, or until the call is done if it doesn't keep leases.
+
+    If a call fails with a connection error, the connection is returned to the pool as broken, and the next
+    call will use a new one.
+    """
+    __slots__ = ('_pool',
+                 '_timeout',
+                 '_keep_lease',
+                 '_connection',
+                 '_session_uuid')
+
+    ## Errors which indicate the connection may not be reused
+    CONNECTION_ERRORS = (sg.ProtocolError, socket.error)
+
+    def __init__(self, pool, timeout=None, keep_lease=True):
+        """Initialize this instance
+        @param pool the ShotgunConnectionPool to lease from
+        @param timeout seconds to wait for a connection, see ShotgunConnectionPool.acquire()
+        @param keep_lease if False, the connection is returned to the pool after each call. Useful for users
+        which wait for other things between their calls, like coroutines"""
+        self._pool = pool
+        self._timeout = timeout
+        self._keep_lease = keep_lease
+        self._connection = None
+        self._session_uuid = None
+
+    def __getattr__(self, name):
+        if name in self.__slots__:
+            raise AttributeError(name)
+        # end prevent recursion if we are not initialized
+        attr = getattr(self._lease(), name)
+        if not callable(attr):
+            if not self._keep_lease:
+                self.release()
+            # end release right away
+            return attr
+        # end pass on plain attributes
+
+        def call(*args, **kwargs):
+            try:
+                return getattr(self._lease(), name)(*args, **kwargs)
+            except self.CONNECTION_ERRORS:
+                self.release(broken=True)
+                raise
+            finally:
+                if not self._keep_lease:
+                    self.release()
+                # end release after each call
+            # end handle broken connections
+        # end call
+        return call
+
+    def _lease(self):
+        """@return our leased connection, acquired on demand"""
+        if self._connection is None:
+            self._connection = self._pool.acquire(self._session_uuid, self._timeout)
+        # end lease on demand
+        return self._connection
+
+    # -------------------------
+    ## @name Shotgun Interface
+    # @{
+
+    def set_session_uuid(self, session_uuid):
+        """Use the given session uuid for all subsequent calls, without leasing a connection"""
+        self._session_uuid = session_uuid
+        if self._connection is not None:
+            self._connection.set_session_uuid(session_uuid)
+        # end apply to leased connection
+
+    ## -- End Shotgun Interface -- @}
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def is_leased(self):
+        """@return True if we currently hold a connection"""
+        return self._connection is not None
+
+    def release(self, broken=False):
+        """Return our connection to the pool, if we have one"""
+        if self._connection is None:
+            return
+        # end bail out if there is nothing to do
+        connection, self._connection = self._connection, None
+        self._pool.release(connection, broken)
+
+    ## -- End Interface -- @}
+
+# end class PooledShotgunConnection
+
+## -- End Types -- @}
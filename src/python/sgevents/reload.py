@@ -0,0 +1,106 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.reload
+@brief Detects changes to the modules defining plugins, and imports them again
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['PluginModuleWatcher', 'reload_module']
+
+import os
+import sys
+import imp
+
+
+# ==============================================================================
+## @name Functions
+# ------------------------------------------------------------------------------
+## @{
+
+def _source_path(module):
+    """@return path to the python source of the given module, or None if it has none"""
+    path = getattr(module, '__file__', None)
+    if not path:
+        return None
+    # end handle builtins
+    if path.endswith(('.pyc', '.pyo')):
+        path = path[:-1]
+    # end use source instead of byte code
+    if not path.endswith('.py') or not os.path.isfile(path):
+        return None
+    return path
+
+def reload_module(name):
+    """Execute the source of the module with the given name again, within the existing module object
+    @return the reloaded module
+    @throws any exception raised while executing the module. The module object may be partially updated
+    in that case"""
+    module = sys.modules[name]
+    path = _source_path(module)
+    if path is None:
+        raise ImportError("Module '%s' has no python source to reload from" % name)
+    # end handle modules without source
+    return imp.load_source(name, path)
+
+## -- End Functions -- @}
+
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class PluginModuleWatcher(object):
+    """Keeps the modification time of the modules which define plugin types, to tell which of them changed"""
+    __slots__ = ('_modules', )
+
+    def __init__(self):
+        self._modules = dict()  # module name: (path, mtime)
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def watch(self, plugin_types):
+        """Start watching the modules of the given plugin types, unless they are watched already.
+        Types defined in modules without python source are ignored"""
+        for plugin_type in plugin_types:
+            name = plugin_type.__module__
+            if name in self._modules:
+                continue
+            # end skip known modules
+            path = _source_path(sys.modules.get(name))
+            if path is None:
+                continue
+            # end skip modules we can't reload
+            self._modules[name] = (path, os.path.getmtime(path))
+        # end for each plugin type
+
+    def modules(self):
+        """@return sorted list of names of all modules we watch"""
+        return sorted(self._modules)
+
+    def changed(self):
+        """@return sorted list of names of all modules whose source changed since the last call, or since they
+        were first watched. Modules whose source was removed are not reported"""
+        res = list()
+        for name, (path, mtime) in self._modules.items():
+            try:
+                new_mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            # end ignore removed files, they may be in the process of being replaced
+            if new_mtime != mtime:
+                self._modules[name] = (path, new_mtime)
+                res.append(name)
+            # end handle change
+        # end for each module
+        return sorted(res)
+
+    ## -- End Interface -- @}
+
+# end class PluginModuleWatcher
+
+## -- End Types -- @}
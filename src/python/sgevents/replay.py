@@ -0,0 +1,129 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.replay
+@brief Feeds spooled events through plugins, without asking shotgun for events
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['ReplayEventEngine', 'replay_events']
+
+import time
+import shutil
+import tempfile
+
+import bapp
+from butility import Path
+
+from .benchmark import (InMemoryShotgunConnection,
+                        BenchmarkEventEngine)
+from .scheduler import PollScheduler
+from .utility import EventEngineError
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class ReplayEventEngine(BenchmarkEventEngine):
+    """An engine which only drives the plugins with the given names, or all of them"""
+    __slots__ = ('_plugin_names', )
+
+    def __init__(self, overrides, sg_connection, plugin_names=()):
+        """Initialize this instance
+        @param plugin_names names of plugins to feed events to, as returned by plugin_name(). If empty, all
+        plugins are used"""
+        self._plugin_names = set(plugin_names)
+        super(ReplayEventEngine, self).__init__(overrides, sg_connection)
+
+    def _iter_all_plugins(self):
+        plugins = super(ReplayEventEngine, self)._iter_all_plugins()
+        if not self._plugin_names:
+            return plugins
+        return (plugin for plugin in plugins if plugin.plugin_name() in self._plugin_names)
+
+# end class ReplayEventEngine
+
+## -- End Types -- @}
+
+
+
+# ==============================================================================
+## @name Functions
+# ------------------------------------------------------------------------------
+## @{
+
+def replay_events(spool, first_id=None, last_id=None, plugin_names=(), page_size=500):
+    """Have the given plugins process all events of the given EventSpool in the given inclusive id range.
+    Plugins get a connection which only knows the spooled events, so nothing they do reaches shotgun, and
+    their state is kept in a temporary journal.
+    @param plugin_names see ReplayEventEngine
+    @return dict with the amount of events, the plugins, the amount of polls and the time it took
+    @throws EventEngineError if there are no events in the range, or no plugins to feed them to
+    @note needs a running bapp Application with the plugins loaded"""
+    events = list(spool.read(first_id, last_id))
+    if not events:
+        raise EventEngineError("No spooled events in range %s to %s at '%s'" % (first_id, last_id,
+                                                                               spool.directory()))
+    # end handle empty range
+
+    journal_dir = tempfile.mkdtemp(prefix='sg-events-replay')
+    overrides = {('fetch', 'page-size') : page_size,
+                 ('fetch', 'prefetch') : False,
+                 ('dispatch', 'threads') : 0,
+                 ('journal', 'type') : 'pickle',
+                 ('event-journal-file', ) : Path(journal_dir) / 'journal',
+                 ('spool', 'directory') : Path(''),
+                 ('dead-letter', 'directory') : Path(''),
+                 ('cluster', 'lease-store') : Path(''),
+                 ('metrics', 'http-port') : 0,
+                 ('metrics', 'snapshot-file') : Path('')}
+    stack = bapp.main().context()
+    engine = None
+    try:
+        engine = ReplayEventEngine(overrides, InMemoryShotgunConnection(events), plugin_names)
+        engine._scheduler = PollScheduler(0)
+        plugins = list(engine._iter_plugins())
+        if not plugins:
+            raise EventEngineError("None of the plugins %s is loaded" % ', '.join(sorted(plugin_names)))
+        # end handle missing plugins
+        for plugin in plugins:
+            plugin.set_event_id(events[0]['id'] - 1)
+        # end start at the beginning of the range
+
+        last_id = events[-1]['id']
+        num_polls = 0
+        start = time.time()
+        while True:
+            num_polls += 1
+            engine._process_events()
+            # inactive plugins will never catch up, and paused ones not within the replay
+            if (not engine.metrics().poll_events.value() or
+                all(plugin._last_event_id >= last_id or not plugin.is_active() or plugin.is_paused() 
+                    for plugin in plugins)):
+                break
+            # end stop once all events are processed, or nothing happens anymore
+        # end while there is work
+        elapsed = time.time() - start
+
+        return dict(events=len(events),
+                    first_id=events[0]['id'],
+                    last_id=last_id,
+                    plugins=sorted(plugin.plugin_name() for plugin in plugins),
+                    inactive=sorted(plugin.plugin_name() for plugin in plugins if not plugin.is_active()),
+                    paused=sorted(plugin.plugin_name() for plugin in plugins if plugin.is_paused()),
+                    polls=num_polls,
+                    seconds=elapsed,
+                    events_per_second=elapsed and len(events) / elapsed or 0.0)
+    finally:
+        if engine is not None:
+            engine._shutdown()
+            if engine._plugin_context is not None:
+                stack.remove(engine._plugin_context)
+            # end remove plugin context
+        # end cleanup engine
+        shutil.rmtree(journal_dir, ignore_errors=True)
+    # end assure cleanup
+
+## -- End Functions -- @}
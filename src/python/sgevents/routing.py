@@ -0,0 +1,87 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.routing
+@brief Finds the plugins interested in an event without asking each of them
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['EventFilterIndex']
+
+from .plugin import event_filters_match
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class EventFilterIndex(object):
+    """An index of plugin event filters, keyed by event_type and attribute_name.
+
+    The first lookup of a key evaluates the filters of all plugins, all subsequent ones are a dict lookup.
+    As plugins may change their filters at runtime, update() should be called once per batch of events,
+    and will rebuild the index if any plugin's filters changed.
+    """
+    __slots__ = ('_plugins',
+                 '_signature',
+                 '_filters',
+                 '_candidates')
+
+    def __init__(self):
+        self._plugins = tuple()
+        self._signature = None
+        self._filters = tuple()
+        self._candidates = dict()
+
+    @classmethod
+    def _freeze(cls, event_filters):
+        """@return a hashable version of the given event filters"""
+        if not event_filters:
+            return None
+        return tuple(sorted((event_type, tuple(sorted(attributes or ())))
+                            for event_type, attributes in event_filters.iteritems()))
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def update(self, plugins):
+        """Make sure the index represents the filters of the given plugins.
+        @param plugins iterable of EventEnginePlugin instances, in dispatch order
+        @return True if the index was rebuilt"""
+        plugins = tuple(plugins)
+        filters = tuple(plugin._event_filters() for plugin in plugins)
+        signature = tuple((id(plugin), self._freeze(plugin_filters))
+                          for plugin, plugin_filters in zip(plugins, filters))
+        if signature == self._signature:
+            return False
+        # end bail out if nothing changed
+
+        self._plugins = plugins
+        self._signature = signature
+        # keep a copy, as filters could be changed in place
+        self._filters = tuple(dict(plugin_filters or ()) for plugin_filters in filters)
+        self._candidates.clear()
+        return True
+
+    def plugins(self):
+        """@return tuple of all plugins we index, in dispatch order"""
+        return self._plugins
+
+    def candidates(self, event):
+        """@return tuple of plugins whose filters match the given event, in dispatch order"""
+        key = (event['event_type'], event['attribute_name'])
+        res = self._candidates.get(key)
+        if res is None:
+            res = self._candidates[key] = tuple(plugin for plugin, plugin_filters
+                                                in zip(self._plugins, self._filters)
+                                                if event_filters_match(plugin_filters, *key))
+        # end compute candidates on first lookup
+        return res
+
+    ## -- End Interface -- @}
+
+# end class EventFilterIndex
+
+## -- End Types -- @}
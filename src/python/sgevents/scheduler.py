@@ -0,0 +1,88 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.scheduler
+@brief Decides how long to wait between polls for new events
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['PollScheduler', 'AdaptivePollScheduler']
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class PollScheduler(object):
+    """Waits the same amount of time after each poll"""
+    __slots__ = ('_max_interval', )
+
+    def __init__(self, max_interval):
+        """Initialize this instance
+        @param max_interval the amount of seconds to wait at most between polls"""
+        self._max_interval = max_interval
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def next_interval(self, num_events, full):
+        """@return amount of seconds to wait until the next poll
+        @param num_events amount of events the last poll returned
+        @param full if True, the last poll returned at least one full page of events, indicating that there
+        may be more"""
+        return self._max_interval
+
+    ## -- End Interface -- @}
+
+# end class PollScheduler
+
+
+class AdaptivePollScheduler(PollScheduler):
+    """Polls immediately while there is a lot to do, and backs off exponentially while there is nothing.
+
+    - If the last poll returned a full page, poll again right away
+    - While recent activity is high, poll every busy_interval
+    - Whenever there were events, start backing off again from busy_interval * factor
+    - While idle, multiply the interval by factor, up to max_interval
+    """
+    __slots__ = ('_busy_interval',
+                 '_factor',
+                 '_busy_threshold',
+                 '_activity',
+                 '_interval')
+
+    ## Weight of the latest poll in the moving average of events per poll
+    ACTIVITY_WEIGHT = 0.5
+
+    def __init__(self, max_interval, busy_interval, factor=2.0, busy_threshold=10):
+        """Initialize this instance
+        @param busy_interval seconds to wait while there is high activity
+        @param factor by which to multiply the interval while idle
+        @param busy_threshold average amount of events per poll at which activity is considered high"""
+        super(AdaptivePollScheduler, self).__init__(max_interval)
+        self._busy_interval = min(busy_interval, max_interval)
+        self._factor = max(1.0, factor)
+        self._busy_threshold = busy_threshold
+        self._activity = 0.0
+        self._interval = self._busy_interval
+
+    def next_interval(self, num_events, full):
+        self._activity += (num_events - self._activity) * self.ACTIVITY_WEIGHT
+        if full:
+            self._interval = self._busy_interval
+            return 0.0
+        elif self._activity >= self._busy_threshold:
+            self._interval = self._busy_interval
+        elif num_events:
+            self._interval = self._busy_interval * self._factor
+        else:
+            self._interval = max(self._interval, self._busy_interval) * self._factor
+        # end handle activity
+        self._interval = min(self._interval, self._max_interval)
+        return self._interval
+
+# end class AdaptivePollScheduler
+
+## -- End Types -- @}
@@ -0,0 +1,495 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.spool
+@brief An append-only store of fetched events, which can be read back by id range without asking shotgun
+
+Recordings of the EventRecorder plugin in yaml format can be converted into a spool using
+`python -m sgevents.spool YAML_DIRECTORY SPOOL_DIRECTORY`.
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['EventSpool', 'yaml_events', 'recorded_events', 'convert_yaml_events']
+
+import os
+import re
+import sys
+import zlib
+import struct
+import threading
+import cPickle as pickle
+
+from .event import DataView
+
+
+# ==============================================================================
+## @name Functions
+# ------------------------------------------------------------------------------
+## @{
+
+def _plain(value):
+    """@return the given value with all dict and list subclasses, like DictObjects, converted to their base type,
+    which keeps recordings independent of the types used at runtime"""
+    if isinstance(value, DataView):
+        return value.to_dict()
+    elif isinstance(value, dict):
+        return dict((key, _plain(item)) for key, item in value.iteritems())
+    elif isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+def yaml_events(directory):
+    """@return list of events stored as one yaml file each in the given directory, sorted by id"""
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError("The python yaml package is required to load events recorded as yaml")
+    # end handle yaml
+
+    events = list()
+    for name in os.listdir(directory):
+        if not name.endswith('.yaml'):
+            continue
+        # end skip foreign files
+        fh = open(os.path.join(directory, name), 'rb')
+        try:
+            events.append(_plain(yaml.load(fh)))
+        finally:
+            fh.close()
+        # end assure file is closed
+    # end for each file
+    return sorted(events, key=lambda event: event['id'])
+
+def recorded_events(directory):
+    """@return list of all events previously stored by the EventRecorder plugin in the given directory, sorted
+    by id. Events may be stored in segments, as yaml files, or both"""
+    by_id = dict()
+    if any(EventSpool.is_segment(name) for name in os.listdir(directory)):
+        by_id.update((event['id'], event) for event in EventSpool(directory).read())
+    # end read segments
+    if any(name.endswith('.yaml') for name in os.listdir(directory)):
+        by_id.update((event['id'], event) for event in yaml_events(directory))
+    # end read yaml files
+    return [by_id[event_id] for event_id in sorted(by_id)]
+
+def convert_yaml_events(directory, spool):
+    """Append all events stored as yaml files in the given directory to the given EventSpool
+    @return amount of events which were added to the spool"""
+    count = spool.append(yaml_events(directory), flush=False)
+    spool.sync()
+    return count
+
+## -- End Functions -- @}
+
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class EventSpool(object):
+    """Appends events to segment files in a directory, and finds them by id.
+
+    Each segment consists of a data file with length- and checksum-prefixed records, one pickled event each,
+    and an index file with one fixed-size (event_id, offset) entry per record. Segments are named after the
+    first event they contain, and a new one is started once the current one exceeds the segment size.
+    Once a segment is complete, a range file with its smallest and largest id is written, and its index is
+    only read if events in that range are looked up. The oldest segments are deleted if there are more than
+    max_segments of them.
+    Events which are already spooled are ignored, others may be appended in any order.
+    Appended events are only visible to read() once they were flushed.
+    @note all methods are thread-safe
+    """
+    __slots__ = ('_directory',
+                 '_segment_size',
+                 '_max_segments',
+                 '_lock',
+                 '_segments',
+                 '_num_events',
+                 '_cached_offsets',
+                 '_data',
+                 '_index',
+                 '_segment')
+
+    ## length and crc32 of the following record
+    HEADER = struct.Struct('<II')
+    ## an index entry: event id and offset of its record in the data file
+    INDEX_ENTRY = struct.Struct('<QQ')
+    ## contents of the range file of a complete segment: its smallest and largest event id, and its amount of events
+    RANGE = struct.Struct('<QQQ')
+    ## Protocol to use when pickling events
+    PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+    _segment_regex = re.compile(r'^events-(\d+)\.data$')
+
+    def __init__(self, directory, segment_size=64 * 1024 * 1024, max_segments=0):
+        """Initialize this instance, reading the ranges of all existing segments
+        @param directory in which to keep our segments. It is created if needed
+        @param segment_size size in bytes after which a new segment is started
+        @param max_segments amount of segments to keep. If there are more, the oldest ones are deleted. 
+        If 0, all segments are kept"""
+        self._directory = directory
+        self._segment_size = segment_size
+        self._max_segments = max_segments
+        self._lock = threading.Lock()
+        # list of [name, first_id, last_id, num_events, offsets] lists, oldest first. offsets is None for complete
+        # segments, and maps event ids to the offset of their record otherwise
+        self._segments = list()
+        self._num_events = 0
+        self._cached_offsets = (None, None)     # (name, offsets) of the complete segment we read last
+        self._data = None                       # file handles of the segment we append to
+        self._index = None
+        self._segment = None                    # the entry of _segments we append to
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # end create directory
+        self._load_segments()
+        self._remove_old_segments()
+
+    @classmethod
+    def is_segment(cls, name):
+        """@return True if the given file name is the name of a segment's data file"""
+        return cls._segment_regex.match(name) is not None
+
+    def _path(self, segment, extension):
+        return os.path.join(self._directory, '%s.%s' % (segment, extension))
+
+    def _read_offsets(self, segment):
+        """@return dict of event_id: offset of all records listed in the index of the given segment"""
+        data_size = os.path.getsize(self._path(segment, 'data'))
+        fh = open(self._path(segment, 'index'), 'rb')
+        try:
+            buf = fh.read()
+        finally:
+            fh.close()
+        # end assure file is closed
+
+        offsets = dict()
+        entry_size = self.INDEX_ENTRY.size
+        for start in xrange(0, len(buf) - len(buf) % entry_size, entry_size):
+            event_id, offset = self.INDEX_ENTRY.unpack_from(buf, start)
+            # entries whose record didn't make it to disk are ignored
+            if offset < data_size:
+                offsets[event_id] = offset
+            # end handle entry
+        # end for each entry
+        return offsets
+
+    def _load_segments(self):
+        """Read the ranges of all complete segments, and the index of all others"""
+        segments = list()
+        for name in os.listdir(self._directory):
+            if not self.is_segment(name):
+                continue
+            # end skip foreign files
+            segment = name[:-len('.data')]
+            if not os.path.exists(self._path(segment, 'index')):
+                continue
+            # end skip segments without index
+
+            range_path = self._path(segment, 'range')
+            if os.path.exists(range_path):
+                fh = open(range_path, 'rb')
+                try:
+                    first_id, last_id, num_events = self.RANGE.unpack(fh.read(self.RANGE.size))
+                finally:
+                    fh.close()
+                # end assure file is closed
+                offsets = None
+            else:
+                # the spool writing it was interrupted, or is still appending to it
+                offsets = self._read_offsets(segment)
+                if not offsets:
+                    continue
+                # end skip empty segments
+                first_id, last_id, num_events = min(offsets), max(offsets), len(offsets)
+            # end handle complete segments
+            mtime = os.path.getmtime(self._path(segment, 'data'))
+            segments.append((mtime, segment, [segment, first_id, last_id, num_events, offsets]))
+        # end for each segment
+        self._segments = [entry for mtime, segment, entry in sorted(segments)]
+        self._num_events = sum(entry[3] for entry in self._segments)
+
+    def _remove_old_segments(self):
+        """Delete the oldest segments until there are no more than max_segments of them"""
+        while self._max_segments and len(self._segments) > self._max_segments:
+            if self._segments[0] is self._segment:
+                break
+            # end never delete the segment we append to
+            entry = self._segments.pop(0)
+            self._num_events -= entry[3]
+            if self._cached_offsets[0] == entry[0]:
+                self._cached_offsets = (None, None)
+            # end drop cached index
+            # without its data file, the rest of the segment is ignored
+            for extension in ('data', 'index', 'range'):
+                path = self._path(entry[0], extension)
+                if os.path.exists(path):
+                    os.remove(path)
+                # end remove existing files
+            # end for each file of the segment
+        # end while there are too many segments
+
+    def _offsets(self, entry):
+        """@return dict of event_id: offset of all records of the segment of the given entry of _segments.
+        The index of a complete segment is read on demand"""
+        if entry[4] is not None:
+            return entry[4]
+        # end handle segments we have in memory
+        segment, offsets = self._cached_offsets
+        if segment != entry[0]:
+            offsets = self._read_offsets(entry[0])
+            self._cached_offsets = (entry[0], offsets)
+        # end read index
+        return offsets
+
+    def _segments_in(self, first_id, last_id):
+        """@return all entries of _segments whose range overlaps the given inclusive id range"""
+        return [entry for entry in self._segments
+                if (first_id is None or entry[2] >= first_id) and (last_id is None or entry[1] <= last_id)]
+
+    def _contains(self, event_id):
+        for entry in self._segments_in(event_id, event_id):
+            if event_id in self._offsets(entry):
+                return True
+            # end handle match
+        # end for each candidate segment
+        return False
+
+    def _locations(self, first_id, last_id):
+        """@return sorted list of (event_id, segment, offset) tuples of all events in the given inclusive range"""
+        self._lock.acquire()
+        try:
+            locations = list()
+            for entry in self._segments_in(first_id, last_id):
+                try:
+                    offsets = self._offsets(entry)
+                except (IOError, OSError):
+                    # another spool removed it in the meantime
+                    continue
+                # end handle removed segments
+                locations.extend((event_id, entry[0], offset) for event_id, offset in offsets.iteritems()
+                                 if (first_id is None or event_id >= first_id) and
+                                    (last_id is None or event_id <= last_id))
+            # end for each segment
+            locations.sort()
+            return locations
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def _open_segment(self, first_event_id):
+        """Start appending to a new segment"""
+        self._close()
+        name = 'events-%015i' % first_event_id
+        self._data = open(self._path(name, 'data'), 'ab')
+        self._index = open(self._path(name, 'index'), 'ab')
+        # offsets are obtained with tell(), which isn't at the end of existing files before the first write
+        self._data.seek(0, os.SEEK_END)
+        self._segment = [name, first_event_id, first_event_id, 0, dict()]
+        self._segments.append(self._segment)
+        self._remove_old_segments()
+
+    def _read_record(self, fh, offset):
+        """@return the event stored at the given offset of the given data file, or None if it is damaged"""
+        fh.seek(offset)
+        header = fh.read(self.HEADER.size)
+        if len(header) < self.HEADER.size:
+            return None
+        # end handle truncated header
+        size, crc = self.HEADER.unpack(header)
+        payload = fh.read(size)
+        if len(payload) < size or zlib.crc32(payload) & 0xffffffff != crc:
+            return None
+        # end handle partially written records
+        return pickle.loads(payload)
+
+    def _flush(self):
+        # the index must never point to data which isn't written yet
+        if self._data is not None:
+            self._data.flush()
+            self._index.flush()
+        # end flush files
+
+    def _close(self):
+        """Close the segment we append to, and write its range, as it is complete"""
+        for fh in (self._data, self._index):
+            if fh is not None:
+                fh.close()
+            # end close file
+        # end for each file
+        if self._segment is not None:
+            name, first_id, last_id, num_events, offsets = self._segment
+            path = self._path(name, 'range')
+            fh = open(path + '.tmp', 'wb')
+            try:
+                fh.write(self.RANGE.pack(first_id, last_id, num_events))
+            finally:
+                fh.close()
+            # end assure file is closed
+            # readers must never see a partial range
+            os.rename(path + '.tmp', path)
+            self._segment[4] = None
+        # end complete segment
+        self._data = self._index = self._segment = None
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def directory(self):
+        """@return the directory we store our segments in"""
+        return self._directory
+
+    def __len__(self):
+        """@return amount of spooled events"""
+        return self._num_events
+
+    def __contains__(self, event_id):
+        self._lock.acquire()
+        try:
+            return self._contains(event_id)
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def ids(self, first_id=None, last_id=None):
+        """@return sorted list of ids of all spooled events in the given inclusive range"""
+        return [event_id for event_id, segment, offset in self._locations(first_id, last_id)]
+
+    def append(self, events, flush=True):
+        """Append all given events which are not yet spooled
+        @param flush if True, the events are handed to the operating system right away. Otherwise they are
+        buffered until the buffer is full, or until flush() or sync() are called
+        @return amount of appended events"""
+        count = 0
+        self._lock.acquire()
+        try:
+            for event in events:
+                if event is None or self._contains(event['id']):
+                    continue
+                # end skip known events
+                if self._data is None or self._data.tell() >= self._segment_size:
+                    self._open_segment(event['id'])
+                # end start new segment
+                payload = pickle.dumps(_plain(event), self.PICKLE_PROTOCOL)
+                offset = self._data.tell()
+                self._data.write(self.HEADER.pack(len(payload), zlib.crc32(payload) & 0xffffffff) + payload)
+                self._index.write(self.INDEX_ENTRY.pack(event['id'], offset))
+
+                entry = self._segment
+                entry[4][event['id']] = offset
+                entry[1] = min(entry[1], event['id'])
+                entry[2] = max(entry[2], event['id'])
+                entry[3] += 1
+                self._num_events += 1
+                count += 1
+            # end for each event
+            if count and flush:
+                self._flush()
+            # end flush changes
+        finally:
+            self._lock.release()
+        # end assure lock is released
+        return count
+
+    def flush(self):
+        """Hand all buffered events to the operating system"""
+        self._lock.acquire()
+        try:
+            self._flush()
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def sync(self):
+        """Write all buffered events to disk, and return once they are stored safely"""
+        self._lock.acquire()
+        try:
+            self._flush()
+            for fh in (self._data, self._index):
+                if fh is not None:
+                    os.fsync(fh.fileno())
+                # end sync file
+            # end for each file
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    def read(self, first_id=None, last_id=None):
+        """@return iterator over all spooled events in the given inclusive id range, in ascending id order.
+        Damaged records, and those of segments deleted in the meantime, are skipped"""
+        handles = dict()
+        try:
+            for event_id, segment, offset in self._locations(first_id, last_id):
+                if segment not in handles:
+                    try:
+                        handles[segment] = open(self._path(segment, 'data'), 'rb')
+                    except IOError:
+                        handles[segment] = None
+                    # end handle removed segments
+                # end open segments on demand
+                fh = handles[segment]
+                if fh is None:
+                    continue
+                # end skip removed segments
+                event = self._read_record(fh, offset)
+                if event is not None:
+                    yield event
+                # end skip damaged records
+            # end for each id
+        finally:
+            for fh in handles.itervalues():
+                if fh is not None:
+                    fh.close()
+                # end close file
+            # end for each file
+        # end assure files are closed
+
+    def close(self):
+        """Close the segment we append to, which is complete from now on. We will open a new one on the next 
+        append"""
+        self._lock.acquire()
+        try:
+            self._close()
+        finally:
+            self._lock.release()
+        # end assure lock is released
+
+    ## -- End Interface -- @}
+
+# end class EventSpool
+
+## -- End Types -- @}
+
+
+
+# ==============================================================================
+## @name Commandline
+# ------------------------------------------------------------------------------
+## @{
+
+def main(argv=None):
+    # argparse isn't part of python 2.6, and only needed on the commandline
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert events recorded as yaml files into a spool")
+    parser.add_argument('source', help="directory with yaml files written by the EventRecorder plugin")
+    parser.add_argument('destination', help="directory of the spool to append the events to")
+    args = parser.parse_args(argv)
+
+    spool = EventSpool(args.destination)
+    try:
+        count = convert_yaml_events(args.source, spool)
+    finally:
+        spool.close()
+    # end assure spool is closed
+    sys.stdout.write("Added %i events to spool at '%s'\n" % (count, args.destination))
+    return 0
+
+## -- End Commandline -- @}
+
+
+if __name__ == '__main__':
+    sys.exit(main())
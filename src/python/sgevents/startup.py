@@ -0,0 +1,76 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.startup
+@brief Measures where the time goes while the engine starts up
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['StartupProfile']
+
+import sys
+import time
+import pstats
+import cProfile
+from cStringIO import StringIO
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class StartupProfile(object):
+    """Runs the phases of a startup under a profiler, and reports how long each one took, how many modules
+    it imported, and which functions took most of the time overall"""
+    __slots__ = ('_profile',
+                 '_phases')
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+        self._phases = list()   # list of tuple(name, seconds, num_imported_modules)
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def run(self, name, fun, *args, **kwargs):
+        """Call fun with the given arguments while profiling, and record it as phase of the given name
+        @return whatever fun returned"""
+        num_modules = len(sys.modules)
+        start = time.time()
+        self._profile.enable()
+        try:
+            return fun(*args, **kwargs)
+        finally:
+            self._profile.disable()
+            self._phases.append((name, time.time() - start, len(sys.modules) - num_modules))
+        # end assure phase is recorded
+
+    def phases(self):
+        """@return list of tuple(name, seconds, num_imported_modules) of all phases we ran, in order"""
+        return list(self._phases)
+
+    def write_report(self, stream, limit=30):
+        """Write a report about all phases to the given stream
+        @param limit amount of functions with the highest cumulative time to list"""
+        total = sum(seconds for name, seconds, num_modules in self._phases)
+        stream.write("Startup took %.3fs\n" % total)
+        for name, seconds, num_modules in self._phases:
+            stream.write("  %-30s %8.3fs %5i modules imported\n" % (name, seconds, num_modules))
+        # end for each phase
+        if not self._phases:
+            return
+        # end bail out if nothing was profiled
+
+        # pstats writes to a stream given at construction time only
+        buf = StringIO()
+        stats = pstats.Stats(self._profile, stream=buf)
+        stats.sort_stats('cumulative').print_stats(limit)
+        stream.write(buf.getvalue())
+
+    ## -- End Interface -- @}
+
+# end class StartupProfile
+
+## -- End Types -- @}
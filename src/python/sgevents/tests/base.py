@@ -6,9 +6,12 @@
 @author Sebastian Thiel
 @copyright [GNU Lesser General Public License](https://www.gnu.org/licenses/lgpl.html)
 """
-__all__ = ['with_plugin_application', 'EventsTestCase']
+__all__ = ['with_plugin_application', 'benchmark_engine', 'EventsTestCase']
 
 from functools import wraps
+from contextlib import contextmanager
+
+import bapp
 
 from butility import Path
 from bprocess.tests import PluginLoadingProcessAwareApplication
@@ -16,6 +19,8 @@ from bapp.tests import with_application
 from bapp.tests import preserve_application
 from bshotgun.tests import ShotgunTestCase
 
+from sgevents import EventEnginePlugin
+
 
 # ==============================================================================
 ## @name Decorators
@@ -31,6 +36,50 @@ def with_plugin_application(fun):
 
 
 
+# ==============================================================================
+## @name Utilities
+# ------------------------------------------------------------------------------
+## @{
+
+@contextmanager
+def benchmark_engine(events, overrides, plugin_types):
+    """Provide a BenchmarkEventEngine on the given events, whose only active plugins are of the given types.
+    The types are created in a context of their own, which is removed along with them once the engine is 
+    shut down.
+    @param events list of events the engine's InMemoryShotgunConnection provides
+    @param overrides settings overrides, see BenchmarkEventEngine
+    @param plugin_types list of tuple(name, attributes) with the name and class attributes of each 
+    EventEnginePlugin type to create
+    @note needs a running Application, see with_plugin_application()"""
+    # the benchmark imports the engine, which not all tests may load
+    from sgevents.benchmark import (InMemoryShotgunConnection,
+                                    BenchmarkEventEngine)
+    stack = bapp.main().context()
+    context = stack.push('benchmark engine')
+    engine = None
+    try:
+        for name, attributes in plugin_types:
+            type(name, (EventEnginePlugin, bapp.plugin_type()), dict(attributes, __slots__=()))
+        # end for each plugin type
+        engine = BenchmarkEventEngine(overrides, InMemoryShotgunConnection(events))
+        names = set(name for name, attributes in plugin_types)
+        for plugin in engine._iter_plugins():
+            if type(plugin).__name__ not in names:
+                plugin._active = False
+            # end only keep our plugins
+        # end for each plugin
+        yield engine
+    finally:
+        if engine is not None:
+            engine._shutdown()
+        # end shut down engine
+        stack.remove(context)
+    # end assure plugin types are gone
+
+## -- End Utilities -- @}
+
+
+
 # ==============================================================================
 ## @name Types
 # ------------------------------------------------------------------------------
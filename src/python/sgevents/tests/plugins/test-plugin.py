@@ -11,7 +11,7 @@ __all__ = []
 import bapp
 from sgevents import (EventEnginePlugin,
                       with_global_event_application)
-from butility import DictObject
+from sgevents.event import EventView
 
 
 class TestEventEnginePlugin(EventEnginePlugin, bapp.plugin_type()):
@@ -29,7 +29,7 @@ class TestEventEnginePlugin(EventEnginePlugin, bapp.plugin_type()):
     @with_global_event_application
     def handle_event(self, shotgun, log, event):
         assert shotgun and log
-        assert isinstance(event, DictObject)
+        assert isinstance(event, EventView)
 
         if self.next_exception:
             exc = self.next_exception
@@ -54,6 +54,7 @@ class TestEventEnginePlugin(EventEnginePlugin, bapp.plugin_type()):
 
         self._application_called = self._called = False
         self._active = True
+        self._clear_failures()
 
     ## -- End Test Interface -- @}
 
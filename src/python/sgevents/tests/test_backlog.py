@@ -0,0 +1,60 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_backlog
+@brief tests for sgevents.backlog
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import cPickle as pickle
+from datetime import (datetime,
+                      timedelta)
+
+from .base import EventsTestCase
+
+from sgevents.backlog import *
+
+
+class BacklogTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def test_backlog(self):
+        backlog = EventBacklog()
+        assert not backlog and backlog.min_id() is None and len(backlog) == 0
+
+        backlog.add_range(10, 100009, 5)
+        backlog.add_range(100020, 100020, 10)
+        assert len(backlog) == 100001 and len(list(backlog.iter_ranges())) == 2, "ranges are stored compactly"
+        assert backlog.min_id() == 10
+        assert 10 in backlog and 100009 in backlog and 100020 in backlog
+        assert 9 not in backlog and 100010 not in backlog
+
+        backlog.discard(10)
+        backlog.discard(500)
+        assert backlog.min_id() == 11 and 500 not in backlog and 501 in backlog
+        backlog.discard_range(400, 100020)
+        assert list(backlog.iter_ranges()) == [(11, 399, 5)]
+
+        backlog.add_range(300, 1000, 7)
+        assert list(backlog.iter_ranges()) == [(11, 299, 5), (300, 1000, 7)], "overlaps get the new expiry"
+
+        assert backlog.expire(4) == list()
+        assert backlog.expire(5) == [(11, 299)]
+        assert backlog.min_id() == 300
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            for item in (backlog, EventBacklog()):
+                restored = pickle.loads(pickle.dumps(item, protocol))
+                assert restored == item and restored.min_id() == item.min_id()
+            # end for each backlog
+        # end for each protocol
+
+    def test_migration(self):
+        expiry = datetime.now() + timedelta(minutes=5)
+        backlog = EventBacklog.from_dict({1 : expiry, 2 : expiry, 3 : expiry, 5 : expiry})
+        assert [r[:2] for r in backlog.iter_ranges()] == [(1, 3), (5, 5)]
+        assert not backlog.expire()
+
+# end class BacklogTestCase
@@ -0,0 +1,53 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_benchmark
+@brief tests for sgevents.benchmark
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+from .base import (EventsTestCase,
+                   with_plugin_application)
+
+from butility.tests import with_rw_directory
+
+from sgevents.benchmark import *
+
+
+class BenchmarkTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def test_connection(self):
+        events = synthetic_events(100, num_event_types=4, backlog=10)
+        assert len(events) == 100
+        assert events[-1]['id'] - events[0]['id'] + 1 == 110, "gaps make up the backlog"
+
+        conn = InMemoryShotgunConnection(events)
+        assert conn.find_one('EventLogEntry', [])['id'] == events[-1]['id']
+        res = conn.find('EventLogEntry', [['id', 'greater_than', events[0]['id']]], limit=10)
+        assert len(res) == 10 and res[0] is events[1]
+        res = conn.find('EventLogEntry', [['id', 'between', [events[0]['id'], events[-1]['id']]],
+                                          {'filter_operator' : 'any',
+                                           'filters' : [['event_type', 'in', ['Shotgun_Type01_Change']]]}])
+        assert len(res) == 25
+        assert conn.num_queries == 2
+        assert conn.fetched_at(res[0]['id'])
+
+    @with_plugin_application
+    @with_rw_directory
+    def test_scenario(self, rw_dir):
+        events = synthetic_events(200, backlog=5)
+        results = run_benchmark(events, plugins=(2, ), selectivities=(0.5, 1.0), journals=('pickle', 'sqlite'),
+                                page_sizes=(50, ))
+        assert len(results) == 4
+        for res in results:
+            assert res['events'] == 200 and res['backlog'] == 5
+            assert res['events_per_second'] > 0 and res['peak_rss_kb'] > 0
+            assert res['latency_p50_ms'] <= res['latency_p99_ms']
+            expected = res['selectivity'] == 1.0 and 400 or 200
+            assert res['dispatches'] == expected, "each event is handled by the plugins interested in it"
+        # end for each result
+
+# end class BenchmarkTestCase
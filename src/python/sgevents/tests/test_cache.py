@@ -0,0 +1,91 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_cache
+@brief tests for sgevents.cache
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import time
+import threading
+
+from .base import EventsTestCase
+
+from mock import Mock
+
+from sgevents.cache import *
+
+
+class CacheTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def test_coalescing(self):
+        conn = Mock()
+        conn.find = Mock(side_effect=lambda entity_type, filters, fields: [dict(type=entity_type, id=1)])
+        cache = ShotgunRequestCache()
+        first, second = CachingShotgunConnection(conn, cache), CachingShotgunConnection(conn, cache)
+
+        res = first.find('Shot', [['code', 'is', 'a']], ['code'])
+        res[0]['id'] = 5
+        assert second.find('Shot', [['code', 'is', 'a']], ['code']) == [dict(type='Shot', id=1)], \
+                "results are shared, but can't be altered"
+        assert conn.find.call_count == 1 and cache.hits == 1 and cache.misses == 1
+        second.find('Shot', [['code', 'is', 'b']], ['code'])
+        assert conn.find.call_count == 2, "different queries are different"
+
+        second.update('Shot', 1, dict(code='c'))
+        assert conn.update.call_count == 1
+        first.find('Shot', [['code', 'is', 'a']], ['code'])
+        assert conn.find.call_count == 3, "changes invalidate all queries of the entity type"
+
+        cache.rotate()
+        first.find('Shot', [['code', 'is', 'a']], ['code'])
+        assert conn.find.call_count == 3, "results of the previous batch are kept"
+        cache.rotate()
+        cache.rotate()
+        first.find('Shot', [['code', 'is', 'a']], ['code'])
+        assert conn.find.call_count == 4, "older results are dropped"
+
+        # concurrent queries are sent only once
+        def slow_find(entity_type, filters, fields):
+            time.sleep(0.05)
+            return list()
+        # end slow_find
+        conn.find = Mock(side_effect=slow_find)
+        cache.clear()
+        threads = [threading.Thread(target=first.find, args=('Shot', [], ['code'])) for count in range(5)]
+        for thread in threads:
+            thread.start()
+        # end for each thread
+        for thread in threads:
+            thread.join()
+        # end for each thread
+        assert conn.find.call_count == 1
+
+        conn.find = Mock(side_effect=ValueError)
+        self.failUnlessRaises(ValueError, first.find, 'Shot', [], ['id'])
+        self.failUnlessRaises(ValueError, first.find, 'Shot', [], ['id'])
+        assert conn.find.call_count == 2, "failures are not cached"
+
+    def test_prefetch(self):
+        conn = Mock()
+        conn.find = Mock(return_value=[dict(type='Shot', id=1, sg_cut_in=1, sg_cut_out=5),
+                                       dict(type='Shot', id=2, sg_cut_in=10, sg_cut_out=50)])
+        conn.find_one = Mock(return_value=dict(type='Shot', id=1, code='a'))
+        cache = ShotgunRequestCache()
+        cache.prefetch(conn, 'Shot', [2, 1, 2], ['sg_cut_in', 'sg_cut_out'])
+        assert conn.find.call_args[0][1] == [['id', 'in', [1, 2]]]
+
+        sg = CachingShotgunConnection(conn, cache)
+        assert sg.find_one('Shot', [['id', 'is', 2]], ['sg_cut_in']) == dict(type='Shot', id=2, sg_cut_in=10)
+        assert conn.find_one.call_count == 0
+        assert sg.find_one('Shot', [['id', 'is', 1]], ['code'])['code'] == 'a'
+        assert conn.find_one.call_count == 1, "fields which weren't prefetched are queried"
+
+        sg.delete('Shot', 2)
+        sg.find_one('Shot', [['id', 'is', 2]], ['sg_cut_in'])
+        assert conn.find_one.call_count == 2, "changed entities are dropped"
+
+# end class CacheTestCase
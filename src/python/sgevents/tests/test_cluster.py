@@ -0,0 +1,70 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_cluster
+@brief tests for sgevents.cluster
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import time
+
+from .base import EventsTestCase
+
+from butility.tests import with_rw_directory
+
+from sgevents.cluster import *
+
+
+class ClusterTestCase(EventsTestCase):
+    __slots__ = ()
+
+    @with_rw_directory
+    def test_lease_store(self, rw_dir):
+        store = SQLiteLeaseStore(rw_dir / 'leases.sqlite')
+        assert store.acquire('a', 'node1', 10)
+        assert store.acquire('a', 'node1', 10), "owners may renew"
+        assert not store.acquire('a', 'node2', 10), "others have to wait"
+        assert store.leases() == dict(a='node1')
+        store.release('a', 'node2')
+        assert store.leases() == dict(a='node1'), "only owners may release"
+        store.release('a', 'node1')
+        assert store.acquire('a', 'node2', 0.01)
+        time.sleep(0.02)
+        assert not store.leases(), "expired leases are not listed"
+        assert store.acquire('a', 'node1', 10), "expired leases may be taken"
+
+    @with_rw_directory
+    def test_rebalance(self, rw_dir):
+        path = rw_dir / 'leases.sqlite'
+        keys = ['p%i' % index for index in range(5)]
+        first = PluginLeaseManager(SQLiteLeaseStore(path), 'first', 0.2)
+        second = PluginLeaseManager(SQLiteLeaseStore(path), 'second', 0.2)
+
+        assert first.rebalance(keys) == frozenset(keys), "a single node owns everything"
+        assert not second.rebalance(keys), "nothing is free yet"
+        assert len(first.rebalance(keys)) == 3, "the first node gives up plugins beyond its share"
+        assert len(second.rebalance(keys)) == 2
+        assert not first.owned() & second.owned()
+
+        # plugins of nodes which stop renewing fail over
+        first.renew()
+        time.sleep(0.25)
+        assert second.rebalance(keys) == frozenset(keys)
+        assert not first.renew(), "lost leases are noticed"
+
+        # nodes leaving the cluster release their leases right away
+        second.stop(release=True)
+        assert first.rebalance(keys) == frozenset(keys)
+
+        # leases are kept alive while the thread runs
+        first.start(interval=0.05)
+        try:
+            time.sleep(0.3)
+            assert not second.rebalance(keys), "leases were renewed"
+        finally:
+            first.stop()
+        # end assure thread is stopped
+
+# end class ClusterTestCase
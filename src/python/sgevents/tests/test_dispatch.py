@@ -0,0 +1,53 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_dispatch
+@brief tests for sgevents.dispatch
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import time
+
+from .base import EventsTestCase
+
+from sgevents.dispatch import *
+
+
+class DispatchTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def test_thread_pool(self):
+        dispatcher = ThreadPoolEventDispatcher(4, max_queue_depth=3)
+        assert dispatcher.is_concurrent()
+        results = dict()
+
+        def work(plugin, item):
+            if plugin == 'slow':
+                time.sleep(0.001)
+            # end simulate slow plugin
+            results.setdefault(plugin, list()).append(item)
+        # end work
+
+        count = 100
+        for item in range(count):
+            for plugin in ('slow', 'a', 'b'):
+                dispatcher.submit(plugin, work, plugin, item)
+            # end for each plugin
+        # end for each item
+
+        dispatcher.drain('a')
+        assert results['a'] == range(count), "a single lane can be drained"
+        dispatcher.wait()
+        for plugin, items in results.iteritems():
+            assert items == range(count), "order must be kept per plugin"
+        # end for each plugin
+        dispatcher.shutdown()
+
+        dispatcher.submit('a', work, 'a', count)
+        dispatcher.wait()
+        assert results['a'][-1] == count, "it's possible to submit after shutdown"
+        dispatcher.shutdown()
+
+# end class DispatchTestCase
@@ -14,6 +14,7 @@ import socket
 import bapp
 
 from .base import (EventsTestCase,
+                   benchmark_engine,
                    with_plugin_application)
 
 from bshotgun.tests import (ReadOnlyTestSQLProxyShotgunConnection,
@@ -28,6 +29,10 @@ from mock import Mock
 
 # try * import
 from sgevents import *
+from sgevents.benchmark import (InMemoryShotgunConnection,
+                                BenchmarkEventEngine,
+                                synthetic_events)
+from sgevents.utility import EventEngineError
 
 
 # ==============================================================================
@@ -127,6 +132,11 @@ class EngineTestCase(EventsTestCase):
 
         test_plugin = engine._iter_plugins().next()
         test_plugin.make_assertion()
+        metrics = engine.metrics()
+        assert metrics.polls.value() == 1 and metrics.events_fetched.value() == 1
+        assert metrics.connection_retries.value() == 1, "the first attempt failed"
+        assert metrics.handle_seconds.value((str(test_plugin), ))[0] == 1
+        assert metrics.lag_events.value((str(test_plugin), )) == 0
 
         engine._load_event_id_data()
         engine._load_event_id_data(), "duplicate calls are fine"
@@ -167,6 +177,225 @@ class EngineTestCase(EventsTestCase):
         test_plugin.event_filters = {'Shotgun_Shot_Change' : ['sg_cut_in']}
         engine._process_events()
 
+    @with_plugin_application
+    @with_rw_directory
+    def test_async(self, rw_dir):
+        try:
+            import trollius
+            from sgevents.asyncengine import AsyncEventEngine
+        except ImportError:
+            # it's an optional dependency
+            return
+        # end handle missing dependency
+
+        sg = EventsReadOnlyTestSQLProxyShotgunConnection()
+        engine = AsyncEventEngine(sg)
+        test_plugin = engine._iter_plugins().next()
+
+        engine._loop = trollius.new_event_loop()
+        try:
+            for count in range(3):
+                engine._loop.run_until_complete(engine._process_events_async())
+                test_plugin.make_assertion()
+            # end for each poll
+            assert engine._lanes, "plugins should have their own queue"
+            assert all(queue.empty() for queue in engine._lanes.values())
+        finally:
+            engine._loop.close()
+            engine._loop = None
+        # end assure loop is closed
+        engine._lanes.clear()
+
+        # threaded mode
+        engine.start()
+        engine.stop_and_join()
+        assert not engine._lanes, "tasks are stopped on shutdown"
+
+    @with_plugin_application
+    @with_rw_directory
+    def test_paging(self, rw_dir):
+        sg = EventsReadOnlyTestSQLProxyShotgunConnection()
+        engine = EventEngine(sg)
+
+        events = [dict(id=eid, event_type=eid % 2 and 'odd' or 'even') for eid in range(10, 35)]
+        def find(*args, **kwargs):
+            filters = kwargs['filters']
+            if filters[0][1] == 'between':
+                first_id, last_id = filters[0][2]
+            else:
+                first_id, last_id = filters[0][2] + 1, events[-1]['id']
+            # end handle filter type
+            res = [e for e in events if first_id <= e['id'] <= last_id]
+            if len(filters) > 1:
+                res = [e for e in res if e['event_type'] in filters[1]['filters'][0][2]]
+            # end apply server-side filter
+            return kwargs['limit'] and res[:kwargs['limit']] or res
+        # end find
+        conn = Mock()
+        conn.find = Mock(side_effect=find)
+
+        pages = list(engine._iter_event_pages(conn, 10, 10))
+        assert [len(p) for p in pages] == [10, 10, 5]
+        assert [e['id'] for p in pages for e in p] == [e['id'] for e in events]
+
+        pages = list(engine._iter_event_pages(conn, 15, 0))
+        assert len(pages) == 1 and len(pages[0]) == 20, "0 means unbounded"
+
+        conn.find.reset_mock()
+        pages = list(engine._iter_event_pages(conn, 25, 5))
+        assert [len(p) for p in pages] == [5, 5, 0]
+        assert conn.find.call_count == 3
+
+        assert engine._server_side_event_filter() is None, "test plugin wants all events"
+        event_filter = {'filter_operator' : 'any', 'filters' : [['event_type', 'in', ['odd']]]}
+        pages = list(engine._iter_event_pages(conn, 10, 10, event_filter))
+        assert [len(p) for p in pages] == [5, 5, 2]
+        assert [p.event_ids for p in pages] == [range(10, 20), range(20, 30), range(30, 35)]
+        assert all(e['event_type'] == 'odd' for p in pages for e in p)
+
+    @with_plugin_application
+    @with_rw_directory
+    def test_field_projection(self, rw_dir):
+        events = synthetic_events(40, num_event_types=2)
+        plugin_types = [('MetaPlugin', dict(event_filters={events[0]['event_type'] : list()},
+                                            required_fields=['meta'],
+                                            handle_event=lambda self, shotgun, log, event: None)),
+                        ('EntityPlugin', dict(event_filters={'*' : list()},
+                                              required_fields=['entity'],
+                                              handle_event=lambda self, shotgun, log, event: None))]
+        overrides = {('fetch', 'lazy-meta') : True,
+                     ('event-journal-file', ) : rw_dir / 'journal'}
+        with benchmark_engine(events, overrides, plugin_types) as engine:
+            fields, lazy_fields = engine._event_fields()
+            assert fields == ['attribute_name', 'entity', 'event_type', 'id', 'session_uuid']
+            assert lazy_fields == ['meta']
+
+            conn = engine._sg
+            engine._filter_index.update(engine._iter_plugins())
+            conn.num_queries = 0
+            pages = list(engine._iter_event_pages(conn, events[0]['id'], 0, None, fields, lazy_fields))
+            assert conn.num_queries == 2, "meta is fetched in one additional query"
+            page = pages[0]
+            assert len(page) == len(events) and 'user' not in page[0], "only required fields are fetched"
+            with_meta = [event['id'] for event in page if 'meta' in event]
+            assert with_meta == [event['id'] for event in events if event['event_type'] == events[0]['event_type']]
+            assert all(event['meta'] == original['meta'] for event, original in zip(page, events)
+                                                          if 'meta' in event)
+        # end with engine
+
+    @with_plugin_application
+    @with_rw_directory
+    def test_priority_lanes(self, rw_dir):
+        events = synthetic_events(100)
+        handled = dict()
+
+        def handle_event(plugin, shotgun, log, event):
+            handled.setdefault(type(plugin).__name__, list()).append(event.id)
+        # end handle_event
+
+        plugin_types = [('InteractivePlugin', dict(event_filters={'*' : list()}, handle_event=handle_event)),
+                        ('BulkPlugin', dict(event_filters={'*' : list()}, priority='bulk',
+                                            handle_event=handle_event))]
+        overrides = {('fetch', 'page-size') : 10,
+                     ('lanes', 'bulk', 'max-pages-per-poll') : 2,
+                     ('lanes', 'interactive', 'plugins') : ['InteractivePlugin'],
+                     ('event-journal-file', ) : rw_dir / 'journal'}
+        with benchmark_engine(events, overrides, plugin_types) as engine:
+            engine._scheduler = PollScheduler(60)
+            engine._wait = Mock()
+            for plugin in engine._iter_plugins():
+                if type(plugin).__name__ == 'InteractivePlugin':
+                    plugin.set_event_id(events[-6]['id'])
+                elif type(plugin).__name__ == 'BulkPlugin':
+                    plugin.set_event_id(events[0]['id'] - 1)
+                # end place plugins
+            # end for each plugin
+
+            lanes = [(priority, [type(plugin).__name__ for plugin in plugins])
+                     for priority, plugins in engine._priority_lanes()]
+            assert lanes[0] == ('interactive', ['InteractivePlugin']), "configured lanes take precedence"
+            assert lanes[-1] == ('bulk', ['BulkPlugin']), "lanes are served by priority"
+
+            engine._process_events()
+            assert handled['InteractivePlugin'] == [event['id'] for event in events[-5:]], \
+                   "the interactive lane tails the newest events"
+            assert handled['BulkPlugin'] == [event['id'] for event in events[:20]], "the bulk lane is throttled"
+            assert engine._wait.call_args[0][0] == 0, "throttled lanes continue right away"
+
+            for poll in range(5):
+                engine._process_events()
+            # end for each poll to catch up
+            assert handled['BulkPlugin'] == [event['id'] for event in events]
+            assert len(handled['InteractivePlugin']) == 5, "lanes don't affect each other"
+            assert engine._wait.call_args[0][0] == 60, "once all lanes caught up, the scheduler decides"
+
+            for plugin in engine._iter_plugins():
+                if type(plugin).__name__ in handled:
+                    plugin.set_event_id(events[-11]['id'])
+                # end let lanes overlap
+            # end for each plugin
+            engine._process_events()
+            assert handled['BulkPlugin'][-10:] == handled['InteractivePlugin'][-10:]
+            assert engine.metrics().poll_events.value() == 10, "events fetched by several lanes are counted once"
+
+            bad_type = type('BadPriorityPlugin', (EventEnginePlugin, bapp.plugin_type()),
+                            dict(event_filters={'*' : list()}, priority='urgent', __slots__=()))
+            self.failUnlessRaises(EventEngineError, engine._new_plugin, bad_type, engine.settings_value())
+        # end with engine
+
+    @with_plugin_application
+    @with_rw_directory
+    def test_connection_pool_size(self, rw_dir):
+        overrides = {('connection-pool', 'size') : 2,
+                     ('dispatch', 'threads') : 2,
+                     ('event-journal-file', ) : rw_dir / 'journal'}
+        engine = BenchmarkEventEngine(overrides, InMemoryShotgunConnection(synthetic_events(10)))
+        try:
+            settings = engine.settings_value()
+            self.failUnlessRaises(EventEngineError, engine._new_connection_pool, settings)
+            settings['connection-pool']['size'] = 3
+            engine._new_connection_pool(settings).clear()
+        finally:
+            engine._shutdown()
+        # end assure engine is shut down
+
+    def test_scheduler(self):
+        assert PollScheduler(60).next_interval(100, True) == 60, "default scheduler always waits the same"
+
+        scheduler = AdaptivePollScheduler(60, 0.25, 2.0, busy_threshold=10)
+        assert scheduler.next_interval(500, True) == 0, "full batches cause immediate polls"
+        assert scheduler.next_interval(100, False) == 0.25, "activity is high"
+        intervals = [scheduler.next_interval(0, False) for count in range(12)]
+        assert intervals == sorted(intervals) and intervals[-1] == 60, "back off up to the maximum"
+        assert scheduler.next_interval(1, False) == 0.5, "events reset the backoff"
+
+    def test_filter_index(self):
+        def plugin(event_filters):
+            res = Mock()
+            res._event_filters = Mock(return_value=event_filters)
+            return res
+        # end plugin
+        def event(event_type, attribute_name=None):
+            return dict(event_type=event_type, attribute_name=attribute_name)
+        # end event
+
+        catch_all = plugin(dict())
+        wildcard = plugin({'*' : ['sg_status_list']})
+        shots = plugin({'Shotgun_Shot_Change' : None})
+        cuts = plugin({'Shotgun_Shot_Change' : ['sg_cut_in', 'sg_cut_out']})
+
+        index = EventFilterIndex()
+        assert index.update([catch_all, wildcard, shots, cuts])
+        assert not index.update([catch_all, wildcard, shots, cuts]), "nothing changed"
+
+        assert index.candidates(event('Shotgun_Shot_Change', 'sg_cut_in')) == (catch_all, shots, cuts)
+        assert index.candidates(event('Shotgun_Task_Change', 'sg_status_list')) == (catch_all, wildcard)
+        assert index.candidates(event('Shotgun_Task_Change')) == (catch_all,)
+
+        shots._event_filters.return_value = {'Shotgun_Task_Change' : None}
+        assert index.update([catch_all, wildcard, shots, cuts]), "changed filters cause a rebuild"
+        assert index.candidates(event('Shotgun_Task_Change')) == (catch_all, shots)
+
     @with_application(from_file=__file__)
     @with_rw_directory
     def test_plugins(self, rw_dir):
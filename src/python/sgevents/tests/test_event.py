@@ -0,0 +1,56 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_event
+@brief tests for sgevents.event
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import operator
+import cPickle as pickle
+
+from .base import EventsTestCase
+
+from sgevents.event import *
+
+
+class EventViewTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def test_view(self):
+        data = dict(id=5, event_type='Shotgun_Shot_Change', attribute_name='sg_cut_in', session_uuid=None,
+                    meta=dict(new_value=10, added=[dict(type='Asset', id=1)]),
+                    entity=dict(type='Shot', id=3), user=None)
+        event = EventView(data)
+        assert event.id == 5 and event['id'] == 5 and event.event_type == 'Shotgun_Shot_Change'
+        assert event.attribute_name == 'sg_cut_in' and event.user is None and event['session_uuid'] is None
+        assert not event._views, "nested fields are wrapped on first access"
+
+        assert event.entity.id == 3 and event.entity['type'] == 'Shot'
+        assert event.entity is event['entity'], "views are created once"
+        assert 'new_value' in event.meta and event.meta.get('old_value') is None
+        assert event.meta.added[0].type == 'Asset' and isinstance(event.meta.added, tuple)
+        assert isinstance(event.entity, dict), "views can be passed to shotgun"
+        assert event == data and event.entity == dict(type='Shot', id=3)
+        assert sorted(event.keys()) == sorted(data) and len(event) == len(data)
+
+        self.failUnlessRaises(AttributeError, getattr, event, 'project')
+        self.failUnlessRaises(KeyError, event.__getitem__, 'project')
+        self.failUnlessRaises(TypeError, setattr, event, 'id', 6)
+        self.failUnlessRaises(TypeError, setattr, event.meta, 'new_value', 6)
+        self.failUnlessRaises(TypeError, operator.setitem, event, 'id', 6)
+        self.failUnlessRaises(TypeError, event.entity.update, dict(id=4))
+
+        copy = event.to_dict()
+        copy['meta']['added'].append(None)
+        assert len(data['meta']['added']) == 1, "copies are independent"
+
+        for protocol in range(3):
+            unpickled = pickle.loads(pickle.dumps(event, protocol))
+            assert type(unpickled) is EventView and unpickled == event and unpickled.id == 5
+            assert unpickled.entity.id == 3
+        # end for each pickle protocol
+
+# end class EventViewTestCase
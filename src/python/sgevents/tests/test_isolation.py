@@ -0,0 +1,67 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_isolation
+@brief tests for sgevents.isolation
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import os
+import logging
+
+from .base import EventsTestCase
+
+from butility import DictObject
+from mock import Mock
+
+from sgevents import EventEnginePlugin
+from sgevents.backlog import EventBacklog
+from sgevents.isolation import *
+
+
+class CrashingPlugin(EventEnginePlugin):
+    """Terminates the process it's running in on demand"""
+    __slots__ = ()
+
+    event_filters = dict()
+
+    @classmethod
+    def plugin_name(cls):
+        return cls.__name__
+
+    def handle_event(self, shotgun, log, event):
+        if event.meta == 'crash':
+            os._exit(1)
+        elif event.meta == 'raise':
+            raise ValueError(event.meta)
+        # end handle test instructions
+
+# end class CrashingPlugin
+
+
+class IsolationTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def test_worker(self):
+        def event(eid, meta=None):
+            return DictObject(dict(id=eid, event_type='Shotgun_Shot_Change', attribute_name=None, 
+                                   session_uuid=None, meta=meta))
+        # end event
+
+        worker = ProcessPluginWorker(CrashingPlugin, Mock, logging.getLogger('isolation-test'))
+        assert worker.process(event(1), (0, EventBacklog())) == (True, None, (1, EventBacklog()), [])
+        assert worker.process(event(3), (1, EventBacklog()))[2][0] == 3, "state is passed back"
+
+        self.failUnlessRaises(PluginWorkerError, worker.process, event(4, 'crash'), (3, EventBacklog()))
+        assert worker.process(event(5), (3, EventBacklog()))[2][0] == 5, "worker is restarted after crashing"
+        active, resume_at, state, parked = worker.process(event(6, 'raise'), (5, EventBacklog()))
+        assert active and resume_at is not None and state[0] == 5 and not parked, "exceptions pause the plugin"
+
+        worker.stop()
+        assert worker._process is None, "the process is gone once stopped"
+        # multiple calls are fine
+        worker.stop()
+
+# end class IsolationTestCase
@@ -0,0 +1,70 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_journal
+@brief tests for sgevents.journal
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+from .base import EventsTestCase
+
+from butility.tests import with_rw_directory
+
+from sgevents.journal import *
+
+
+class JournalTestCase(EventsTestCase):
+    __slots__ = ()
+
+    @with_rw_directory
+    def test_journals(self, rw_dir):
+        for journal_type in (PickleEventJournal, WriteAheadLogEventJournal, SQLiteEventJournal):
+            path = rw_dir / journal_type.__name__
+            journal = journal_type(path, commit_every_events=2)
+            assert journal.load() == dict(), "non-existing journals are empty"
+
+            journal.record('a', (1, dict()))
+            journal.record('b', (2, {5 : 1}))
+            assert not journal.event_processed()
+            assert journal.event_processed(), "second event makes the commit due"
+            journal.commit()
+            assert not journal.is_commit_due()
+
+            journal.record('a', (1, dict()))
+            assert not journal._pending, "unchanged states are not written"
+            journal.record('a', (3, dict()))
+            journal.commit()
+
+            assert journal_type(path).load() == {'a' : (3, dict()), 'b' : (2, {5 : 1})}
+            journal.close()
+
+            path.write_bytes('hello')
+            self.failUnlessRaises(EventJournalError, journal_type(path).load)
+        # end for each journal type
+
+    @with_rw_directory
+    def test_wal(self, rw_dir):
+        path = rw_dir / 'journal.wal'
+        journal = WriteAheadLogEventJournal(path, compact_every=4)
+        journal.load()
+        for count in range(10):
+            journal.record('a', count)
+            journal.commit()
+            assert journal._num_records <= 4, "log should be compacted"
+        # end for each commit
+        journal.close()
+
+        # simulate partial write
+        fh = open(path, 'ab')
+        fh.write('\x10\x00\x00\x00abc')
+        fh.close()
+
+        journal = WriteAheadLogEventJournal(path)
+        assert journal.load() == {'a' : 9}, "partial records are ignored"
+        journal.record('b', 1)
+        journal.commit()
+        assert WriteAheadLogEventJournal(path).load() == {'a' : 9, 'b' : 1}
+
+# end class JournalTestCase
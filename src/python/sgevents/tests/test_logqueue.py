@@ -0,0 +1,130 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_logqueue
+@brief tests for sgevents.logqueue and the DigestSMTPHandler
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import logging
+import threading
+
+from mock import patch
+
+from .base import EventsTestCase
+
+from sgevents.logqueue import *
+from sgevents.utility import (DigestSMTPHandler,
+                              remove_handlers_from_logger)
+
+
+class BlockingHandler(logging.Handler):
+    """Keeps all records, and blocks while handling them until it is released"""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = list()
+        self.entered = threading.Event()
+        self.released = threading.Event()
+
+    def emit(self, record):
+        self.entered.set()
+        self.released.wait()
+        self.records.append(record)
+
+# end class BlockingHandler
+
+
+class LogQueueTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def test_queue(self):
+        log_queue = LogQueue(max_size=1, flush_interval=0.05)
+        target = BlockingHandler()
+        log = logging.getLogger('logqueue-test')
+        log.propagate = False
+        log.addHandler(log_queue.wrap(target))
+        try:
+            args = [1]
+            log.error("first %s", args)
+            # Event.wait() returns None instead of the flag on python 2.6
+            target.entered.wait(5)
+            assert target.entered.is_set(), "records are handled by the background thread"
+            args.append(2)
+            try:
+                raise ValueError("failed")
+            except ValueError:
+                log.exception("second")
+            # end log an exception
+            log.error("third")
+            assert log_queue.dropped() == 1, "records are dropped if the queue is full"
+
+            target.released.set()
+            log_queue.stop()
+            assert [record.getMessage() for record in target.records] == ['first [1]', 'second'], \
+                   "messages are formatted when they are logged"
+            assert 'ValueError' in target.records[1].exc_text and target.records[1].exc_info is None
+
+            log.error("fourth")
+            assert target.records[-1].getMessage() == 'fourth', "once stopped, records are handled right away"
+
+            remove_handlers_from_logger(log, BlockingHandler)
+            assert not log.handlers, "queued handlers are removed by the type of their target"
+        finally:
+            target.released.set()
+            remove_handlers_from_logger(log)
+        # end assure handlers are removed
+
+    def test_digest(self):
+        handler = DigestSMTPHandler('localhost', 'daemon@localhost', ['admin@localhost'], 'events',
+                                    digest_every=60)
+        log = logging.getLogger('logqueue-digest-test')
+        log.propagate = False
+        log.addHandler(handler)
+        try:
+            with patch('smtplib.SMTP') as smtp:
+                for count in range(3):
+                    log.error("repeated %i", count)
+                # end for each repetition
+                log.warning("other")
+                handler.flush()
+                assert not smtp.called, "records are collected until digest_every elapsed"
+
+                handler.close()
+                assert smtp.return_value.sendmail.call_count == 1, "all records are sent in one email"
+                msg = smtp.return_value.sendmail.call_args[0][2]
+                assert 'repeated 0' in msg and 'repeated 1' not in msg and '(logged 3 times' in msg
+                assert 'other' in msg and 'ERROR' in msg and '(2 errors)' in msg
+
+                log.error("collected")
+                log.critical("disabling")
+                handler.flush()
+                assert smtp.return_value.sendmail.call_count == 1, \
+                       "critical records wait until alert_every elapsed since the last email"
+                handler._last_sent_at -= handler.alert_every
+                handler.flush()
+                assert smtp.return_value.sendmail.call_count == 2
+                msg = smtp.return_value.sendmail.call_args[0][2]
+                assert 'collected' in msg and 'CRITICAL' in msg
+
+                for count in range(2):
+                    handler._last_sent_at -= handler.alert_every
+                    log.critical("parked %i", count)
+                # end for each repetition
+                assert smtp.return_value.sendmail.call_count == 3, "critical records are sent right away"
+                assert 'parked 0' in smtp.return_value.sendmail.call_args[0][2]
+                handler.flush()
+                assert smtp.return_value.sendmail.call_count == 3, "repeated ones wait for the digest"
+
+                handler.digest_every = 0
+                log.error("right away")
+                assert smtp.return_value.sendmail.call_count == 4
+                assert 'parked 1' in smtp.return_value.sendmail.call_args[0][2]
+            # end patch smtp
+        finally:
+            remove_handlers_from_logger(log)
+        # end assure handler is removed
+
+# end class LogQueueTestCase
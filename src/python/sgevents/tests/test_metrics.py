@@ -0,0 +1,78 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_metrics
+@brief tests for sgevents.metrics
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import json
+import urllib2
+
+from .base import EventsTestCase
+from butility.tests import with_rw_directory
+
+from sgevents.metrics import *
+
+
+class MetricsTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def test_registry(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('events_total', "events")
+        gauge = registry.gauge('lag', "lag", ('plugin', ))
+        histogram = registry.histogram('seconds', "durations", ('plugin', ), buckets=(0.1, 1.0))
+        self.failUnlessRaises(AssertionError, registry.counter, 'lag', "duplicate")
+
+        assert counter.value() is None
+        counter.inc()
+        counter.inc(5)
+        assert counter.value() == 6
+
+        gauge.set(10, ('a"b', ))
+        gauge.set(5, ('a"b', ))
+        assert gauge.value(('a"b', )) == 5
+
+        for value in (0.05, 0.1, 0.5, 20.0):
+            histogram.observe(value, ('p', ))
+        # end for each value
+        count, total = histogram.value(('p', ))
+        assert count == 4 and total == 20.65
+
+        text = registry.render()
+        assert '# TYPE events_total counter\nevents_total 6.0\n' in text
+        assert 'lag{plugin="a\\"b"} 5.0' in text, "label values are escaped"
+        assert 'seconds_bucket{plugin="p",le="0.1"} 2.0' in text, "buckets are inclusive"
+        assert 'seconds_bucket{plugin="p",le="1.0"} 3.0' in text, "buckets are cumulative"
+        assert 'seconds_bucket{plugin="p",le="+Inf"} 4.0' in text
+        assert 'seconds_count{plugin="p"} 4.0' in text
+
+        snapshot = registry.snapshot()
+        assert snapshot['events_total']['values'] == [dict(labels=dict(), value=6)]
+        assert snapshot['seconds']['values'][0]['buckets']['+Inf'] == 1
+
+    @with_rw_directory
+    def test_export(self, rw_dir):
+        metrics = EngineMetrics()
+        metrics.polls.inc()
+
+        path = rw_dir / 'metrics.json'
+        metrics.registry.write_snapshot(path)
+        data = json.load(open(path))
+        assert data['time'] and data['metrics']['sgevents_polls_total']['values'][0]['value'] == 1
+
+        server = MetricsHTTPServer(metrics.registry, 0)
+        assert server.port() is None
+        server.start()
+        try:
+            text = urllib2.urlopen('http://localhost:%i/metrics' % server.port()).read()
+            assert 'sgevents_polls_total 1.0' in text
+        finally:
+            server.stop()
+        # end assure server is stopped
+        assert server.port() is None
+
+# end class MetricsTestCase
@@ -0,0 +1,149 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_plugin
+@brief tests for sgevents.plugin
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import time
+import socket
+import logging
+
+from .base import EventsTestCase
+
+from butility import DictObject
+from mock import Mock
+
+from sgevents import EventEnginePlugin
+
+
+class BatchingPlugin(EventEnginePlugin):
+    """Records the batches it gets, and fails on events whose meta is 'raise'"""
+    __slots__ = ('batches', )
+
+    event_filters = {'Shotgun_Shot_Change' : []}
+    event_batch_size = 3
+
+    def __init__(self, *args, **kwargs):
+        super(BatchingPlugin, self).__init__(*args, **kwargs)
+        self.batches = list()
+
+    @classmethod
+    def plugin_name(cls):
+        return cls.__name__
+
+    def handle_events(self, shotgun, log, events):
+        self.batches.append([event.id for event in events])
+        if any(event.meta == 'raise' for event in events):
+            raise ValueError("failed on demand")
+        # end fail on demand
+
+    def handle_event(self, shotgun, log, event):
+        raise AssertionError("shouldn't be called")
+
+# end class BatchingPlugin
+
+
+class FailingPlugin(EventEnginePlugin):
+    """Fails on events whose meta is 'raise', or 'timeout' to simulate a transient error"""
+    __slots__ = ()
+
+    event_filters = dict()
+    retry_attempts = 2
+    circuit_failures = 3
+
+    @classmethod
+    def plugin_name(cls):
+        return cls.__name__
+
+    def handle_event(self, shotgun, log, event):
+        if event.meta == 'raise':
+            raise ValueError("failed on demand")
+        elif event.meta == 'timeout':
+            raise socket.error("timed out")
+        # end fail on demand
+
+# end class FailingPlugin
+
+
+class PluginTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def _event(self, eid, meta=None, event_type='Shotgun_Shot_Change'):
+        return DictObject(dict(id=eid, event_type=event_type, attribute_name='code',
+                               session_uuid=None, meta=meta))
+
+    def test_batches(self):
+        event = self._event
+        plugin = BatchingPlugin(Mock(), logging.getLogger('batch-test'))
+        plugin.set_event_id(0)
+
+        plugin.process(event(1))
+        plugin.process(event(2, event_type='Shotgun_Asset_Change'))
+        assert plugin.has_queued_events() and not plugin.batches
+        assert plugin.state()[0] == 0, "queued events are not processed yet"
+        assert plugin.next_unprocessed_event_id() == 3, "but they are not fetched again"
+        plugin.process(event(3))
+        assert plugin.batches == [[1, 3]], "full batches are handled, filtered events are not passed on"
+        assert plugin.state()[0] == 3 and not plugin.state()[1] and not plugin.has_queued_events()
+
+        plugin.process(event(4))
+        plugin.flush_events(force=False)
+        assert plugin.batches[-1] == [4], "without timeout, batches are handled at the end of each page"
+
+        plugin.event_batch_timeout = 60
+        plugin.process(event(5))
+        plugin.flush_events(force=False)
+        assert plugin.has_queued_events(), "batches are kept until the timeout elapsed"
+        plugin._batch_started_at = time.time() - 61
+        plugin.flush_events(force=False)
+        assert plugin.batches[-1] == [5] and plugin.state()[0] == 5
+
+        # failing batches are replayed event by event
+        del plugin.batches[:]
+        plugin.process(event(6))
+        plugin.process(event(7, 'raise'))
+        plugin.process(event(8))
+        assert plugin.batches == [[6, 7, 8], [6], [7]]
+        assert plugin.is_active() and plugin.is_paused(), "the failing event pauses the plugin"
+        assert plugin.state()[0] == 6, "events prior to the failing one are processed"
+
+    def test_failure_policy(self):
+        def resume():
+            plugin._resume_at = time.time() - 1
+            return plugin.next_unprocessed_event_id()
+        # end resume
+
+        plugin = FailingPlugin(Mock(), logging.getLogger('failure-test'))
+        plugin.set_event_id(10)
+        parked = list()
+        plugin.set_dead_letter_store(parked)
+
+        poison = self._event(11, 'raise')
+        plugin.process(poison)
+        assert plugin.is_active() and plugin.is_paused() and plugin.state()[0] == 10
+        assert plugin.next_unprocessed_event_id() is None, "paused plugins don't hold back other plugins"
+        for attempt in range(FailingPlugin.retry_attempts):
+            assert resume() == 11 and not plugin.is_paused(), "the failed event is retried once the pause is over"
+            plugin.process(poison)
+        # end for each retry
+        assert parked == [[poison]], "events failing too often are parked"
+        assert not plugin.is_paused() and plugin.state()[0] == 11 and plugin.failures() == 0
+
+        for attempt in range(FailingPlugin.circuit_failures + 1):
+            plugin.process(self._event(12, 'timeout'))
+            assert resume() == 12
+        # end for each transient failure
+        assert len(parked) == 1, "events failing with transient errors are never parked"
+
+        plugin.process(self._event(12, 'timeout'))
+        assert plugin._resume_at - time.time() > FailingPlugin.retry_max_delay, "the circuit is open"
+        resume()
+        plugin.process(self._event(12))
+        assert plugin.state()[0] == 12 and not plugin.is_paused() and plugin.failures() == 0, \
+               "a successful probe closes the circuit"
+
+# end class PluginTestCase
@@ -0,0 +1,87 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_pool
+@brief tests for sgevents.pool
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import time
+import socket
+import threading
+
+from .base import EventsTestCase
+
+from mock import Mock
+
+from sgevents.pool import *
+
+
+class PoolTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def test_pool(self):
+        pool = ShotgunConnectionPool(Mock, 2, socket_timeout=5, check_idle_after=0)
+        first = pool.acquire('session')
+        first.set_session_uuid.assert_called_once_with('session')
+        assert first.config.timeout_secs == 5, "timeout is set per connection"
+        second = pool.acquire()
+        assert first is not second
+        self.failUnlessRaises(ConnectionPoolError, pool.acquire, timeout=0.01)
+
+        # a waiting lease gets the next released connection
+        leased = list()
+        waiter = threading.Thread(target=lambda: leased.append(pool.acquire()))
+        waiter.start()
+        while pool.stats()['waits'] < 2:
+            time.sleep(0.001)
+        # end wait for waiter to block
+        pool.release(second)
+        waiter.join()
+        assert leased == [second]
+        stats = pool.stats()
+        assert stats['leased'] == 2 and stats['idle'] == 0 and stats['peak_leased'] == 2
+        assert stats['waits'] == 2 and stats['created'] == 2 and stats['leases'] == 3
+
+        # broken connections are replaced
+        pool.release(first, broken=True)
+        assert pool.stats()['discarded'] == 1
+        third = pool.acquire()
+        assert third is not first and third is not second
+
+        # idle connections are checked before reuse
+        third.info.side_effect = socket.error("connection reset")
+        pool.release(third)
+        fourth = pool.acquire()
+        assert fourth is not third
+        assert pool.stats()['discarded'] == 2
+
+    def test_pooled_connection(self):
+        pool = ShotgunConnectionPool(Mock, 1)
+        conn = PooledShotgunConnection(pool)
+        conn.set_session_uuid('session')
+        assert not conn.is_leased(), "setting the session doesn't lease"
+        conn.find('Shot', [])
+        assert conn.is_leased()
+        leased = pool.stats()
+        assert leased['leased'] == 1
+        conn.find_one('Shot', [])
+        assert pool.stats()['leases'] == 1, "the connection is kept until released"
+        conn.release()
+        assert pool.stats()['idle'] == 1
+
+        conn.find('Shot', [])
+        assert conn._connection.set_session_uuid.call_args[0] == ('session', )
+        conn._connection.find.side_effect = socket.error("broken pipe")
+        self.failUnlessRaises(socket.error, conn.find, 'Shot', [])
+        assert not conn.is_leased(), "broken connections are released right away"
+        stats = pool.stats()
+        assert stats['discarded'] == 1 and stats['idle'] == 0 and stats['leased'] == 0
+
+        conn = PooledShotgunConnection(pool, keep_lease=False)
+        conn.find('Shot', [])
+        assert not conn.is_leased() and pool.stats()['idle'] == 1, "the connection is returned after each call"
+
+# end class PoolTestCase
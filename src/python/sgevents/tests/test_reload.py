@@ -0,0 +1,102 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_reload
+@brief tests for sgevents.reload
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import os
+import imp
+import sys
+
+from .base import (EventsTestCase,
+                   with_plugin_application)
+
+from butility.tests import with_rw_directory
+
+from sgevents.reload import *
+from sgevents.scheduler import PollScheduler
+from sgevents.benchmark import (InMemoryShotgunConnection,
+                                BenchmarkEventEngine,
+                                synthetic_events)
+
+
+PLUGIN_SOURCE = """
+import bapp
+from sgevents import EventEnginePlugin
+
+class ReloadablePlugin(EventEnginePlugin, bapp.plugin_type()):
+    __slots__ = ()
+
+    version = %i
+    event_filters = {'*' : list()}
+
+    def handle_event(self, shotgun, log, event):
+        pass
+"""
+
+
+class ReloadTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def _write_module(self, path, version):
+        """Write the plugin module with the given version, making sure its modification time changes"""
+        fh = open(path, 'w')
+        fh.write(PLUGIN_SOURCE % version)
+        fh.close()
+        mtime = version * 10
+        os.utime(path, (mtime, mtime))
+
+    @with_plugin_application
+    @with_rw_directory
+    def test_reload(self, rw_dir):
+        module_name = 'sgevents_test_reloadable_plugin'
+        path = rw_dir / 'reloadable.py'
+        self._write_module(path, 1)
+        module = imp.load_source(module_name, path)
+        try:
+            watcher = PluginModuleWatcher()
+            watcher.watch([module.ReloadablePlugin])
+            assert watcher.modules() == [module_name]
+            assert not watcher.changed()
+
+            events = synthetic_events(50)
+            overrides = {('reload', 'enabled') : True,
+                         ('event-journal-file', ) : rw_dir / 'journal'}
+            engine = BenchmarkEventEngine(overrides, InMemoryShotgunConnection(events))
+            engine._scheduler = PollScheduler(0)
+            plugins = [plugin for plugin in engine._iter_plugins() if type(plugin).__name__ == 'ReloadablePlugin']
+            assert len(plugins) == 1
+            plugin = plugins[0]
+            plugin.set_event_id(events[0]['id'] - 1)
+            engine._process_events()
+            assert plugin._last_event_id == events[-1]['id']
+
+            self._write_module(path, 2)
+            assert watcher.changed() == [module_name]
+            assert not watcher.changed(), "changes are reported once"
+
+            engine._last_reload_check = 0
+            engine._process_events()
+            plugins = [p for p in engine._iter_plugins() if type(p).__name__ == 'ReloadablePlugin']
+            assert len(plugins) == 1 and plugins[0] is not plugin
+            assert plugins[0].version == 2 and module.ReloadablePlugin.version == 2
+            assert plugins[0].state() == plugin.state(), "the new instance continues where the old one stopped"
+
+            # broken modules keep the previous plugin
+            fh = open(path, 'w')
+            fh.write('raise ImportError("broken")')
+            fh.close()
+            os.utime(path, (30, 30))
+            engine._last_reload_check = 0
+            engine._process_events()
+            assert [p for p in engine._iter_plugins() if type(p).__name__ == 'ReloadablePlugin'] == plugins[:1]
+            engine._shutdown()
+        finally:
+            del sys.modules[module_name]
+        # end assure module is gone
+
+# end class ReloadTestCase
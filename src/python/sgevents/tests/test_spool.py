@@ -0,0 +1,109 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_spool
+@brief tests for sgevents.spool and sgevents.replay
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import os
+
+from .base import (EventsTestCase,
+                   with_plugin_application)
+
+from butility.tests import with_rw_directory
+
+from sgevents.spool import *
+from sgevents.replay import *
+from sgevents.benchmark import synthetic_events
+from sgevents.utility import EventEngineError
+
+
+class SpoolTestCase(EventsTestCase):
+    __slots__ = ()
+
+    @with_rw_directory
+    def test_spool(self, rw_dir):
+        events = synthetic_events(100, backlog=10)
+        spool_dir = rw_dir / 'spool'
+        spool = EventSpool(spool_dir, segment_size=1024)
+        assert spool.append(events[10:]) == 90
+        assert spool.append(events[:20]) == 10, "known events are ignored, and older ones may be added"
+        assert len(spool) == 100
+        assert len([name for name in os.listdir(spool_dir) if name.endswith('.data')]) > 1, "segments rotate"
+        assert list(spool.read()) == events
+        assert spool.ids(events[5]['id'], events[9]['id']) == [event['id'] for event in events[5:10]]
+        assert not spool.ids(last_id=events[0]['id'] - 1)
+        spool.close()
+
+        spool = EventSpool(spool_dir, segment_size=1024)
+        assert len(spool) == 100 and all(entry[4] is None for entry in spool._segments), \
+               "only the ranges of complete segments are kept in memory"
+        assert events[50]['id'] in spool and events[-1]['id'] + 1 not in spool
+        assert list(spool.read(events[40]['id'], events[59]['id'])) == events[40:60]
+        assert spool.append(events) == 0
+        spool.close()
+
+        # the oldest segments are deleted
+        spool_dir = rw_dir / 'retention'
+        spool = EventSpool(spool_dir, segment_size=1024, max_segments=2)
+        spool.append(events)
+        assert len([name for name in os.listdir(spool_dir) if name.endswith('.data')]) == 2
+        assert 0 < len(spool) < len(events)
+        assert list(spool.read()) == events[-len(spool):]
+        spool.close()
+
+        # a truncated record is skipped after reopening
+        spool_dir = rw_dir / 'truncated'
+        spool = EventSpool(spool_dir)
+        spool.append(events)
+        spool.close()
+        path = spool_dir / [name for name in os.listdir(spool_dir) if name.endswith('.data')][0]
+        fh = open(path, 'r+b')
+        fh.truncate(os.path.getsize(path) - 1)
+        fh.close()
+        spool = EventSpool(spool_dir)
+        assert list(spool.read()) == events[:-1]
+        assert events[-1]['id'] in spool, "the index still knows the event"
+        spool.close()
+
+    @with_rw_directory
+    def test_recordings(self, rw_dir):
+        import yaml
+        events = synthetic_events(20)
+        yaml_dir = rw_dir / 'yaml'
+        os.makedirs(yaml_dir)
+        for event in events[:10]:
+            fh = open(yaml_dir / ('%i.yaml' % event['id']), 'wb')
+            yaml.dump(event, fh)
+            fh.close()
+        # end for each event to record as yaml
+        assert recorded_events(yaml_dir) == events[:10]
+
+        spool = EventSpool(rw_dir / 'segments')
+        assert convert_yaml_events(yaml_dir, spool) == 10
+        spool.append(events[10:], flush=False)
+        assert len(list(spool.read())) == 10, "buffered events can't be read yet"
+        spool.sync()
+        assert list(spool.read()) == events
+        spool.close()
+        assert recorded_events(rw_dir / 'segments') == events
+
+    @with_plugin_application
+    @with_rw_directory
+    def test_replay(self, rw_dir):
+        events = synthetic_events(120, backlog=3)
+        spool = EventSpool(rw_dir / 'spool')
+        spool.append(events)
+
+        res = replay_events(spool, events[10]['id'], events[-1]['id'], page_size=25)
+        assert res['events'] == 110 and res['first_id'] == events[10]['id']
+        assert res['plugins'] and not res['inactive']
+        assert res['polls'] >= 110 // 25
+
+        self.failUnlessRaises(EventEngineError, replay_events, spool, events[-1]['id'] + 1)
+        self.failUnlessRaises(EventEngineError, replay_events, spool, plugin_names=['not-loaded'])
+
+# end class SpoolTestCase
@@ -0,0 +1,66 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_startup
+@brief tests for sgevents.startup and the lazy exports of the sgevents package
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import os
+import sys
+import time
+import subprocess
+from cStringIO import StringIO
+
+from .base import EventsTestCase
+
+import sgevents
+from sgevents.startup import *
+
+
+class StartupTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def test_lazy_exports(self):
+        for module_name, names in sgevents._exports.items():
+            module = __import__('sgevents.%s' % module_name, fromlist=['__all__'])
+            assert sorted(names) == sorted(module.__all__), "exports of '%s' are out of date" % module_name
+            for name in names:
+                assert getattr(sgevents, name) is getattr(module, name)
+            # end for each name
+        # end for each submodule
+        self.failUnlessRaises(AttributeError, getattr, sgevents, 'foo')
+
+        code = "import sys, sgevents; from sgevents import ShotgunEventEngineCommand; "
+        code += "sys.exit('sgevents.engine' in sys.modules)"
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        assert subprocess.call([sys.executable, '-c', code], env=env) == 0, \
+               "the engine is only imported once it is used"
+
+        # our plugins are loaded by every invocation of the commandline, which doesn't always run the engine
+        plugin_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'plugins')
+        code = "import sys, bapp\n"
+        code += "from butility import load_files\n"
+        code += "def raiser(py_file, mod_name):\n"
+        code += "    raise AssertionError('loading of plugin %s failed' % py_file)\n"
+        code += "bapp.Application.new()\n"
+        code += "assert load_files(%r, on_error=raiser)\n" % plugin_path
+        code += "sys.exit('sgevents.engine' in sys.modules or 'sgevents.pool' in sys.modules)\n"
+        assert subprocess.call([sys.executable, '-c', code], env=env) == 0, \
+               "loading our plugins imports neither the engine nor the connection pool"
+
+    def test_profile(self):
+        profile = StartupProfile()
+        assert profile.run('sleep', time.sleep, 0.01) is None
+        assert profile.run('import', __import__, 'sgevents.spool', fromlist=['EventSpool']).EventSpool
+        assert [name for name, seconds, num_modules in profile.phases()] == ['sleep', 'import']
+        assert profile.phases()[0][1] >= 0.01
+
+        buf = StringIO()
+        profile.write_report(buf)
+        report = buf.getvalue()
+        assert report.startswith('Startup took') and 'sleep' in report and 'cumulative' in report
+
+# end class StartupTestCase
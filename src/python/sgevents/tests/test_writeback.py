@@ -0,0 +1,160 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.tests.test_writeback
+@brief tests for sgevents.writeback
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = []
+
+import socket
+import logging
+
+from .base import EventsTestCase
+
+from butility import DictObject
+from mock import Mock
+from shotgun_api3 import Fault
+
+from sgevents import EventEnginePlugin
+from sgevents.writeback import *
+
+
+class WritingPlugin(EventEnginePlugin):
+    """Updates the entity of each event"""
+    __slots__ = ()
+
+    event_filters = dict()
+    write_batch_size = 3
+
+    @classmethod
+    def plugin_name(cls):
+        return cls.__name__
+
+    def handle_event(self, shotgun, log, event):
+        assert shotgun.update('Shot', event.entity['id'], dict(code=event.meta)) is None, "changes are buffered"
+
+# end class WritingPlugin
+
+
+class WriteBackTestCase(EventsTestCase):
+    __slots__ = ()
+
+    def test_buffer(self):
+        def batch(requests):
+            if any(request.get('entity_id') == 'bad' for request in requests):
+                raise Fault("bad entity")
+            # end fail on demand
+        # end batch
+        conn = Mock()
+        conn.batch = Mock(side_effect=batch)
+        buf = ShotgunWriteBuffer(conn, batch_size=2)
+
+        buf.set_event_id(1)
+        buf.create('Shot', dict(code='a'))
+        buf.update('Shot', 1, dict(code='b'))
+        buf.set_session_uuid('other')
+        buf.set_event_id(2)
+        buf.delete('Shot', 2)
+        buf.set_event_id(3)
+        buf.update('Shot', 3, dict(code='c'))
+        buf.discard(3)
+        assert len(buf) == 3 and conn.batch.call_count == 0
+
+        assert buf.flush() == []
+        assert len(buf) == 0
+        assert [len(args[0][0]) for args in conn.batch.call_args_list] == [2, 1], \
+                "batches are split by size and session"
+        assert conn.set_session_uuid.call_args_list[-1][0][0] == 'other'
+
+        conn.batch.reset_mock()
+        buf = ShotgunWriteBuffer(conn, batch_size=3)
+        buf.set_event_id(4)
+        buf.update('Shot', 4, dict())
+        buf.update('Shot', 'bad', dict())
+        buf.set_event_id(5)
+        buf.update('Shot', 5, dict())
+        failures = buf.flush()
+        assert [failure.event_id for failure in failures] == [4, 4] and 'bad entity' in str(failures[0])
+        assert conn.batch.call_count == 3, "rejected batches are retried event by event"
+
+        conn.batch = Mock(side_effect=socket.error("timed out"))
+        buf = ShotgunWriteBuffer(conn, batch_size=1)
+        buf.set_event_id(6)
+        buf.create('Shot', dict(code='d'))
+        buf.update('Shot', 6, dict(code='e'))
+        buf.set_event_id(7)
+        buf.delete('Shot', 7)
+        failures = buf.flush()
+        assert [failure.event_id for failure in failures] == [6, 6, 7]
+        assert len(conn.batch.call_args[0][0]) == 2, "the changes of an event are sent together"
+        assert conn.batch.call_count == 1, "batches which may have been written are not sent again"
+
+    def test_plugin(self):
+        conn = Mock()
+        plugin = WritingPlugin(conn, logging.getLogger('writeback-test'))
+        plugin.set_event_id(0)
+
+        def event(eid):
+            return DictObject(dict(id=eid, event_type='Shotgun_Shot_Change', attribute_name='code',
+                                   session_uuid=None, meta='x', entity=dict(type='Shot', id=eid)))
+        # end event
+
+        plugin.process(event(1))
+        plugin.process(event(2))
+        assert conn.batch.call_count == 0
+        assert plugin.state()[0] == 0, "events count as processed once their changes are written"
+        assert plugin.process(event(3))
+        assert conn.batch.call_count == 1, "full batches are flushed"
+        assert plugin.state()[0] == 3 and not plugin.state()[1]
+
+        plugin.process(event(4))
+        plugin.flush_writes()
+        assert conn.batch.call_count == 2 and plugin.state()[0] == 4
+
+        conn.batch = Mock(side_effect=ValueError)
+        plugin.process(event(5))
+        plugin.process(event(6))
+        plugin.flush_writes()
+        assert plugin.is_active() and plugin.is_paused(), "failed writes pause the plugin"
+        assert plugin.state()[0] == 4, "events whose changes were not written are not processed"
+
+    def test_partial_failure(self):
+        written = list()
+
+        def batch(requests):
+            if any(request['entity_id'] == 5 for request in requests):
+                raise Fault("bad entity")
+            # end fail on demand
+            written.extend(request['entity_id'] for request in requests)
+        # end batch
+        conn = Mock()
+        conn.batch = Mock(side_effect=batch)
+        plugin = WritingPlugin(conn, logging.getLogger('writeback-test'))
+        plugin.set_event_id(4)
+
+        def event(eid):
+            return DictObject(dict(id=eid, event_type='Shotgun_Shot_Change', attribute_name='code',
+                                   session_uuid=None, meta='x', entity=dict(type='Shot', id=eid)))
+        # end event
+
+        plugin.process(event(5))
+        plugin.process(event(6))
+        plugin.flush_writes()
+        assert written == [6] and plugin.is_paused()
+        assert plugin.state()[0] == 4 and not plugin.state()[1], "we don't advance past the failed event"
+        assert not plugin._is_pending(6) and plugin._is_pending(5)
+
+        plugin._resume_at = 0
+        assert plugin.next_unprocessed_event_id() == 5, "the failed event is fetched again"
+        conn.batch = Mock(side_effect=lambda requests: written.extend(request['entity_id'] 
+                                                                      for request in requests))
+        plugin.process(event(5))
+        plugin.process(event(6))
+        assert plugin.state()[0] == 4, "event 6 waits for the changes of event 5"
+        plugin.flush_writes()
+        assert written == [6, 5], "event 5 is retried, and the changes of event 6 are not written again"
+        assert plugin.state()[0] == 6 and not plugin.state()[1] and not plugin.is_paused()
+
+# end class WriteBackTestCase
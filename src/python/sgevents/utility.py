@@ -6,9 +6,14 @@
 @author Sebastian Thiel
 @copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
 """
-__all__ = ['CustomSMTPHandler', 'set_file_path_on_logger', 'set_emails_on_logger', 'EventEngineError']
+__all__ = ['CustomSMTPHandler', 'DigestSMTPHandler', 'set_file_path_on_logger', 'set_emails_on_logger', 
+           'EventEngineError']
 
+import time
+import smtplib
 import logging
+import logging.handlers
+from email.utils import formatdate
 
 from butility import (Path,
                       Error)
@@ -27,9 +32,125 @@ engine_schema = KeyValueStoreSchema('shotgun-events-engine', {'connection' : {
                                                                     'retries' : 5,
                                                                     'retry-every': FrequencyStringAsSeconds('60s')},
                                                               'poll-every' : FrequencyStringAsSeconds('60s'),
+                                                              'polling' : {
+                                                                    # if True, poll-every is the longest interval,
+                                                                    # reached only if there were no events for a while
+                                                                    'adaptive' : False,
+                                                                    # interval while there are many events
+                                                                    'busy-interval-ms' : 250,
+                                                                    # factor to grow the interval by while idle
+                                                                    'backoff-factor' : 2.0,
+                                                                    # events per poll at which to poll every busy-interval
+                                                                    'busy-threshold' : 10},
+                                                              'fetch' : {
+                                                                    # amount of events to fetch per query, 0 means unbounded
+                                                                    'page-size' : 500,
+                                                                    # maximum amount of fetched events waiting for dispatch
+                                                                    'max-in-flight' : 5000,
+                                                                    # if True, the next page is fetched while the current one is dispatched
+                                                                    'prefetch' : False,
+                                                                    # if True, only events matching the filters of
+                                                                    # active plugins are fetched
+                                                                    'server-side-filtering' : False,
+                                                                    # if True, the meta field is fetched in a separate
+                                                                    # query, only for events accepted by a plugin
+                                                                    # which requires it
+                                                                    'lazy-meta' : False},
                                                               'socket-timeout' : FrequencyStringAsSeconds('60s'),
+                                                              'connection-pool' : {
+                                                                    # if not 0, the engine and its plugins lease up to
+                                                                    # this amount of shotgun connections from a pool
+                                                                    'size' : 0,
+                                                                    # idle connections are checked before reuse
+                                                                    'check-idle-after' : FrequencyStringAsSeconds('60s'),
+                                                                    # time to wait for a free connection
+                                                                    'lease-timeout' : FrequencyStringAsSeconds('60s')},
+                                                              'dispatch' : {
+                                                                    # amount of threads dispatching events to plugins,
+                                                                    # 0 dispatches serially in the engine thread
+                                                                    'threads' : 0,
+                                                                    # events queued per plugin before fetching blocks
+                                                                    'max-queue-depth' : 1000},
+                                                              'cache' : {
+                                                                    # if True, plugins share the results of identical
+                                                                    # queries made while handling a page of events
+                                                                    'enabled' : False,
+                                                                    # if True, entities of events are fetched in bulk,
+                                                                    # with the prefetch_fields of interested plugins
+                                                                    'prefetch' : True},
+                                                              'reload' : {
+                                                                    # if True, plugins are replaced by new instances
+                                                                    # once the module defining them changed
+                                                                    'enabled' : False,
+                                                                    'check-every' : FrequencyStringAsSeconds('5s')},
+                                                              'spool' : {
+                                                                    # if set, all fetched events are appended to
+                                                                    # segments in this directory, see 'replay'
+                                                                    'directory' : Path,
+                                                                    # bytes after which a new segment is started
+                                                                    'segment-size' : 64 * 1024 * 1024,
+                                                                    # amount of segments to keep, the oldest
+                                                                    # ones are deleted. 0 keeps all of them
+                                                                    'max-segments' : 0},
+                                                              'dead-letter' : {
+                                                                    # if set, events plugins gave up on are kept in
+                                                                    # a spool per plugin in this directory, see 
+                                                                    # 'replay'
+                                                                    'directory' : Path,
+                                                                    'segment-size' : 64 * 1024 * 1024},
+                                                              'cluster' : {
+                                                                    # if set, engines sharing this lease database
+                                                                    # split the plugins between them. They must
+                                                                    # share an sqlite journal as well
+                                                                    'lease-store' : Path,
+                                                                    # unique name of this engine, host:pid by default
+                                                                    'node-id' : '',
+                                                                    # plugins of a node fail over once it didn't
+                                                                    # renew its leases for this long
+                                                                    'lease-ttl' : FrequencyStringAsSeconds('30s')},
+                                                              'lanes' : {
+                                                                    # names of plugins to put into a lane, 
+                                                                    # regardless of their priority, and the 
+                                                                    # amount of pages a lane may fetch per poll,
+                                                                    # 0 means unbounded. A throttled lane 
+                                                                    # continues with the next poll, right away
+                                                                    'interactive' : {
+                                                                        'plugins' : StringList,
+                                                                        'max-pages-per-poll' : 0},
+                                                                    'normal' : {
+                                                                        'plugins' : StringList,
+                                                                        'max-pages-per-poll' : 10},
+                                                                    'bulk' : {
+                                                                        'plugins' : StringList,
+                                                                        'max-pages-per-poll' : 10}},
+                                                              'process-isolation' : {
+                                                                    # names of plugins to run in their own process
+                                                                    'plugins' : StringList},
+                                                              'metrics' : {
+                                                                    # port to serve metrics on in prometheus text
+                                                                    # format, 0 disables the server
+                                                                    'http-port' : 0,
+                                                                    'http-host' : 'localhost',
+                                                                    # if set, metrics are written to it as json
+                                                                    'snapshot-file' : Path,
+                                                                    'snapshot-every' : FrequencyStringAsSeconds('60s')},
                                                               'event-journal-file' : Path,
+                                                              'journal' : {
+                                                                    # one of 'pickle', 'wal' or 'sqlite'
+                                                                    'type' : 'pickle',
+                                                                    # commit after the given amount of events
+                                                                    'commit-every-events' : 1,
+                                                                    # if not 0, commit if the last one is longer ago
+                                                                    'commit-every' : FrequencyStringAsSeconds('0s'),
+                                                                    # amount of records after which to compact the wal
+                                                                    'compact-every' : 10000},
                                                               'logging' : {
+                                                                        # if True, log handlers run on a 
+                                                                        # background thread
+                                                                        'asynchronous' : True,
+                                                                        # records waiting for the background 
+                                                                        # thread, more are dropped
+                                                                        'queue-size' : 10000,
                                                                         'one-file-per-plugin' : True,
                                                                         'plugin-log-tree' : Path,
                                                                         'path' : Path,
@@ -39,7 +160,14 @@ engine_schema = KeyValueStoreSchema('shotgun-events-engine', {'connection' : {
                                                                             'subject' : str,
                                                                             'to' : StringList,
                                                                             'username' : str,
-                                                                            'password' : str
+                                                                            'password' : str,
+                                                                            # errors are collected for this long,
+                                                                            # and sent in one email. Repeated 
+                                                                            # ones are sent once, with a count
+                                                                            'digest-every' : FrequencyStringAsSeconds('300s'),
+                                                                            # critical errors are sent right
+                                                                            # away, but not more often than this
+                                                                            'alert-every' : FrequencyStringAsSeconds('60s')
                                                                         } # end emails
                                                                     }# end logging
                                                              })
@@ -53,23 +181,29 @@ engine_schema = KeyValueStoreSchema('shotgun-events-engine', {'connection' : {
 # ------------------------------------------------------------------------------
 ## @{
 
-def set_file_path_on_logger(logger, path):
+def set_file_path_on_logger(logger, path, log_queue=None):
+    """Have the given logger write to a file at the given path, which is rotated daily
+    @param log_queue if not None, a LogQueue whose thread is to write the file"""
     # Remove any previous handler.
     remove_handlers_from_logger(logger, logging.handlers.TimedRotatingFileHandler)
 
     # Add the file handler
     handler = logging.handlers.TimedRotatingFileHandler(path, 'midnight', backupCount=10)
     handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    if log_queue is not None:
+        handler = log_queue.wrap(handler)
+    # end write file in background
     logger.addHandler(handler)
 
-def set_emails_on_logger(logger, settings, emails):
+def set_emails_on_logger(logger, settings, emails, log_queue=None):
     """Configures a logger to either receive emails or not. In any case, existing handlers will be removed
     @param logger 
     @param settings obtained from EventEngine.settings_value().logging.email
     @param emails either True, False, or a list of e-mail to addresses to send emails to.
     If False, existing smtp handlers will be removed. If True, e-email to addresses will be reset to the 
     ones configured for the engine.
-    Otherwise it is expected to be a list or tuple of e-mail to-addresses."""
+    Otherwise it is expected to be a list or tuple of e-mail to-addresses.
+    @param log_queue if not None, a LogQueue whose thread is to send the emails"""
     if emails is False:
         return
 
@@ -90,8 +224,10 @@ def set_emails_on_logger(logger, settings, emails):
 
     # Configure the logger for email output
     remove_handlers_from_logger(logger, logging.handlers.SMTPHandler)
-    CustomSMTPHandler.add_to_logger(logger, settings['host'], settings['from'], 
-                                    to_addrs, settings.subject, username, password)
+    DigestSMTPHandler.add_to_logger(logger, settings['host'], settings['from'], 
+                                    to_addrs, settings.subject, username, password, log_queue,
+                                    digest_every=settings['digest-every'].seconds,
+                                    alert_every=settings['alert-every'].seconds)
     # end 
 
 def remove_handlers_from_logger(logger, handlerTypes=None):
@@ -106,8 +242,10 @@ def remove_handlers_from_logger(logger, handlerTypes=None):
     
         I{list}/I{tuple} of logging.Handler subclasses.
     """
-    for handler in logger.handlers:
-        if handlerTypes is None or isinstance(handler, handlerTypes):
+    for handler in list(logger.handlers):
+        # handlers running in the background are identified by their target
+        target = getattr(handler, 'target', handler)
+        if handlerTypes is None or isinstance(target, handlerTypes):
             logger.removeHandler(handler)
     # end for each handler
 
@@ -162,7 +300,8 @@ Line: %(lineno)d
     # @{
 
     @classmethod
-    def add_to_logger(cls, logger, smtp_host, from_addr, to_addr, email_subject, username=None, password=None):
+    def add_to_logger(cls, logger, smtp_host, from_addr, to_addr, email_subject, username=None, password=None,
+                      log_queue=None, **kwargs):
         """
         Configure a logger with a handler that sends emails to specified
         addresses.
@@ -172,21 +311,174 @@ Line: %(lineno)d
         @note: Any SMTPHandler already connected to the logger will be removed.
         @param logger The logger to configure
         @param to_addr The addresses to send the email to.
+        @param log_queue if not None, a LogQueue whose thread is to send the emails
+        @param kwargs passed to our constructor
         """
         if username and password:
-            mailHandler = cls(smtp_host, from_addr, to_addr, email_subject, (username, password))
+            mailHandler = cls(smtp_host, from_addr, to_addr, email_subject, (username, password), **kwargs)
         else:
-            mailHandler = cls(smtp_host, from_addr, to_addr, email_subject)
+            mailHandler = cls(smtp_host, from_addr, to_addr, email_subject, **kwargs)
         # end use credentials
 
         mailHandler.setLevel(logging.ERROR)
         mailFormatter = logging.Formatter(cls.EMAIL_FORMAT_STRING)
         mailHandler.setFormatter(mailFormatter)
 
+        if log_queue is not None:
+            mailHandler = log_queue.wrap(mailHandler)
+        # end send emails in background
         logger.addHandler(mailHandler)
 
     
     ## -- End Subclass Interface -- @}
 
+# end class CustomSMTPHandler
+
+
+class DigestSMTPHandler(CustomSMTPHandler):
+    """
+    Collects records for a while, and sends them in a single email. Records logged repeatedly from the same
+    place are sent once, along with the amount of times they were logged.
+
+    Collected records are sent once digest_every elapsed, when a record is handled, or when we are flushed,
+    and when we are closed. A CRITICAL record is sent right away, along with all collected ones, as nothing
+    may handle or flush records for a long time after it. To not flood inboxes, there is at least alert_every
+    between such emails, and CRITICAL records logged from a place which was sent less than digest_every ago
+    wait for the next digest.
+    """
+
+    SEPARATOR = '\n\n' + '-' * 80 + '\n\n'
+
+    def __init__(self, mailhost, fromaddr, toaddrs, subject, credentials=None, digest_every=5 * 60,
+                 alert_every=60):
+        """Initialize this instance like an SMTPHandler
+        @param digest_every seconds to collect records for before sending them, 0 sends them right away
+        @param alert_every minimum amount of seconds between emails sent early because of CRITICAL records"""
+        CustomSMTPHandler.__init__(self, mailhost, fromaddr, toaddrs, subject, credentials)
+        self.digest_every = digest_every
+        self.alert_every = alert_every
+        # (levelno, pathname, lineno): [first record, count, time of last record]
+        self._digest = dict()
+        self._digest_order = list()
+        self._digest_started_at = None
+        self._last_sent_at = None
+        # (levelno, pathname, lineno) of CRITICAL records: time they were sent last
+        self._alerted = dict()
+        # if True, we collected a CRITICAL record which is to be sent once alert_every elapsed
+        self._alert_pending = False
+
+    def _is_digest_due(self):
+        """@return True if the records we collected are to be sent"""
+        if self._digest_started_at is None:
+            return False
+        # end bail out if there is nothing to send
+        now = time.time()
+        return (now - self._digest_started_at >= self.digest_every or
+                (self._alert_pending and now - self._last_sent_at >= self.alert_every))
+
+    def _is_alert(self, key):
+        """@return True if a record of the given key should be sent before the digest is due"""
+        if key[0] < logging.CRITICAL:
+            return False
+        # end ignore less severe records
+        now = time.time()
+        if now - self._alerted.get(key, now - self.digest_every) < self.digest_every:
+            return False
+        # end let repetitions wait for the digest
+        if self._last_sent_at is not None and now - self._last_sent_at < self.alert_every:
+            self._alert_pending = True
+            return False
+        # end throttle alerts
+        return True
+
+    def _send_digest(self):
+        """Send all collected records in one email, and start a new digest"""
+        if not self._digest:
+            return
+        # end bail out if there is nothing to send
+        entries = [self._digest[key] for key in self._digest_order]
+        self._last_sent_at = time.time()
+        for key in self._digest_order:
+            if key[0] >= logging.CRITICAL:
+                self._alerted[key] = self._last_sent_at
+            # end remember sent alerts
+        # end for each key
+        self._digest = dict()
+        self._digest_order = list()
+        self._digest_started_at = None
+        self._alert_pending = False
+
+        top_record = max(entries, key=lambda entry: entry[0].levelno)[0]
+        try:
+            parts = list()
+            for record, count, last_time in entries:
+                text = self.format(record)
+                if count > 1:
+                    text += '\n\n(logged %i times, last at %s)' % (count, time.ctime(last_time))
+                # end mention repetitions
+                parts.append(text)
+            # end for each entry
+            subject = self.subject
+            if top_record.levelno in self.LEVEL_SUBJECTS:
+                subject += ' ' + self.LEVEL_SUBJECTS[top_record.levelno]
+            # end adjust subject
+            if len(entries) > 1:
+                subject += ' (%i errors)' % len(entries)
+            # end mention amount of errors
+
+            smtp = smtplib.SMTP(self.mailhost, self.mailport or smtplib.SMTP_PORT)
+            msg = "From: %s\r\nTo: %s\r\nSubject: %s\r\nDate: %s\r\n\r\n%s" % (
+                        self.fromaddr, ','.join(self.toaddrs), subject, formatdate(), self.SEPARATOR.join(parts))
+            if self.username:
+                smtp.login(self.username, self.password)
+            # end handle credentials
+            smtp.sendmail(self.fromaddr, self.toaddrs, msg)
+            smtp.quit()
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(top_record)
+        # end handle errors like logging does
+
+    def emit(self, record):
+        """Collect the given record, and send all collected ones if it is time"""
+        key = (record.levelno, record.pathname, record.lineno)
+        entry = self._digest.get(key)
+        if entry is None:
+            self._digest[key] = [record, 1, record.created]
+            self._digest_order.append(key)
+        else:
+            entry[1] += 1
+            entry[2] = record.created
+        # end collect record
+        if self._digest_started_at is None:
+            self._digest_started_at = time.time()
+        # end start digest
+        if not self.digest_every or self._is_alert(key) or self._is_digest_due():
+            self._send_digest()
+        # end send if due
+
+    def flush(self):
+        """Send collected records if digest_every elapsed"""
+        self.acquire()
+        try:
+            if self._is_digest_due():
+                self._send_digest()
+            # end send if due
+        finally:
+            self.release()
+        # end assure lock is released
+
+    def close(self):
+        """Send all collected records, and close this handler"""
+        self.acquire()
+        try:
+            self._send_digest()
+        finally:
+            self.release()
+        # end assure lock is released
+        CustomSMTPHandler.close(self)
+
+# end class DigestSMTPHandler
 
 ## -- End Types -- @}
@@ -0,0 +1,191 @@
+#-*-coding:utf-8-*-
+"""
+@package sgevents.writeback
+@brief Collects changes made by plugins, and sends them to shotgun in batches
+
+@author Sebastian Thiel
+@copyright [MIT License](http://www.opensource.org/licenses/mit-license.php)
+"""
+__all__ = ['ShotgunWriteBuffer', 'WriteFailure']
+
+import logging
+
+
+# ==============================================================================
+## @name Types
+# ------------------------------------------------------------------------------
+## @{
+
+class WriteFailure(object):
+    """Describes a change which could not be written"""
+    __slots__ = ('event_id',  # id of the event whose handling made the change
+                 'request',   # the batch request, as dict
+                 'error'      # the exception raised when writing it
+                 )
+
+    def __init__(self, event_id, request, error):
+        self.event_id = event_id
+        self.request = request
+        self.error = error
+
+    def __str__(self):
+        return "%s of %s %s failed: %s" % (self.request['request_type'], self.request['entity_type'],
+                                           self.request.get('entity_id', ''), self.error)
+
+# end class WriteFailure
+
+
+class ShotgunWriteBuffer(object):
+    """A shotgun connection facade which keeps create(), update() and delete() calls until flush() is called.
+
+    Changes are sent using shotgun's batch() call, with up to batch_size changes per request. The changes made
+    for one event are always sent in the same batch, which is a transaction, so they are written entirely or
+    not at all. If shotgun rejects a batch, its events are sent one by one to find out which of them failed.
+    All other methods are passed on to the wrapped connection.
+    @note buffered calls return None, instead of the created or updated entity
+    """
+    __slots__ = ('_connection',
+                 '_batch_size',
+                 '_log',
+                 '_requests',
+                 '_event_id',
+                 '_session_uuid')
+
+    def __init__(self, connection, batch_size=100, log=None):
+        """Initialize this instance
+        @param connection the shotgun connection to write with
+        @param batch_size maximum amount of changes to send per batch() call, unless a single event made more"""
+        self._connection = connection
+        self._batch_size = max(1, batch_size)
+        self._log = log or logging.getLogger(__name__)
+        self._requests = list()
+        self._event_id = None
+        self._session_uuid = None
+
+    def __getattr__(self, name):
+        if name == '_connection':
+            raise AttributeError(name)
+        # end prevent recursion if we are not initialized
+        return getattr(self._connection, name)
+
+    def __len__(self):
+        """@return amount of buffered changes"""
+        return len(self._requests)
+
+    def _add(self, request):
+        self._requests.append((self._event_id, self._session_uuid, request))
+
+    def _batches(self, requests):
+        """@return list of batches of the given (event_id, session_uuid, request) items. Each batch is a list of 
+        (event_id, session_uuid, requests) tuples, one per event, with all changes made for it. Only events 
+        sharing a session uuid are put into the same batch"""
+        events = list()
+        for event_id, session_uuid, request in requests:
+            if events and events[-1][:2] == (event_id, session_uuid):
+                events[-1][2].append(request)
+            else:
+                events.append((event_id, session_uuid, [request]))
+            # end group changes by event
+        # end for each request
+
+        batches = list()
+        num_changes = 0
+        for event in events:
+            if not batches or batches[-1][0][1] != event[1] or num_changes + len(event[2]) > self._batch_size:
+                batches.append(list())
+                num_changes = 0
+            # end start new batch
+            batches[-1].append(event)
+            num_changes += len(event[2])
+        # end for each event
+        return batches
+
+    # -------------------------
+    ## @name Shotgun Interface
+    # @{
+
+    def set_session_uuid(self, session_uuid):
+        """Use the given session uuid for all subsequent changes"""
+        self._session_uuid = session_uuid
+        self._connection.set_session_uuid(session_uuid)
+
+    def create(self, entity_type, data, return_fields=None):
+        request = dict(request_type='create', entity_type=entity_type, data=data)
+        if return_fields:
+            request['return_fields'] = return_fields
+        # end handle return fields
+        self._add(request)
+
+    def update(self, entity_type, entity_id, data, multi_entity_update_modes=None):
+        request = dict(request_type='update', entity_type=entity_type, entity_id=entity_id, data=data)
+        if multi_entity_update_modes:
+            request['multi_entity_update_modes'] = multi_entity_update_modes
+        # end handle update modes
+        self._add(request)
+
+    def delete(self, entity_type, entity_id):
+        self._add(dict(request_type='delete', entity_type=entity_type, entity_id=entity_id))
+
+    ## -- End Shotgun Interface -- @}
+
+    # -------------------------
+    ## @name Interface
+    # @{
+
+    def set_event_id(self, event_id):
+        """Associate all subsequent changes with the event of the given id, which is reported on failure"""
+        self._event_id = event_id
+
+    def discard(self, event_id):
+        """Drop all buffered changes made for the event with the given id"""
+        self._requests = [item for item in self._requests if item[0] != event_id]
+
+    def connection(self):
+        """@return the connection we write to"""
+        return self._connection
+
+    def flush(self):
+        """Send all buffered changes, in order, and clear the buffer.
+        Errors other than shotgun rejecting a batch, like timeouts, leave it unknown whether the batch was
+        written. To not write its changes twice, neither it nor any of the following batches are sent.
+        @return list of WriteFailures, in order, one for each change that could not be written"""
+        # shotgun_api3 is slow to import, and not needed until we write
+        from shotgun_api3 import Fault
+
+        batches = self._batches(self._requests)
+        self._requests = list()
+        failures = list()
+        while batches:
+            batch = batches.pop(0)
+            requests = [request for event_id, session_uuid, changes in batch for request in changes]
+            self._connection.set_session_uuid(batch[0][1])
+            try:
+                self._connection.batch(requests)
+            except Fault as err:
+                if len(batch) > 1:
+                    self._log.warning("Batch of %i changes was rejected (%s) - retrying them event by event", 
+                                      len(requests), err)
+                    batches[0:0] = [[event] for event in batch]
+                else:
+                    failures.extend(WriteFailure(batch[0][0], request, err) for request in requests)
+                # end find the failing events
+            except Exception as err:
+                self._log.error("Batch of %i changes failed (%s) - it may have been written, so neither it nor the "
+                                "%i batch(es) after it are sent", len(requests), err, len(batches))
+                for event_id, session_uuid, changes in batch + [event for later in batches for event in later]:
+                    failures.extend(WriteFailure(event_id, request, err) for request in changes)
+                # end for each unwritten event
+                break
+            # end handle failed batch
+        # end for each batch
+
+        for failure in failures:
+            self._log.error("Failed to write change made for event %s: %s", failure.event_id, failure)
+        # end for each failure
+        return failures
+
+    ## -- End Interface -- @}
+
+# end class ShotgunWriteBuffer
+
+## -- End Types -- @}